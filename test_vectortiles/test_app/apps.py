@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class TestAppConfig(AppConfig):
+    name = "test_vectortiles.test_app"
+
+    def ready(self):
+        from test_vectortiles.test_app.models import FullDataFeature
+        from test_vectortiles.test_app.vt_layers import (
+            CityCentroidVectorLayer,
+            FullDataFeatureVectorLayer,
+        )
+        from vectortiles import invalidation
+
+        invalidation.connect(FullDataFeatureVectorLayer, model=FullDataFeature)
+        invalidation.connect(CityCentroidVectorLayer, model=FullDataFeature)
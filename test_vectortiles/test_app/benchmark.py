@@ -0,0 +1,203 @@
+"""
+Benchmark tiles generation of PostGIS and python backends, on synthetic features.
+
+A fixed sample of tiles is rendered by zoom level with each backend. Query time, encode
+time, size and features number of each tile are reported, to compare them across commits.
+"""
+
+import math
+import platform
+import random
+import statistics
+import time
+
+import django
+from django.contrib.gis.geos import LineString, Point, Polygon
+from django.db import connection
+
+from test_vectortiles.test_app.models import Feature, Layer
+from vectortiles.backends import postgis, python
+from vectortiles.management.base import get_tile_ranges
+from vectortiles.timing import count_tile_features
+
+BENCHMARK_LAYER = "benchmark"
+GEOMETRY_TYPES = ("point", "line", "polygon")
+
+
+def generate_geometry(rng, geometry_type, bbox, size):
+    """Get a random geometry in bbox, with about size degrees width"""
+    west, south, east, north = bbox
+    x, y = rng.uniform(west, east), rng.uniform(south, north)
+    if geometry_type == "point":
+        return Point(x, y, srid=4326)
+    if geometry_type == "line":
+        coordinates = [(x, y)]
+        for _ in range(9):
+            x, y = x + rng.uniform(-size, size) / 3, y + rng.uniform(-size, size) / 3
+            coordinates.append((x, y))
+        return LineString(coordinates, srid=4326)
+    # star shaped polygon, vertices sorted by angle
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(12))
+    coordinates = []
+    for angle in angles:
+        radius = rng.uniform(size / 4, size / 2)
+        coordinates.append((x + radius * math.cos(angle), y + radius * math.sin(angle)))
+    return Polygon((*coordinates, coordinates[0]), srid=4326)
+
+
+def generate_features(count, geometry_type, bbox, seed=0, batch_size=1000):
+    """Replace benchmark features with count random features in bbox"""
+    delete_features()
+    layer = Layer.objects.create(name=BENCHMARK_LAYER)
+    rng = random.Random(seed)
+    size = (bbox[2] - bbox[0]) / 1000
+    Feature.objects.bulk_create(
+        (
+            Feature(
+                name=f"feature {index}",
+                layer=layer,
+                geom=generate_geometry(rng, geometry_type, bbox, size),
+            )
+            for index in range(count)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def delete_features():
+    Layer.objects.filter(name=BENCHMARK_LAYER).delete()
+
+
+def sample_tiles(bbox, zooms, count, seed=0):
+    """
+    Get the same random sample of count tiles covering bbox by zoom level
+
+    :return: z, x, y tiles
+    :rtype: list
+    """
+    rng = random.Random(seed)
+    tiles = []
+    for z in zooms:
+        ((_, x_range, y_range),) = get_tile_ranges(bbox, z, z)
+        total = len(x_range) * len(y_range)
+        for index in sorted(rng.sample(range(total), min(count, total))):
+            tiles.append(
+                (z, x_range[index // len(y_range)], y_range[index % len(y_range)])
+            )
+    return tiles
+
+
+class BenchmarkLayerMixin:
+    id = "benchmark"
+    tile_fields = ("name",)
+
+    def get_queryset(self, *args, **kwargs):
+        return Feature.objects.filter(layer__name=BENCHMARK_LAYER)
+
+
+class PostGISBenchmarkVectorLayer(BenchmarkLayerMixin, postgis.VectorLayer):
+    def render(self, x, y, z):
+        """
+        Render tile. Tile is encoded in the query.
+
+        :return: tile, query and encode times in seconds
+        :rtype: tuple
+        """
+        start = time.perf_counter()
+        using, sql, params = self.get_tile_query(x, y, z)
+        tile = postgis.to_bytes(postgis.fetch_row(using, sql, params)[0])
+        return tile, time.perf_counter() - start, None
+
+
+class PythonBenchmarkVectorLayer(BenchmarkLayerMixin, python.VectorLayer):
+    def render(self, x, y, z):
+        """
+        Render tile
+
+        :return: tile, query and encode times in seconds
+        :rtype: tuple
+        """
+        start = time.perf_counter()
+        features = list(self.get_tile_queryset(x, y, z))
+        fetched = time.perf_counter()
+        tile = self.encode_tile(features, x, y, z)
+        return tile, fetched - start, time.perf_counter() - fetched
+
+
+BACKENDS = {
+    "postgis": PostGISBenchmarkVectorLayer,
+    "python": PythonBenchmarkVectorLayer,
+}
+
+
+def to_ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def benchmark_tiles(backends, tiles, repeat=3):
+    """
+    Render tiles with each backend, repeat times. Best times of each tile are kept.
+
+    :return: result of each backend tile
+    :rtype: list
+    """
+    results = []
+    for backend in backends:
+        layer = BACKENDS[backend]()
+        for z, x, y in tiles:
+            runs = [layer.render(x, y, z) for _ in range(repeat)]
+            tile = runs[0][0]
+            encode_times = [run[2] for run in runs if run[2] is not None]
+            results.append(
+                {
+                    "backend": backend,
+                    "z": z,
+                    "x": x,
+                    "y": y,
+                    "query_ms": to_ms(min(run[1] for run in runs)),
+                    "encode_ms": to_ms(min(encode_times) if encode_times else None),
+                    "bytes": len(tile),
+                    "features": count_tile_features(tile),
+                }
+            )
+    return results
+
+
+def summarize(results):
+    """
+    Get median times, mean bytes and features by backend and zoom level
+
+    :rtype: list
+    """
+    groups = {}
+    for result in results:
+        groups.setdefault((result["backend"], result["z"]), []).append(result)
+    summary = []
+    for (backend, z), group in groups.items():
+        encode_times = [
+            result["encode_ms"] for result in group if result["encode_ms"] is not None
+        ]
+        summary.append(
+            {
+                "backend": backend,
+                "z": z,
+                "tiles": len(group),
+                "query_ms": statistics.median(result["query_ms"] for result in group),
+                "encode_ms": statistics.median(encode_times) if encode_times else None,
+                "bytes": statistics.mean(result["bytes"] for result in group),
+                "features": statistics.mean(result["features"] for result in group),
+            }
+        )
+    return summary
+
+
+def get_environment():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT postgis_lib_version()")
+        postgis_version = cursor.fetchone()[0]
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "postgresql": connection.pg_version,
+        "postgis": postgis_version,
+    }
@@ -0,0 +1,100 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from test_vectortiles.test_app import benchmark
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = "Benchmark PostGIS and python backends tiles on synthetic features"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--features", type=int, default=10000, help="Number of features"
+        )
+        parser.add_argument(
+            "--geometry",
+            choices=benchmark.GEOMETRY_TYPES,
+            default="point",
+            help="Geometry type of features",
+        )
+        parser.add_argument(
+            "--bbox",
+            default="-5,42,8,51",
+            help="Features extent: west,south,east,north in 4326",
+        )
+        parser.add_argument(
+            "--zooms", default="0,4,8,12", help="Comma separated zoom levels"
+        )
+        parser.add_argument(
+            "--tiles", type=int, default=10, help="Number of tiles by zoom level"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Rendering of each tile, best is kept"
+        )
+        parser.add_argument(
+            "--backends",
+            default=",".join(benchmark.BACKENDS),
+            help="Comma separated backends",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed of features and tiles"
+        )
+        parser.add_argument("--output", help="JSON report path, default to stdout")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep generated features"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            bbox = parse_list(options["bbox"], float)
+            zooms = parse_list(options["zooms"], int)
+        except ValueError as exc:
+            raise CommandError(exc) from exc
+        if len(bbox) != 4:
+            msg = "bbox must be west,south,east,north"
+            raise CommandError(msg)
+        backends = parse_list(options["backends"])
+        for backend in backends:
+            if backend not in benchmark.BACKENDS:
+                msg = f"Unknown backend: {backend}"
+                raise CommandError(msg)
+        dataset = {
+            "features": options["features"],
+            "geometry": options["geometry"],
+            "bbox": bbox,
+            "seed": options["seed"],
+        }
+        tiles = benchmark.sample_tiles(
+            bbox, zooms, options["tiles"], seed=options["seed"]
+        )
+        benchmark.generate_features(
+            options["features"], options["geometry"], bbox, seed=options["seed"]
+        )
+        try:
+            results = benchmark.benchmark_tiles(
+                backends, tiles, repeat=options["repeat"]
+            )
+            report = {
+                "environment": benchmark.get_environment(),
+                "dataset": dataset,
+                "repeat": options["repeat"],
+                "summary": benchmark.summarize(results),
+                "tiles": results,
+            }
+        finally:
+            if not options["keep"]:
+                benchmark.delete_features()
+        content = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(content)
+            self.stderr.write(
+                self.style.SUCCESS(f"Report written in {options['output']}")
+            )
+        else:
+            self.stdout.write(content)
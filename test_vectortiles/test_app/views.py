@@ -1,6 +1,3 @@
-from hashlib import md5
-
-from django.core.cache import cache
 from django.urls import reverse
 from django.views.generic import TemplateView
 from django.views.generic.dates import timezone_today
@@ -50,27 +47,6 @@ class MultipleVectorLayers:
 class LayerView(MultipleVectorLayers, MVTView):
     """Multiple tiles in same time, each Layer instance is a tile layer"""
 
-    def get_layers_last_update(self):
-        last_updated_layer = (
-            FullDataLayer.objects.all()
-            .order_by("-update_datetime")
-            .only("update_datetime")
-            .first()
-        )
-        return last_updated_layer.update_datetime if last_updated_layer else None
-
-    def get_content_status(self, z, x, y):
-        cache_key = md5(
-            f"tilejson-{self.get_layers_last_update()}-{z}-{x}-{y}".encode()
-        ).hexdigest()
-        if cache.has_key(cache_key):  # NOQA W601
-            tile, status = cache.get(cache_key), 200
-
-        else:
-            tile, status = super().get_content_status(z, x, y)
-            cache.set(cache_key, tile, timeout=3600 * 24 * 30)
-        return tile, status
-
 
 class LayerTileJSONView(MultipleVectorLayers, TileJSONView):
     """Simple model TileJSON View"""
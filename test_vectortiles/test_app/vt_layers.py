@@ -1,7 +1,4 @@
-from hashlib import md5
-
 from django.contrib.gis.db.models.functions import Centroid
-from django.core.cache import cache
 from django.db.models import FloatField, Q
 from django.db.models.fields.json import KeyTextTransform
 from django.db.models.functions import Cast
@@ -21,20 +18,11 @@ class FeatureVectorLayer(VectorLayer):
 class FeatureLayerVectorLayer(VectorLayer):
     model = Layer
     tile_fields = ("name",)
+    cache_timeout = 3600 * 24 * 30
 
     def __init__(self, instance):
         self.instance = instance
 
-    def get_tile(self, x, y, z):
-        cache_key = md5(f"{self.get_id()}-{z}-{x}-{y}".encode()).hexdigest()
-        if cache.has_key(cache_key):  # NOQA W601
-            return cache.get(cache_key)
-
-        else:
-            tile = super().get_tile(x, y, z)
-            cache.set(cache_key, tile)
-            return tile
-
     def get_id(self):
         return slugify(self.instance.name)
 
@@ -60,9 +48,16 @@ class FeatureLayerFilteredByDateVectorLayer(VectorLayer):
 
 
 class FullDataFeatureVectorLayer(VectorLayer):
+    cache_timeout = 3600 * 24 * 30
+    cache_invalidation = True
+
     def __init__(self, instance):
         self.instance = instance
 
+    @classmethod
+    def get_invalidated_layers(cls, instance):
+        return [cls(instance.layer)] if instance.layer else []
+
     def get_tile_fields(self):
         if self.instance.name == "troncon_de_route":
             return ("nature",)
@@ -94,17 +89,8 @@ class FullDataFeatureVectorLayer(VectorLayer):
             return ("nature",)
         return ("properties",)
 
-    def get_tile(self, x, y, z):
-        cache_key = md5(
-            f"{self.get_id()}-{self.instance.update_datetime}-{z}-{x}-{y}".encode()
-        ).hexdigest()
-        if cache.has_key(cache_key):  # NOQA W601
-            return cache.get(cache_key)
-
-        else:
-            tile = super().get_tile(x, y, z)
-            cache.set(cache_key, tile, timeout=3600 * 24 * 30)
-            return tile
+    def get_cache_version(self):
+        return self.instance.update_datetime
 
     def get_id(self):
         return slugify(self.instance.name)
@@ -234,6 +220,12 @@ class CityCentroidVectorLayer(FullDataFeatureVectorLayer):
     def __init__(self):
         self.instance = FullDataLayer.objects.get(name="commune")
 
+    @classmethod
+    def get_invalidated_layers(cls, instance):
+        if instance.layer and instance.layer.name == "commune":
+            return [cls()]
+        return []
+
     def get_min_zoom(self):
         return 6
 
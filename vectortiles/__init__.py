@@ -3,3 +3,11 @@ from django.utils.module_loading import import_string
 from vectortiles import settings as app_settings
 
 VectorLayer = import_string(f"{app_settings.VECTOR_TILES_BACKEND}.VectorLayer")
+
+
+def __getattr__(name):
+    # optional layers, resolved when used: custom backends may not implement them
+    if name in ("ClusteredVectorLayer", "GridVectorLayer"):
+        return import_string(f"{app_settings.VECTOR_TILES_BACKEND}.{name}")
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
@@ -1,4 +1,30 @@
+import math
+from contextvars import ContextVar
+from hashlib import md5
+
 import mercantile
+from asgiref.sync import sync_to_async
+from django.contrib.gis.db.models import Collect, Extent
+from django.contrib.gis.db.models.functions import (
+    Centroid,
+    PointOnSurface,
+    SnapToGrid,
+    Transform,
+)
+from django.contrib.gis.geos import Polygon
+from django.core.cache import caches
+from django.db.models import Case, Count, F, Min, Value, When
+from django.db.models.expressions import Star
+from django.utils.text import slugify
+
+from vectortiles import settings as app_settings
+from vectortiles.backends.functions import SimplifyPreserveTopology, SimplifyVW
+
+EMPTY_TILES_BLOCK_SIZE = 32  # empty tiles bitmaps cover 32 x 32 tiles of a zoom level
+GRID_SHAPES = ("hexagon", "square")
+
+# {extent cache key: data extent} read by tile view with layers cached tiles
+current_data_extents = ContextVar("vectortiles_data_extents", default=None)
 
 
 class BaseVectorLayerMixin:
@@ -9,6 +35,10 @@ class BaseVectorLayerMixin:
     model = None
     queryset = None
     queryset_limit = None  # if you want to limit feature number per tile
+    queryset_limit_by_zoom = (
+        None  # [(min_zoom, max_zoom, limit)], before queryset_limit
+    )
+    limit_order_by = None  # order_by expressions keeping most important features first
 
     id = ""  # id for data layer in vector tile
     description = ""
@@ -22,6 +52,24 @@ class BaseVectorLayerMixin:
         256  # buffer around tiles (intersected polygon display without borders)
     )
     clip_geom = True  # geometry clipped in tile
+    simplify = None  # "preserve_topology", "visvalingam" or "snap_to_grid"
+    simplify_tolerance = 1  # in tile pixels (tile_extent pixels by tile side)
+    generalized_zooms = None  # [(min_zoom, max_zoom)] served by generalized views
+    cache_alias = None  # cache to store tiles. By default, VECTOR_TILES_CACHE_ALIAS
+    cache_timeout = None  # seconds, VECTOR_TILES_CACHE_TIMEOUT by default. 0: no cache
+    cache_version = None  # included in cache keys, change it to invalidate cached tiles
+    cache_invalidation = (
+        False  # evict cached tiles on model changes (vectortiles.invalidation)
+    )
+    cache_invalidation_max_tiles = (
+        10000  # above, all layer cached tiles are invalidated
+    )
+    extent_check = False  # skip tiles outside of layer data extent, without query
+    extent_timeout = 3600  # seconds to keep layer data extent in cache
+    empty_tiles_bitmap = (
+        False  # cache empty tiles in bitmaps by zoom level, instead of a key by tile
+    )
+    empty_tiles_inherit = False  # tiles of an empty tile of lower zoom are empty
 
     def check_in_zoom_levels(self, z):
         return self.get_min_zoom() <= z <= self.get_max_zoom()
@@ -44,6 +92,131 @@ class BaseVectorLayerMixin:
     def get_tile_fields(self):
         return self.tile_fields or ()
 
+    def get_simplify(self):
+        return self.simplify
+
+    def pixel_length(self, zoom, size):
+        """Get length in 3857 units of a pixel, for a tile of size pixels"""
+        radius = 6378137
+        circum = 2 * math.pi * radius
+        return circum / size / 2 ** int(zoom)
+
+    def get_simplify_tolerance(self, z):
+        """Get simplification tolerance at zoom level, in 3857 units"""
+        return self.simplify_tolerance * self.pixel_length(z, self.tile_extent)
+
+    def get_simplified_geometry(self, geometry, z, simplify=None):
+        """
+        Simplify geometry expression, in 3857, with simplify method or layer one
+
+        :return: geometry expression
+        """
+        simplify = simplify or self.get_simplify()
+        if not simplify:
+            return geometry
+        tolerance = self.get_simplify_tolerance(z)
+        if simplify == "preserve_topology":
+            return SimplifyPreserveTopology(geometry, tolerance)
+        if simplify == "visvalingam":
+            # tolerance is an area
+            return SimplifyVW(geometry, tolerance**2)
+        if simplify == "snap_to_grid":
+            return SnapToGrid(geometry, tolerance)
+        msg = f"Unknown simplification method: {simplify}"
+        raise ValueError(msg)
+
+    def get_cache_alias(self):
+        return self.cache_alias or app_settings.VECTOR_TILES_CACHE_ALIAS
+
+    def get_cache_timeout(self):
+        return (
+            self.cache_timeout
+            if self.cache_timeout is not None
+            else app_settings.VECTOR_TILES_CACHE_TIMEOUT
+        )
+
+    def get_cache_version(self):
+        return self.cache_version
+
+    def get_cache_key_prefix(self):
+        """
+        Get prefix of layer cache keys, with layer class: layers of different classes
+        sharing an id don't share cached values
+        """
+        layer_class = type(self)
+        return (
+            f"{layer_class.__module__}.{layer_class.__qualname__}-"
+            f"{self.get_id()}-{self.get_cache_version()}"
+        )
+
+    def get_cache_key(self, x, y, z, generation=None, compressed=False):
+        """Get cache key of layer tile, or of its compressed segment"""
+        key = f"{self.get_cache_key_prefix()}-{generation}-{z}-{x}-{y}"
+        if compressed:
+            key = f"{key}-gzip"
+        return f"vectortiles:{md5(key.encode()).hexdigest()}"
+
+    def get_empty_tiles_bitmap(self, x, y, z, generation=None):
+        """
+        Get cache key of the empty tiles bitmap containing tile, and bit of tile in it
+
+        :return: cache key and tile bit
+        :rtype: tuple
+        """
+        size = EMPTY_TILES_BLOCK_SIZE
+        key = (
+            f"{self.get_cache_key_prefix()}-{generation}-"
+            f"{z}-{x // size}-{y // size}-empty"
+        )
+        return (
+            f"vectortiles:{md5(key.encode()).hexdigest()}",
+            1 << ((y % size) * size + x % size),
+        )
+
+    def get_empty_tiles_zooms(self, z):
+        """Get zoom levels of empty tiles bitmaps of tile, with its parent tiles ones"""
+        if self.empty_tiles_inherit:
+            return [*range(self.get_min_zoom(), z), z]
+        return [z]
+
+    def get_empty_tiles_bitmaps(self, x, y, z, generations=None):
+        """
+        Get bitmaps telling if tile is empty: its own bitmap and, with
+        empty_tiles_inherit, bitmaps of its parent tiles down to min zoom.
+
+        :param generations: {zoom level: cache generation}
+        :return: cache key and tile bit of each bitmap
+        :rtype: list
+        """
+        generations = generations or {}
+        return [
+            self.get_empty_tiles_bitmap(
+                x >> (z - zoom), y >> (z - zoom), zoom, generations.get(zoom)
+            )
+            for zoom in self.get_empty_tiles_zooms(z)
+        ]
+
+    def get_cache_generation_key(self, z):
+        """
+        Get cache key of layer cache generation at zoom level, renewed to invalidate
+        all tiles of zoom level
+        """
+        key = f"{self.get_cache_key_prefix()}-{z}-generation"
+        return f"vectortiles:{md5(key.encode()).hexdigest()}"
+
+    def get_last_modified(self):
+        """
+        Get last modification date of layer data, for Last-Modified response header
+
+        :rtype: datetime
+        """
+        return None
+
+    @classmethod
+    def get_invalidated_layers(cls, instance):
+        """Get layers whose cached tiles are invalidated when instance changes"""
+        return [cls()]
+
     def get_tilejson_vector_layer(self):
         return {
             "id": self.get_id(),
@@ -76,13 +249,160 @@ class BaseVectorLayerMixin:
         return self.model.objects.all()
 
     def get_vector_tile_queryset(self, *args, **kwargs):
-        """Get feature queryset in tile dynamically"""
+        """
+        Get feature queryset in tile dynamically, with z, x, y arguments.
+        x and y are None to get features of all tiles of zoom level (get_zoom_queryset).
+        """
         return self.get_queryset(*args, **kwargs)
 
+    def get_zoom_queryset(self, z):
+        """
+        Get features of all tiles of zoom level, for data extent, generalized views and
+        in memory datasets. Override it if get_vector_tile_queryset requires x and y.
+        """
+        return self.get_vector_tile_queryset(z, None, None)
+
+    def get_generalized_zooms(self):
+        return self.generalized_zooms or []
+
+    def get_generalized_table(self, min_zoom, max_zoom):
+        """Get name of generalized view of zoom range"""
+        layer_id = slugify(self.get_id()).replace("-", "_")
+        return f"vectortiles_{layer_id}_z{min_zoom}_{max_zoom}"
+
+    def get_generalized_queryset(self, min_zoom, max_zoom):
+        """
+        Get generalized features of zoom range, stored in a materialized view.
+        Override it to filter, simplify or dissolve features differently.
+
+        :return: values of tile fields, unique id as generalized_id (primary key by
+                 default) and geometry in 3857 as generalized_geom
+        :rtype: QuerySet
+        """
+        from vectortiles.generalization import GEOMETRY_COLUMN, ID_COLUMN
+
+        features = self.get_zoom_queryset(max_zoom)
+        geometry = self.get_simplified_geometry(
+            Transform(self.geom_field, 3857),
+            max_zoom,
+            self.get_simplify() or "preserve_topology",
+        )
+        return features.annotate(
+            **{ID_COLUMN: F("pk"), GEOMETRY_COLUMN: geometry}
+        ).values(*self.get_tile_fields(), ID_COLUMN, GEOMETRY_COLUMN)
+
+    def get_tile_fields_by_zoom(self, z):
+        """Get tile fields of features at zoom level, by default get_tile_fields"""
+        return self.get_tile_fields()
+
+    def group_tile_features(self, features, z):
+        """Group features of tile, before annotating their geometry. Not grouped by default"""
+        return features
+
+    def get_tile_geometry(self, z):
+        """Get geometry expression of tile features, in 3857, before clipping"""
+        # simplified before clipping, for the same result in adjacent tiles
+        return self.get_simplified_geometry(Transform(self.geom_field, 3857), z)
+
+    def get_tile_source_queryset(self, z, x, y):
+        """Get features of tile: generalized view of zoom level, else vector tile queryset"""
+        for min_zoom, max_zoom in self.get_generalized_zooms():
+            if min_zoom <= z <= max_zoom:
+                from vectortiles.generalization import get_generalized_source
+
+                return get_generalized_source(self, min_zoom, max_zoom)
+        return self.get_vector_tile_queryset(z, x, y)
+
+    def get_extent(self):
+        """
+        Get layer data extent
+
+        :return: xmin, ymin, xmax, ymax in 4326 coordinate system, or None if no data
+        :rtype: tuple
+        """
+        features = self.get_zoom_queryset(self.get_max_zoom())
+        return features.aggregate(extent=Extent(Transform(self.geom_field, 4326)))[
+            "extent"
+        ]
+
+    def get_extent_cache_key(self):
+        key = f"{self.get_cache_key_prefix()}-extent"
+        return f"vectortiles:{md5(key.encode()).hexdigest()}"
+
+    def get_data_extent(self):
+        """
+        Get layer data extent, stored in layer cache for extent_timeout seconds.
+        In tile views, extent is read in cache with cached tiles.
+
+        :return: xmin, ymin, xmax, ymax in 3857 coordinate system, or None if no data
+        :rtype: tuple
+        """
+        key = self.get_extent_cache_key()
+        extent = (current_data_extents.get() or {}).get(key)
+        if extent is not None:
+            return extent or None
+        cache = caches[self.get_cache_alias()]
+        extent = cache.get(key)
+        if extent is None:
+            extent = self.get_extent()
+            # empty tuple if no data, to keep it in cache
+            extent = (
+                (
+                    *mercantile.xy(*extent[:2], truncate=True),
+                    *mercantile.xy(*extent[2:], truncate=True),
+                )
+                if extent
+                else ()
+            )
+            cache.set(key, extent, timeout=self.extent_timeout)
+        return extent or None
+
+    def check_in_data_extent(self, x, y, z):
+        """Check if tile, with its buffer, intersects layer data extent"""
+        if not self.extent_check:
+            return True
+        extent = self.get_data_extent()
+        if extent is None:
+            return False
+        xmin, ymin, xmax, ymax = self.get_bounds(x, y, z)
+        buffer = (xmax - xmin) * self.tile_buffer / self.tile_extent
+        return (
+            xmin - buffer <= extent[2]
+            and extent[0] <= xmax + buffer
+            and ymin - buffer <= extent[3]
+            and extent[1] <= ymax + buffer
+        )
+
     def get_queryset_limit(self):
         """Get feature limit by tile dynamically"""
         return self.queryset_limit
 
+    def get_queryset_limit_by_zoom(self, z):
+        """Get feature limit of tiles at zoom level, by default get_queryset_limit"""
+        for min_zoom, max_zoom, limit in self.queryset_limit_by_zoom or []:
+            if min_zoom <= z <= max_zoom:
+                return limit
+        return self.get_queryset_limit()
+
+    def get_limit_order_by(self):
+        return self.limit_order_by
+
+    def limit_queryset(self, features, z):
+        """
+        Keep features of tile within zoom level limit, most important first.
+        Features are ordered by limit_order_by then primary key, so the same features
+        are kept in adjacent tiles.
+        """
+        limit = self.get_queryset_limit_by_zoom(z)
+        if not limit:
+            return features
+        order_by = self.get_limit_order_by()
+        if order_by:
+            features = features.order_by(*order_by, "pk")
+        elif not features.ordered:
+            features = features.order_by("pk")
+        return features[:limit]
+
     def get_tile(self, x, y, z):
         """
         Generate a mapbox vector tile as bytearray
@@ -98,3 +418,135 @@ class BaseVectorLayerMixin:
         :rtype: bytearray
         """
         raise NotImplementedError()
+
+    async def aget_tile(self, x, y, z):
+        """
+        Generate a mapbox vector tile as bytearray, asynchronously.
+        By default, get_tile is run in a thread.
+
+        :rtype: bytearray
+        """
+        return await sync_to_async(self.get_tile)(x, y, z)
+
+
+class ClusteredVectorLayerMixin:
+    """
+    Mixin clustering points of tiles up to cluster_max_zoom, in cells of a grid aligned
+    on tiles. A feature is generated by cluster, at the centroid of its points.
+    """
+
+    cluster_max_zoom = 12  # points are clustered up to this zoom level
+    cluster_size = 64  # cells size in tile pixels, a power of 2 dividing tile_extent
+    cluster_fields = None  # {tile field: aggregate}, with count of cluster points
+
+    def get_cluster_max_zoom(self):
+        return self.cluster_max_zoom
+
+    def get_cluster_fields(self):
+        return self.cluster_fields or {}
+
+    def is_clustered(self, z):
+        return z <= self.get_cluster_max_zoom()
+
+    def get_cluster_cell(self, z):
+        """Get expression snapping points to center of their cluster cell"""
+        size = self.cluster_size * self.pixel_length(z, self.tile_extent)
+        # cells limits on tiles limits
+        origin = -self.pixel_length(0, 1) / 2 + size / 2
+        return SnapToGrid(Transform(self.geom_field, 3857), size, size, origin, origin)
+
+    def get_tile_fields_by_zoom(self, z):
+        if not self.is_clustered(z):
+            return super().get_tile_fields_by_zoom(z)
+        return ("count", *self.get_cluster_fields())
+
+    def group_tile_features(self, features, z):
+        if not self.is_clustered(z):
+            return super().group_tile_features(features, z)
+        return features.values(cluster_cell=self.get_cluster_cell(z)).annotate(
+            count=Count("pk"), cluster_id=Min("pk"), **self.get_cluster_fields()
+        )
+
+    def get_tile_geometry(self, z):
+        if not self.is_clustered(z):
+            return super().get_tile_geometry(z)
+        return Centroid(Collect(Transform(self.geom_field, 3857)))
+
+    def limit_queryset(self, features, z):
+        if not self.is_clustered(z):
+            return super().limit_queryset(features, z)
+        limit = self.get_queryset_limit_by_zoom(z)
+        if not limit:
+            return features
+        # biggest clusters first
+        return features.order_by("-count", "cluster_id")[:limit]
+
+
+class GridVectorLayerMixin:
+    """
+    Mixin aggregating features of tiles in cells of a hexagonal or square grid.
+    A feature is generated by non-empty cell, with aggregates of its features.
+    """
+
+    grid_shape = "hexagon"  # "hexagon" or "square"
+    grid_size = 64  # cells size in tile pixels: hexagons edge, squares side
+    grid_fields = None  # {tile field: aggregate}, count of features by default
+
+    def get_grid_shape(self):
+        if self.grid_shape not in GRID_SHAPES:
+            msg = f"Unknown grid shape: {self.grid_shape}"
+            raise ValueError(msg)
+        return self.grid_shape
+
+    def get_grid_size(self, z):
+        """Get cells size at zoom level, in 3857 units"""
+        return self.grid_size * self.pixel_length(z, self.tile_extent)
+
+    def get_grid_fields(self):
+        return self.grid_fields or {"count": Count("pk")}
+
+    def get_tile_fields_by_zoom(self, z):
+        return tuple(self.get_grid_fields())
+
+    def get_grid_aggregates(self):
+        """
+        Get aggregates of grid fields, with their expression by feature.
+        Aggregate filters are applied on expressions.
+
+        :return: {tile field: (aggregate function, distinct, expression or None for *)}
+        :rtype: dict
+        """
+        aggregates = {}
+        for name, aggregate in self.get_grid_fields().items():
+            expression = aggregate.get_source_expressions()[0]
+            if isinstance(expression, Star):
+                expression = None
+            if aggregate.filter is not None:
+                expression = Case(When(aggregate.filter, then=expression or Value(1)))
+            aggregates[name] = (aggregate.function, aggregate.distinct, expression)
+        return aggregates
+
+    def get_grid_point(self):
+        """Get expression of point assigning features to cells, in 3857"""
+        return PointOnSurface(Transform(self.geom_field, 3857))
+
+    def get_grid_features(self, x, y, z):
+        """
+        Get features of cells intersecting tile, with values of grid_<field> to aggregate
+        """
+        features = self.get_tile_source_queryset(z, x, y)
+        # cells crossing tile buffer limits are fully aggregated
+        margin = self.pixel_length(z, self.tile_buffer) + 2 * self.get_grid_size(z)
+        xmin, ymin, xmax, ymax = self.get_bounds(x, y, z)
+        bbox = Polygon.from_bbox(
+            (xmin - margin, ymin - margin, xmax + margin, ymax + margin)
+        )
+        bbox.srid = 3857
+        features = features.filter(**{f"{self.geom_field}__intersects": bbox})
+        return features.order_by().annotate(
+            **{
+                f"grid_{name}": expression
+                for name, (_, _, expression) in self.get_grid_aggregates().items()
+                if expression is not None
+            }
+        )
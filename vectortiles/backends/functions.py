@@ -0,0 +1,10 @@
+from django.contrib.gis.db.models.functions import GeomOutputGeoFunc
+
+
+class SimplifyPreserveTopology(GeomOutputGeoFunc):
+    function = "ST_SimplifyPreserveTopology"
+
+
+class SimplifyVW(GeomOutputGeoFunc):
+    # Visvalingam-Whyatt simplification, tolerance is an area
+    function = "ST_SimplifyVW"
@@ -0,0 +1,138 @@
+"""
+Vector layers loaded once in memory, for small and rarely changed data.
+
+Layer features are loaded in EPSG:3857 with their tile fields, indexed in a shapely STRtree,
+and tiles are generated without query. Data is reloaded when its version in layer cache
+is renewed, by vectortiles.invalidation or invalidate_layer_data.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from hashlib import md5
+
+import shapely
+from django.contrib.gis.db.models.functions import AsWKB, Transform
+from django.core.cache import caches
+
+from vectortiles import timing
+from vectortiles.backends.python import VectorLayer
+from vectortiles.backends.python.encoder import LayerEncoder
+from vectortiles.invalidation import data_versions
+
+Dataset = namedtuple(
+    "Dataset", ("version", "properties", "geometries", "generalized", "tree")
+)
+
+datasets = {}  # data version key -> dataset, shared by all threads
+datasets_locks = {}  # data version key -> lock, to load each dataset once
+
+
+class InMemoryVectorLayer(VectorLayer):
+    data_invalidation = True  # reload data on model changes (vectortiles.invalidation)
+    data_version_timeout = (
+        5  # seconds to keep data version by process, 0: read it by tile
+    )
+
+    def get_data_version_key(self):
+        key = f"{self.get_cache_key_prefix()}-data"
+        return f"vectortiles:{md5(key.encode()).hexdigest()}"
+
+    def get_data_version(self):
+        """
+        Get version of layer data, from layer cache at most every data_version_timeout
+        seconds. Missing version is initialized. If layer cache doesn't store values
+        (DummyCache), version is kept by process.
+
+        :return: version
+        """
+        key = self.get_data_version_key()
+        version, checked_at = data_versions.get(key, (None, None))
+        now = time.monotonic()
+        if version is not None and now - checked_at < self.data_version_timeout:
+            return version
+        cache = caches[self.get_cache_alias()]
+        cached_version = cache.get(key)
+        if cached_version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            cached_version = cache.get(key)
+        if cached_version is not None:
+            version = cached_version
+        elif version is None:
+            version = time.time_ns()
+        data_versions[key] = (version, now)
+        return version
+
+    def load_dataset(self, version):
+        """Load layer features in memory, in limit_order_by order"""
+        features = self.get_zoom_queryset(self.get_max_zoom())
+        order_by = self.get_limit_order_by()
+        if order_by:
+            features = features.order_by(*order_by, "pk")
+        elif not features.ordered:
+            features = features.order_by("pk")
+        features = features.annotate(
+            memory_geometry=AsWKB(Transform(self.geom_field, 3857))
+        ).values_list(*self.get_tile_fields(), "memory_geometry")
+        properties, geometries = [], []
+        for feature in features.iterator(chunk_size=self.tile_chunk_size):
+            properties.append(feature[:-1])
+            geometries.append(bytes(feature[-1]) if feature[-1] else None)
+        geometries = shapely.from_wkb(geometries)
+        # simplified once by zoom range, as generalized views
+        generalized = {
+            (min_zoom, max_zoom): self.simplify_geometries(
+                geometries, max_zoom, self.get_simplify() or "preserve_topology"
+            )
+            for min_zoom, max_zoom in self.get_generalized_zooms()
+        }
+        return Dataset(
+            version, properties, geometries, generalized, shapely.STRtree(geometries)
+        )
+
+    def get_dataset(self):
+        """Get layer data loaded in memory, reloaded if its version changed"""
+        key = self.get_data_version_key()
+        version = self.get_data_version()
+        dataset = datasets.get(key)
+        if dataset is None or dataset.version != version:
+            with datasets_locks.setdefault(key, threading.Lock()):
+                dataset = datasets.get(key)
+                if dataset is None or dataset.version != version:
+                    dataset = datasets[key] = self.load_dataset(version)
+        return dataset
+
+    def get_tile_geometries(self, dataset, indexes, z):
+        """Get geometries of features at zoom level, from generalized ones if any"""
+        for (min_zoom, max_zoom), simplified in dataset.generalized.items():
+            if min_zoom <= z <= max_zoom:
+                return simplified.take(indexes)
+        return self.simplify_geometries(dataset.geometries.take(indexes), z)
+
+    def get_tile(self, x, y, z):
+        if not self.check_in_zoom_levels(z) or not self.check_in_data_extent(x, y, z):
+            return b""
+        layer_id = self.get_id()
+        # dataset is loaded on first tile and after invalidation
+        with timing.Stage(layer_id, "load"):
+            dataset = self.get_dataset()
+        with timing.Stage(layer_id, "query"):
+            indexes = dataset.tree.query(
+                shapely.box(*self.get_bounds(x, y, z)), predicate="intersects"
+            )
+            # loading order
+            indexes.sort()
+            limit = self.get_queryset_limit_by_zoom(z)
+            if limit:
+                indexes = indexes[:limit]
+        with timing.Stage(layer_id, "encode"):
+            geometries = shapely.to_wkb(
+                self.quantize_geometries(
+                    self.get_tile_geometries(dataset, indexes, z), x, y, z
+                )
+            )
+            fields = self.get_tile_fields()
+            encoder = LayerEncoder(layer_id, None, self.tile_extent)
+            for index, geometry in zip(indexes, geometries):
+                encoder.add_feature(zip(fields, dataset.properties[index]), geometry)
+            return encoder.get_tile()
@@ -1,15 +1,178 @@
-from django.contrib.gis.db.models.functions import Transform
-from django.db import connections
+import asyncio
+import itertools
+from collections import defaultdict
 
-from vectortiles.backends import BaseVectorLayerMixin
-from vectortiles.backends.postgis.functions import AsMVTGeom, MakeEnvelope
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections, transaction
+from django.db.models import ExpressionWrapper
+
+from vectortiles import timing
+from vectortiles.backends import (
+    BaseVectorLayerMixin,
+    ClusteredVectorLayerMixin,
+    GridVectorLayerMixin,
+)
+from vectortiles.backends.postgis import aio
+from vectortiles.backends.postgis.functions import (
+    AsMVTGeom,
+    MakeEnvelope,
+    RawGeometryField,
+)
+
+GRID_FUNCTIONS = {"hexagon": "ST_HexagonGrid", "square": "ST_SquareGrid"}
+GRID_FUNCTIONS_POSTGIS_VERSION = (3, 1)
+COMPILED_QUERIES_MAX_SIZE = 1024
+
+# (layer class, compiled sql key) -> compiled tile query, or None if not compilable
+compiled_queries = {}
+
+
+def to_bytes(row):
+    # psycopg2 returns memoryview, psycopg returns bytes
+    return row.tobytes() if isinstance(row, memoryview) else row or b""
+
+
+def fetch_row(using, sql, params):
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params=params)
+        return cursor.fetchone()
+
+
+async def afetch_row(using, sql, params):
+    """Execute query with an asynchronous psycopg connection if available, else in a thread"""
+    if aio.is_available(using):
+        return await aio.fetch_row(using, sql, params)
+    return await sync_to_async(fetch_row)(using, sql, params)
 
 
 class VectorLayer(BaseVectorLayerMixin):
-    def get_tile(self, x, y, z):
-        if not self.check_in_zoom_levels(z):
-            return b""
-        features = self.get_vector_tile_queryset(z, x, y)
+    estimated_extent = False  # get data extent from table statistics (ANALYZE)
+    compiled_sql = False  # compile tile query once by zoom level, bounds as parameters
+
+    def get_estimated_extent(self):
+        """
+        Get table extent from statistics, with ST_EstimatedExtent.
+        Queryset filters are ignored.
+
+        :return: xmin, ymin, xmax, ymax in 4326 coordinate system, or None
+        :rtype: tuple
+        """
+        features = self.get_zoom_queryset(self.get_max_zoom())
+        field = features.model._meta.get_field(self.geom_field)
+        sql = (
+            "SELECT ST_XMin(extent), ST_YMin(extent), ST_XMax(extent), ST_YMax(extent) "
+            "FROM (SELECT ST_Transform("
+            "ST_SetSRID(ST_EstimatedExtent(%s, %s)::geometry, %s), 4326"
+            ") AS extent) AS estimated"
+        )
+        try:
+            # savepoint, as missing statistics raise an error on old PostGIS versions
+            with transaction.atomic(using=features.db):
+                row = fetch_row(
+                    features.db,
+                    sql,
+                    [features.model._meta.db_table, field.column, field.srid],
+                )
+        except DatabaseError:
+            return None
+        return row if row[0] is not None else None
+
+    def get_extent(self):
+        if self.estimated_extent:
+            extent = self.get_estimated_extent()
+            if extent:
+                return extent
+        return super().get_extent()
+
+    def get_compiled_sql_key(self, z):
+        """
+        Get key of compiled tile query, by layer class. Override it to include
+        layer instance attributes the queryset depends on.
+        """
+        return z
+
+    def get_compiled_bounds(self, x, y, z):
+        """
+        Get another tile of zoom level, and (tile bound, other tile bound) pairs.
+        Pairs are different, to find each bound in compiled query params.
+
+        :return: x and y of other tile and bounds pairs, or None at zoom level 0
+        :rtype: tuple
+        """
+        bounds = self.get_bounds(x, y, z)
+        for dx, dy in itertools.product((1, 2, 3), repeat=2):
+            other_x, other_y = (x + dx) % 2**z, (y + dy) % 2**z
+            pairs = list(zip(bounds, self.get_bounds(other_x, other_y, z)))
+            if len(set(pairs)) == 4 and all(bound != other for bound, other in pairs):
+                return other_x, other_y, pairs
+        return None
+
+    def compile_tile_query(self, x, y, z):
+        """
+        Compile tile query, with positions of tile bounds in its params.
+        Bounds are found by comparing query with the query of another tile.
+
+        :return: database alias, sql, params and (param index, bound index) positions,
+            or None if queries don't only differ by tile bounds
+        :rtype: tuple
+        """
+        compiled_bounds = self.get_compiled_bounds(x, y, z)
+        if compiled_bounds is None:
+            return None
+        other_x, other_y, bounds = compiled_bounds
+        using, sql, params = self.build_tile_query(x, y, z)
+        other_using, other_sql, other_params = self.build_tile_query(
+            other_x, other_y, z
+        )
+        if (using, sql, len(params)) != (other_using, other_sql, len(other_params)):
+            return None
+        positions = []
+        for index, (param, other_param) in enumerate(zip(params, other_params)):
+            if param == other_param:
+                continue
+            if (param, other_param) not in bounds:
+                # queryset depends on tile otherwise
+                return None
+            positions.append((index, bounds.index((param, other_param))))
+        return using, sql, params, positions
+
+    def get_tile_query(self, x, y, z):
+        """
+        Get SQL query generating the mapbox vector tile layer,
+        from compiled query of zoom level if compiled_sql is enabled
+
+        :return: database alias, sql and params
+        :rtype: tuple
+        """
+        if not self.compiled_sql:
+            return self.build_tile_query(x, y, z)
+        key = (type(self), self.get_compiled_sql_key(z))
+        try:
+            compiled = compiled_queries[key]
+        except KeyError:
+            # not read back: queries may be cleared by another thread
+            compiled = self.compile_tile_query(x, y, z)
+            if len(compiled_queries) >= COMPILED_QUERIES_MAX_SIZE:
+                compiled_queries.clear()
+            compiled_queries[key] = compiled
+        if compiled is None:
+            return self.build_tile_query(x, y, z)
+        using, sql, params, positions = compiled
+        params = list(params)
+        bounds = self.get_bounds(x, y, z)
+        for index, bound_index in positions:
+            params[index] = bounds[bound_index]
+        return using, sql, params
+
+    def build_tile_query(self, x, y, z):
+        """
+        Build SQL query generating the mapbox vector tile layer, from tile queryset
+
+        :return: database alias, sql and params
+        :rtype: tuple
+        """
+        features = self.get_tile_source_queryset(z, x, y)
         # get tile coordinates from x, y and z
         xmin, ymin, xmax, ymax = self.get_bounds(x, y, z)
         # keep features intersecting tile
@@ -18,39 +181,205 @@ class VectorLayer(BaseVectorLayerMixin):
             f"{self.geom_field}__intersects": MakeEnvelope(xmin, ymin, xmax, ymax, 3857)
         }
         features = features.filter(**filters)
+        features = self.group_tile_features(features, z)
         # annotate prepared geometry for MVT
         features = features.annotate(
             geom_prepared=AsMVTGeom(
-                Transform(self.geom_field, 3857),
+                self.get_tile_geometry(z),
                 MakeEnvelope(xmin, ymin, xmax, ymax, 3857),
                 self.tile_extent,
                 self.tile_buffer,
                 self.clip_geom,
             )
         )
-        fields = (
-            self.get_tile_fields() + ("geom_prepared",)
-            if self.get_tile_fields()
-            else ("geom_prepared",)
-        )
+        fields = (*self.get_tile_fields_by_zoom(z), "geom_prepared")
         # limit feature number if limit provided
-        limit = self.get_queryset_limit()
-        if limit:
-            features = features[:limit]
+        features = self.limit_queryset(features, z)
         # keep values to include in tile (extra included_fields + geometry)
         features = features.values(*fields)
+        sql, params = features.query.sql_with_params()
+        return (
+            features.db,
+            f"SELECT ST_ASMVT(subquery.*, %s, %s, %s) FROM ({sql}) as subquery",
+            [self.get_id(), self.tile_extent, "geom_prepared", *params],
+        )
+
+    def get_tile(self, x, y, z):
+        if not self.check_in_zoom_levels(z) or not self.check_in_data_extent(x, y, z):
+            return b""
+        layer_id = self.get_id()
+        with timing.Stage(layer_id, "query"):
+            using, sql, params = self.get_tile_query(x, y, z)
         # generate MVT
+        with timing.Stage(layer_id, "fetch"):
+            return to_bytes(fetch_row(using, sql, params)[0])
+
+    async def aget_tile(self, x, y, z):
+        if not self.check_in_zoom_levels(z):
+            return b""
+        if type(self).get_tile is not VectorLayer.get_tile:
+            return await super().aget_tile(x, y, z)
+        if not await sync_to_async(self.check_in_data_extent)(x, y, z):
+            return b""
+        layer_id = self.get_id()
+        # queryset may be evaluated while building query
+        using, sql, params = await timing.timed_await(
+            layer_id, "query", sync_to_async(self.get_tile_query)(x, y, z)
+        )
+        row = await timing.timed_await(
+            layer_id, "fetch", afetch_row(using, sql, params)
+        )
+        return to_bytes(row[0])
+
+
+class ClusteredVectorLayer(ClusteredVectorLayerMixin, VectorLayer):
+    pass
+
+
+class GridVectorLayer(GridVectorLayerMixin, VectorLayer):
+    def build_tile_query(self, x, y, z):
+        """
+        Build SQL query generating the mapbox vector tile layer of grid cells.
+        Cells of features points are generated with ST_HexagonGrid or ST_SquareGrid.
+
+        :return: database alias, sql and params
+        :rtype: tuple
+        """
+        aggregates = self.get_grid_aggregates()
+        features = self.get_grid_features(x, y, z).values(
+            *(
+                f"grid_{name}"
+                for name, (_, _, expression) in aggregates.items()
+                if expression is not None
+            ),
+            # point is used in raw sql, not as a django geometry
+            grid_point=ExpressionWrapper(
+                self.get_grid_point(), output_field=RawGeometryField()
+            ),
+        )
+        ops = connections[features.db].ops
+        if ops.spatial_version < GRID_FUNCTIONS_POSTGIS_VERSION:
+            msg = (
+                "GridVectorLayer requires PostGIS 3.1+ (ST_HexagonGrid, ST_SquareGrid)"
+            )
+            raise ImproperlyConfigured(msg)
         sql, params = features.query.sql_with_params()
-        with connections[features.db].cursor() as cursor:
-            cursor.execute(
-                f"SELECT ST_ASMVT(subquery.*, %s, %s, %s) FROM ({sql}) as subquery",
-                params=[
-                    self.get_id(),
-                    self.tile_extent,
-                    "geom_prepared",
-                    *params,
-                ],
+        quote_name = ops.quote_name
+        columns = ", ".join(
+            "{function}({distinct}{column}) AS {name}".format(
+                function=function,
+                distinct="DISTINCT " if distinct else "",
+                column=(
+                    f"features.{quote_name(f'grid_{name}')}"
+                    if expression is not None
+                    else "*"
+                ),
+                name=quote_name(name),
             )
-            row = cursor.fetchone()[0]
-            # psycopg2 returns memoryview, psycopg returns bytes
-            return row.tobytes() if isinstance(row, memoryview) else row or b""
+            for name, (function, distinct, expression) in aggregates.items()
+        )
+        cells_sql = (
+            f"SELECT {columns}, ST_ASMVTGEOM(grid.geom, "
+            "ST_MAKEENVELOPE(%s, %s, %s, %s, 3857), %s, %s, %s) AS geom_prepared "
+            f"FROM ({sql}) AS features CROSS JOIN LATERAL "
+            f"{GRID_FUNCTIONS[self.get_grid_shape()]}(%s, features.grid_point) AS grid "
+            "GROUP BY grid.i, grid.j, grid.geom"
+        )
+        return (
+            features.db,
+            f"SELECT ST_ASMVT(subquery.*, %s, %s, %s) FROM ({cells_sql}) as subquery",
+            [
+                self.get_id(),
+                self.tile_extent,
+                "geom_prepared",
+                *self.get_bounds(x, y, z),
+                self.tile_extent,
+                self.tile_buffer,
+                self.clip_geom,
+                *params,
+                self.get_grid_size(z),
+            ],
+        )
+
+
+def is_compiled(layer):
+    return (
+        isinstance(layer, VectorLayer) and type(layer).get_tile is VectorLayer.get_tile
+    )
+
+
+def get_tiles_queries(layers, x, y, z):
+    """
+    Get a query by database alias selecting tiles of many layers in columns.
+    Layers which can't be compiled in SQL (other backends, custom get_tile) are excluded.
+
+    :return: {database alias: (sql, params, layer indexes)}
+    :rtype: dict
+    """
+    queries = defaultdict(list)
+    for index, layer in enumerate(layers):
+        if (
+            is_compiled(layer)
+            and layer.check_in_zoom_levels(z)
+            and layer.check_in_data_extent(x, y, z)
+        ):
+            with timing.Stage(layer.get_id(), "query"):
+                using, sql, params = layer.get_tile_query(x, y, z)
+            queries[using].append((index, sql, params))
+    return {
+        using: (
+            "SELECT " + ", ".join(f"({sql})" for _, sql, _ in layer_queries),
+            [param for _, _, sql_params in layer_queries for param in sql_params],
+            [index for index, _, _ in layer_queries],
+        )
+        for using, layer_queries in queries.items()
+    }
+
+
+def get_tiles(layers, x, y, z):
+    """
+    Generate mapbox vector tiles of many layers with one query by database alias.
+
+    Each layer tile is selected in its own column, so tiles are returned in layers order.
+    Layers which can't be compiled in SQL (other backends, custom get_tile) are generated separately.
+
+    :return: Mapbox Vector Tile of each layer
+    :rtype: list
+    """
+    tiles = [b"" if is_compiled(layer) else layer.get_tile(x, y, z) for layer in layers]
+    for using, (sql, params, indexes) in get_tiles_queries(layers, x, y, z).items():
+        # layers tiles are generated together, fetch is timed by database
+        with timing.Stage(None, f"fetch.{using}"):
+            row = fetch_row(using, sql, params)
+        for index, tile in zip(indexes, row):
+            tiles[index] = to_bytes(tile)
+    return tiles
+
+
+async def aget_tiles(layers, x, y, z):
+    """
+    Generate mapbox vector tiles of many layers with one query by database alias, asynchronously.
+    Queries of each database and other layers tiles are run concurrently.
+
+    :return: Mapbox Vector Tile of each layer
+    :rtype: list
+    """
+    queries = await sync_to_async(get_tiles_queries)(layers, x, y, z)
+    other_indexes = [
+        index for index, layer in enumerate(layers) if not is_compiled(layer)
+    ]
+
+    results = await asyncio.gather(
+        *(
+            timing.timed_await(None, f"fetch.{using}", afetch_row(using, sql, params))
+            for using, (sql, params, _) in queries.items()
+        ),
+        *(layers[index].aget_tile(x, y, z) for index in other_indexes),
+    )
+    tiles = [b""] * len(layers)
+    for (sql, params, indexes), row in zip(queries.values(), results):
+        for index, tile in zip(indexes, row):
+            tiles[index] = to_bytes(tile)
+    for index, tile in zip(other_indexes, results[len(queries) :]):
+        tiles[index] = tile
+    return tiles
@@ -0,0 +1,110 @@
+"""
+Asynchronous queries with psycopg 3 connections, configured as django database connections.
+
+Connections are taken from a pool by database alias and event loop if psycopg_pool is installed.
+Pools of an event loop are closed when it shuts down its asynchronous generators, as
+asyncio.run and asgiref async_to_sync do before closing it.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from django.contrib.gis.db.backends.postgis.adapter import PostGISAdapter
+from django.db import connections
+
+from vectortiles import settings as app_settings
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+try:
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    AsyncConnectionPool = None
+
+pools = {}  # event loop -> (pools closer, {database alias: pool})
+
+
+def is_available(using):
+    """Check if database alias can be queried asynchronously"""
+    return psycopg is not None and connections[using].vendor == "postgresql"
+
+
+def get_connection_params(using):
+    connection = connections[using]
+    params = connection.get_connection_params()
+    # django cursor classes are synchronous. Server side binding if django uses it,
+    # to prepare statements with prepare_threshold option.
+    params["cursor_factory"] = (
+        psycopg.AsyncCursor
+        if connection.settings_dict["OPTIONS"].get("server_side_binding") is True
+        else psycopg.AsyncClientCursor
+    )
+    params["autocommit"] = True
+    return params
+
+
+def adapt_params(params):
+    # django geometry adapters are registered on django connections only
+    return [
+        param.ewkb.hex() if isinstance(param, PostGISAdapter) else param
+        for param in params
+    ]
+
+
+async def close_pools(loop):
+    """
+    Close pools of loop when finalized. As an asynchronous generator started in loop,
+    it is finalized by loop shutdown_asyncgens.
+    """
+    try:
+        yield
+    finally:
+        _, loop_pools = pools.pop(loop, (None, {}))
+        for pool in loop_pools.values():
+            await pool.close()
+
+
+async def get_pool(using, loop):
+    if loop not in pools:
+        # pools of loops closed without shutting down their generators can't be
+        # closed anymore, their connections are closed when garbage collected
+        for closed_loop in [other for other in pools if other.is_closed()]:
+            del pools[closed_loop]
+        closer = close_pools(loop)
+        await closer.asend(None)
+        pools[loop] = (closer, {})
+    _, loop_pools = pools[loop]
+    if using not in loop_pools:
+        loop_pools[using] = AsyncConnectionPool(
+            kwargs=get_connection_params(using),
+            max_size=app_settings.VECTOR_TILES_ASYNC_POOL_SIZE,
+            open=False,
+        )
+    pool = loop_pools[using]
+    await pool.open()
+    return pool
+
+
+@asynccontextmanager
+async def connection(using):
+    """Get an asynchronous connection to database alias"""
+    if AsyncConnectionPool is not None:
+        pool = await get_pool(using, asyncio.get_running_loop())
+        async with pool.connection() as pool_connection:
+            yield pool_connection
+    else:
+        async with await psycopg.AsyncConnection.connect(
+            **get_connection_params(using)
+        ) as new_connection:
+            yield new_connection
+
+
+async def fetch_row(using, sql, params):
+    """Execute query and return its first row"""
+    async with connection(using) as db_connection:
+        async with db_connection.cursor() as cursor:
+            await cursor.execute(sql, adapt_params(params))
+            return await cursor.fetchone()
@@ -1,24 +1,41 @@
+import itertools
 import math
+from collections import defaultdict
 
-import mapbox_vector_tile
-from django.contrib.gis.db.models.functions import Intersection, Transform
+import numpy as np
+from django.contrib.gis.db.models.functions import AsWKB, Intersection, Transform
 from django.contrib.gis.geos import Polygon
-from django.db.models import F
+from django.core.exceptions import ImproperlyConfigured
 
-from vectortiles.backends import BaseVectorLayerMixin
+from vectortiles import timing
+from vectortiles.backends import (
+    BaseVectorLayerMixin,
+    ClusteredVectorLayerMixin,
+    GridVectorLayerMixin,
+)
+from vectortiles.backends.python.encoder import LayerEncoder
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
 
 
 class VectorLayer(BaseVectorLayerMixin):
-    def pixel_length(self, zoom, size):
-        radius = 6378137
-        circum = 2 * math.pi * radius
-        return circum / size / 2 ** int(zoom)
+    tile_chunk_size = 2000  # features fetched by chunk, with a server-side cursor
+    clip_in_database = (
+        True  # False: clip, simplify and quantize by chunk with shapely 2, in python
+    )
 
-    def get_tile(self, x, y, z):
-        if not self.check_in_zoom_levels(z):
-            return b""
+    def get_tile_geometry(self, z):
+        if self.clip_in_database:
+            return super().get_tile_geometry(z)
+        # simplified in prepare_geometries
+        return Transform(self.geom_field, 3857)
 
-        features = self.get_vector_tile_queryset(z, x, y)
+    def get_tile_queryset(self, x, y, z):
+        """Get values of tile fields of features in tile, with clipped WKB geometry last"""
+        features = self.get_tile_source_queryset(z, x, y)
 
         # get tile coordinates from x, y and z
         west, south, east, north = self.get_bounds(x, y, z)
@@ -27,41 +44,229 @@ class VectorLayer(BaseVectorLayerMixin):
 
         filters = {f"{self.geom_field}__intersects": bbox}
         features = features.filter(**filters)
+        features = self.group_tile_features(features, z)
+        geometry = self.get_tile_geometry(z)
+        if self.clip_geom and self.clip_in_database:
+            geometry = Intersection(
+                geometry, bbox.buffer(self.pixel_length(z, self.tile_buffer))
+            )
+        features = features.annotate(clipped=AsWKB(geometry))
         # limit feature number if limit provided
-        limit = self.get_queryset_limit()
-        if limit:
-            features = features[:limit]
-        features = features.annotate(
-            clipped=(
-                Intersection(
-                    Transform(self.geom_field, 3857),
-                    bbox.buffer(self.pixel_length(z, self.tile_buffer)),
-                )
-                if self.clip_geom
-                else F("geom")
+        features = self.limit_queryset(features, z)
+        return features.values_list(*self.get_tile_fields_by_zoom(z), "clipped")
+
+    def simplify_geometries(self, geometries, z, simplify=None):
+        """
+        Simplify shapely geometries array, with simplify method or layer one
+
+        :return: shapely geometries array
+        """
+        simplify = simplify or self.get_simplify()
+        if simplify == "preserve_topology":
+            return shapely.simplify(geometries, self.get_simplify_tolerance(z))
+        if simplify == "snap_to_grid":
+            return shapely.set_precision(geometries, self.get_simplify_tolerance(z))
+        if simplify:
+            msg = f"Unsupported simplification method with shapely: {simplify}"
+            raise ValueError(msg)
+        return geometries
+
+    def quantize_geometries(self, geometries, x, y, z):
+        """
+        Clip shapely geometries array in tile, and quantize it in tile coordinates
+
+        :return: shapely geometries array
+        """
+        xmin, ymin, xmax, ymax = self.get_bounds(x, y, z)
+        if self.clip_geom:
+            buffer = self.pixel_length(z, self.tile_buffer)
+            geometries = shapely.clip_by_rect(
+                geometries, xmin - buffer, ymin - buffer, xmax + buffer, ymax + buffer
             )
+        origin = np.array([xmin, ymax])
+        scale = self.tile_extent / (xmax - xmin)
+        # tile y axis is down
+        geometries = shapely.transform(
+            geometries, lambda coordinates: (coordinates - origin) * [scale, -scale]
+        )
+        # snapped on tile pixels, keeping geometries valid
+        return shapely.set_precision(geometries, 1)
+
+    def prepare_geometries(self, geometries, x, y, z):
+        """
+        Simplify, clip and quantize WKB geometries in tile coordinates with shapely,
+        all at once
+
+        :return: WKB geometries in tile coordinates
+        :rtype: list
+        """
+        if shapely is None:
+            msg = "shapely 2 is required to clip geometries with clip_in_database=False"
+            raise ImproperlyConfigured(msg)
+        geometries = shapely.from_wkb(
+            [bytes(geometry) if geometry else None for geometry in geometries]
+        )
+        geometries = self.simplify_geometries(geometries, z)
+        return shapely.to_wkb(self.quantize_geometries(geometries, x, y, z))
+
+    def encode_tile(self, features, x, y, z):
+        """
+        Encode features in a mapbox vector tile
+
+        :param features: values of tile fields with clipped WKB geometry last, by feature
+        :type features: iterable
+        """
+        fields = self.get_tile_fields_by_zoom(z)
+        if self.clip_in_database:
+            encoder = LayerEncoder(
+                self.get_id(), self.get_bounds(x, y, z), self.tile_extent
+            )
+            for feature in features:
+                encoder.add_feature(zip(fields, feature), feature[-1])
+            return encoder.get_tile()
+        encoder = LayerEncoder(self.get_id(), None, self.tile_extent)
+        features = iter(features)
+        while chunk := list(itertools.islice(features, self.tile_chunk_size)):
+            geometries = self.prepare_geometries(
+                [feature[-1] for feature in chunk], x, y, z
+            )
+            for feature, geometry in zip(chunk, geometries):
+                encoder.add_feature(zip(fields, feature), geometry)
+        return encoder.get_tile()
+
+    def get_tile(self, x, y, z):
+        if not self.check_in_zoom_levels(z) or not self.check_in_data_extent(x, y, z):
+            return b""
+        layer_id = self.get_id()
+        with timing.Stage(layer_id, "query"):
+            features = self.get_tile_queryset(x, y, z)
+        # features are fetched by chunks while encoded
+        with timing.Stage(layer_id, "encode") as encode:
+            features = encode.timed(
+                "fetch", features.iterator(chunk_size=self.tile_chunk_size)
+            )
+            return self.encode_tile(features, x, y, z)
+
+
+class ClusteredVectorLayer(ClusteredVectorLayerMixin, VectorLayer):
+    pass
+
+
+def aggregate(function, distinct, values):
+    """Aggregate not null values as SQL aggregate function"""
+    values = [value for value in values if value is not None]
+    if distinct:
+        values = list(set(values))
+    if function == "COUNT":
+        return len(values)
+    if not values:
+        return None
+    if function == "SUM":
+        return sum(values)
+    if function == "AVG":
+        return sum(values) / len(values)
+    if function == "MIN":
+        return min(values)
+    if function == "MAX":
+        return max(values)
+    msg = f"Unsupported grid aggregate function: {function}"
+    raise ValueError(msg)
+
+
+class GridVectorLayer(GridVectorLayerMixin, VectorLayer):
+    def get_tile_queryset(self, x, y, z):
+        """Get values of features in cells intersecting tile, with their grid point"""
+        return (
+            self.get_grid_features(x, y, z)
+            .annotate(grid_point=self.get_grid_point())
+            .values_list(
+                "grid_point",
+                *(
+                    f"grid_{name}"
+                    for name, (_, _, expression) in self.get_grid_aggregates().items()
+                    if expression is not None
+                ),
+                named=True,
+            )
+        )
+
+    def get_cell(self, point, size):
+        """
+        Get cell of a point, as ST_HexagonGrid and ST_SquareGrid indexes
+
+        :return: column and row of cell
+        :rtype: tuple
+        """
+        if self.get_grid_shape() == "square":
+            return math.floor(point.x / size), math.floor(point.y / size)
+        # nearest hexagon center, in one of 2 columns
+        height = size * math.sqrt(3)
+        column = math.floor(point.x / (1.5 * size))
+        cells = []
+        for i in (column, column + 1):
+            j = round(point.y / height - (i % 2) / 2)
+            center_x, center_y = self.get_cell_center(i, j, size)
+            distance = (point.x - center_x) ** 2 + (point.y - center_y) ** 2
+            cells.append((distance, i, j))
+        _, i, j = min(cells)
+        return i, j
+
+    def get_cell_center(self, i, j, size):
+        if self.get_grid_shape() == "square":
+            return (i + 0.5) * size, (j + 0.5) * size
+        # flat topped hexagons, odd columns shifted up by half a hexagon
+        return 1.5 * size * i, size * math.sqrt(3) * (j + (i % 2) / 2)
+
+    def get_cell_polygon(self, i, j, size):
+        center_x, center_y = self.get_cell_center(i, j, size)
+        if self.get_grid_shape() == "square":
+            corners = ((-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5))
+        else:
+            half_height = math.sqrt(3) / 2
+            corners = (
+                (-1, 0),
+                (-0.5, -half_height),
+                (0.5, -half_height),
+                (1, 0),
+                (0.5, half_height),
+                (-0.5, half_height),
+            )
+        coordinates = [
+            (center_x + dx * size, center_y + dy * size) for dx, dy in corners
+        ]
+        return Polygon((*coordinates, coordinates[0]), srid=3857)
+
+    def encode_tile(self, features, x, y, z):
+        """Aggregate features in cells, encoded in a mapbox vector tile"""
+        size = self.get_grid_size(z)
+        aggregates = self.get_grid_aggregates()
+        cells = defaultdict(list)
+        for feature in features:
+            cells[self.get_cell(feature.grid_point, size)].append(feature)
+        bbox = Polygon.from_bbox(self.get_bounds(x, y, z)).buffer(
+            self.pixel_length(z, self.tile_buffer)
         )
-        if features:
-            tile = {
-                "name": self.get_id(),
-                "features": [
-                    {
-                        "geometry": feature.clipped.wkb.tobytes(),
-                        "properties": {
-                            key: getattr(feature, key)
-                            for key in self.tile_fields
-                            if self.tile_fields
-                        },
-                    }
-                    for feature in features
-                ],
-            }
-            return (
-                mapbox_vector_tile.encode(
-                    tile,
-                    quantize_bounds=(west, south, east, north),
-                    extents=self.tile_extent,
+        cells_features = []
+        for (i, j), cell_features in cells.items():
+            polygon = self.get_cell_polygon(i, j, size)
+            if not polygon.intersects(bbox):
+                continue
+            cells_features.append(
+                (
+                    *(
+                        aggregate(
+                            function,
+                            distinct,
+                            (
+                                getattr(feature, f"grid_{name}")
+                                if expression is not None
+                                else 1
+                                for feature in cell_features
+                            ),
+                        )
+                        for name, (function, distinct, expression) in aggregates.items()
+                    ),
+                    (polygon.intersection(bbox) if self.clip_geom else polygon).wkb,
                 )
-                or b""
             )
-        return b""
+        return super().encode_tile(cells_features, x, y, z)
@@ -0,0 +1,303 @@
+"""
+Mapbox vector tile encoder (https://github.com/mapbox/vector-tile-spec/tree/master/2.1)
+
+Features are written in protobuf while added, from WKB geometries: coordinates of each
+ring are quantized, delta and zigzag encoded at once with NumPy.
+"""
+
+import struct
+
+import numpy as np
+
+from vectortiles.protobuf import write_varint
+
+MOVE_TO = 1
+LINE_TO = 2
+CLOSE_PATH = 7
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+# WKB geometry types
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_MULTIPOINT = 4
+WKB_MULTILINESTRING = 5
+WKB_MULTIPOLYGON = 6
+WKB_GEOMETRYCOLLECTION = 7
+EWKB_Z = 0x80000000
+EWKB_M = 0x40000000
+EWKB_SRID = 0x20000000
+
+
+def command(command_id, count):
+    return (count << 3) | command_id
+
+
+def zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+
+def encode_varints(values):
+    """Encode array of unsigned integers in protobuf varints"""
+    values = np.asarray(values, dtype=np.uint64)
+    # up to 10 groups of 7 bits for 64 bits values
+    shifts = np.arange(0, 64, 7, dtype=np.uint64)
+    groups = (values[:, None] >> shifts) & np.uint64(0x7F)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in shifts[1:]:
+        lengths += values >= (np.uint64(1) << shift)
+    used = np.arange(len(shifts)) < lengths[:, None]
+    # continuation bit on all bytes but the last one of each value
+    more = np.arange(len(shifts)) < (lengths - 1)[:, None]
+    groups |= more.astype(np.uint64) << np.uint64(7)
+    return groups[used].astype(np.uint8).tobytes()
+
+
+def write_field(buffer, field, content):
+    """Write a length delimited field"""
+    write_varint(buffer, (field << 3) | 2)
+    write_varint(buffer, len(content))
+    buffer += content
+
+
+def read_geometry(data, offset=0):
+    """
+    Read WKB or EWKB geometry
+
+    :return: points, lines and polygons of geometry, and offset after geometry
+    :rtype: tuple
+    """
+    endian = "<" if data[offset] == 1 else ">"
+    (wkb_type,) = struct.unpack_from(f"{endian}I", data, offset + 1)
+    offset += 5
+    dimensions = 2 + bool(wkb_type & EWKB_Z) + bool(wkb_type & EWKB_M)
+    if wkb_type & EWKB_SRID:
+        offset += 4
+    wkb_type &= 0xFFFF
+    # ISO WKB: 1000 for Z, 2000 for M, 3000 for ZM
+    dimensions += (1, 1, 2)[wkb_type // 1000 - 1] if wkb_type >= 1000 else 0
+    wkb_type %= 1000
+    dtype = np.dtype(f"{endian}f8")
+
+    def read_points(count):
+        nonlocal offset
+        coordinates = np.frombuffer(
+            data, dtype=dtype, count=count * dimensions, offset=offset
+        ).reshape(count, dimensions)[:, :2]
+        offset += count * dimensions * 8
+        return coordinates
+
+    def read_count():
+        nonlocal offset
+        (count,) = struct.unpack_from(f"{endian}I", data, offset)
+        offset += 4
+        return count
+
+    points, lines, polygons = [], [], []
+    if wkb_type == WKB_POINT:
+        point = read_points(1)
+        if not np.isnan(point).any():
+            points.append(point)
+    elif wkb_type == WKB_LINESTRING:
+        lines.append(read_points(read_count()))
+    elif wkb_type == WKB_POLYGON:
+        polygons.append([read_points(read_count()) for _ in range(read_count())])
+    elif wkb_type in (
+        WKB_MULTIPOINT,
+        WKB_MULTILINESTRING,
+        WKB_MULTIPOLYGON,
+        WKB_GEOMETRYCOLLECTION,
+    ):
+        for _ in range(read_count()):
+            part_points, part_lines, part_polygons, offset = read_geometry(data, offset)
+            points += part_points
+            lines += part_lines
+            polygons += part_polygons
+    else:
+        msg = f"Unsupported WKB geometry type: {wkb_type}"
+        raise ValueError(msg)
+    return points, lines, polygons, offset
+
+
+class LayerEncoder:
+    """
+    Encode features of a layer, one by one, in a mapbox vector tile.
+    Geometries coordinates are in bounds, or in tile coordinates if bounds is None.
+    """
+
+    def __init__(self, name, bounds, extent=4096):
+        self.name = name
+        self.extent = extent
+        if bounds is None:
+            self.origin, self.scale = np.zeros(2), np.ones(2)
+        else:
+            xmin, ymin, xmax, ymax = bounds
+            self.origin = np.array([xmin, ymax])
+            # tile y axis is down
+            self.scale = np.array([extent / (xmax - xmin), -extent / (ymax - ymin)])
+        self.features = bytearray()
+        self.keys = {}
+        self.values = {}
+
+    def quantize(self, coordinates):
+        """Get tile coordinates of 3857 coordinates, without repeated points"""
+        coordinates = np.rint((coordinates - self.origin) * self.scale).astype(np.int64)
+        repeated = np.zeros(len(coordinates), dtype=bool)
+        repeated[1:] = (coordinates[1:] == coordinates[:-1]).all(axis=1)
+        return coordinates[~repeated]
+
+    def get_rings(self, polygon):
+        """
+        Get quantized rings of polygon, exterior with positive area, interiors negative.
+        Rings without area are skipped, with interiors if exterior.
+        """
+        rings = []
+        for index, ring in enumerate(polygon):
+            ring = self.quantize(ring)
+            if len(ring) > 1 and (ring[0] == ring[-1]).all():
+                ring = ring[:-1]
+            if len(ring) < 3:
+                area = 0
+            else:
+                x, y = ring[:, 0], ring[:, 1]
+                area = int(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
+            if area == 0:
+                if index == 0:
+                    return []
+                continue
+            if (area > 0) != (index == 0):
+                # reversed, from the same first point
+                ring = np.concatenate((ring[:1], ring[:0:-1]))
+            rings.append(ring)
+        return rings
+
+    def get_commands(self, wkb):
+        """
+        Get geometry type and commands integers of a WKB geometry.
+        Only polygons, or lines, or points of geometry collections are kept.
+
+        :return: geometry type and commands, or None if geometry is empty in tile
+        :rtype: tuple
+        """
+        points, lines, polygons, _ = read_geometry(wkb)
+        parts = []  # quantized coordinates of rings, lines or points
+        if polygons:
+            geom_type = GEOM_POLYGON
+            for polygon in polygons:
+                parts += self.get_rings(polygon)
+        elif lines:
+            geom_type = GEOM_LINESTRING
+            parts = [line for line in map(self.quantize, lines) if len(line) >= 2]
+        elif points:
+            geom_type = GEOM_POINT
+            # a multipoint, without consecutive repeated points
+            parts = [self.quantize(np.concatenate(points))]
+        if not parts:
+            return None
+        coordinates = np.concatenate(parts)
+        # cursor starts at 0, 0 and moves through all parts
+        deltas = zigzag(np.diff(coordinates, axis=0, prepend=[[0, 0]])).reshape(-1)
+        commands = []
+        start = 0
+        for part in parts:
+            count = len(part)
+            if geom_type == GEOM_POINT:
+                commands += [[command(MOVE_TO, count)], deltas[: 2 * count]]
+                continue
+            commands += [
+                [command(MOVE_TO, 1)],
+                deltas[start : start + 2],
+                [command(LINE_TO, count - 1)],
+                deltas[start + 2 : start + 2 * count],
+            ]
+            if geom_type == GEOM_POLYGON:
+                commands.append([command(CLOSE_PATH, 1)])
+            start += 2 * count
+        return geom_type, np.concatenate(commands)
+
+    def get_key_index(self, key):
+        if key not in self.keys:
+            self.keys[key] = len(self.keys)
+        return self.keys[key]
+
+    def get_value_index(self, value):
+        if not isinstance(value, (str, bool, int, float)):
+            value = str(value)
+        # 1, 1.0 and True are different values
+        value_key = (type(value), value)
+        if value_key not in self.values:
+            self.values[value_key] = len(self.values)
+        return self.values[value_key]
+
+    def add_feature(self, properties, wkb):
+        """
+        Add a feature to layer. None properties are skipped.
+
+        :param properties: key and value of each feature property
+        :type properties: iterable
+        :param wkb: geometry in tile bounds coordinate system
+        :type wkb: bytes
+        :return: False if geometry is empty in tile
+        :rtype: bool
+        """
+        geometry = self.get_commands(wkb) if wkb else None
+        if geometry is None:
+            return False
+        geom_type, commands = geometry
+        tags = []
+        for key, value in properties:
+            if value is not None:
+                tags += (self.get_key_index(key), self.get_value_index(value))
+        feature = bytearray()
+        if tags:
+            write_field(feature, 2, encode_varints(tags))
+        write_varint(feature, (3 << 3) | 0)
+        write_varint(feature, geom_type)
+        write_field(feature, 4, encode_varints(commands))
+        write_field(self.features, 2, feature)
+        return True
+
+    def encode_value(self, value_type, value):
+        content = bytearray()
+        if value_type is str:
+            write_field(content, 1, value.encode())
+        elif value_type is float:
+            write_varint(content, (3 << 3) | 1)
+            content += struct.pack("<d", value)
+        elif value_type is bool:
+            write_varint(content, (7 << 3) | 0)
+            write_varint(content, int(value))
+        elif value >= 0:
+            write_varint(content, (5 << 3) | 0)
+            write_varint(content, value)
+        else:
+            # sint64
+            write_varint(content, (6 << 3) | 0)
+            write_varint(content, (value << 1) ^ (value >> 63))
+        return content
+
+    def get_tile(self):
+        """
+        Get mapbox vector tile of added features
+
+        :return: tile with layer, or empty bytes without features
+        :rtype: bytes
+        """
+        if not self.features:
+            return b""
+        layer = bytearray()
+        write_varint(layer, (15 << 3) | 0)
+        write_varint(layer, 2)  # version
+        write_field(layer, 1, self.name.encode())
+        layer += self.features
+        for key in self.keys:
+            write_field(layer, 3, key.encode())
+        for value_type, value in self.values:
+            write_field(layer, 4, self.encode_value(value_type, value))
+        write_varint(layer, (5 << 3) | 0)
+        write_varint(layer, self.extent)
+        tile = bytearray()
+        write_field(tile, 3, layer)
+        return bytes(tile)
@@ -0,0 +1,95 @@
+"""
+Gzip compression of tiles, by layer.
+
+Each layer tile is compressed once, in a raw deflate segment ending on a byte boundary.
+Segments of a tile layers are joined in a single gzip member, without compressing again.
+"""
+
+import zlib
+from functools import lru_cache
+
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+DEFLATE_END = b"\x03\x00"  # final empty block
+CRC32_POLYNOMIAL = 0xEDB88320
+
+
+def compress_segment(content, level=6):
+    """
+    Compress content in a raw deflate segment
+
+    :return: segment, crc32 and length of content
+    :rtype: tuple
+    """
+    if not content:
+        return b"", 0, 0
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    segment = compressor.compress(content) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return segment, zlib.crc32(content), len(content)
+
+
+def decompress_segment(compressed):
+    """Get content of compress_segment result"""
+    return zlib.decompressobj(-zlib.MAX_WBITS).decompress(compressed[0])
+
+
+def gf2_matrix_times(matrix, vector):
+    result = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            result ^= row
+        vector >>= 1
+    return result
+
+
+def gf2_matrix_square(matrix):
+    return [gf2_matrix_times(matrix, row) for row in matrix]
+
+
+@lru_cache(maxsize=None)  # noqa: UP033 Python 3.8
+def get_crc32_zeros_operators():
+    """Get operators appending 2^n zero bytes to a crc32, for n in 0 - 31"""
+    operator = [CRC32_POLYNOMIAL] + [1 << n for n in range(31)]  # one zero bit
+    for _ in range(3):
+        operator = gf2_matrix_square(operator)
+    operators = [operator]
+    for _ in range(31):
+        operators.append(gf2_matrix_square(operators[-1]))
+    return operators
+
+
+def crc32_combine(crc1, crc2, length2):
+    """Get crc32 of concatenated contents from their crc32, as zlib crc32_combine"""
+    for operator in get_crc32_zeros_operators():
+        if not length2:
+            break
+        if length2 & 1:
+            crc1 = gf2_matrix_times(operator, crc1)
+        length2 >>= 1
+    return crc1 ^ crc2
+
+
+def join_segments(segments):
+    """
+    Join compressed segments in gzip content
+
+    :return: gzip content, or empty bytes if segments are empty
+    :rtype: bytes
+    """
+    crc, length = 0, 0
+    for _, segment_crc, segment_length in segments:
+        if segment_length:
+            crc = crc32_combine(crc, segment_crc, segment_length)
+            length += segment_length
+    if not length:
+        return b""
+    return b"".join(
+        (
+            GZIP_HEADER,
+            *(segment for segment, _, _ in segments),
+            DEFLATE_END,
+            crc.to_bytes(4, "little"),
+            (length & 0xFFFFFFFF).to_bytes(4, "little"),
+        )
+    )
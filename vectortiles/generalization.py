@@ -0,0 +1,183 @@
+"""
+Generalized copies of layer data, stored in a PostgreSQL materialized view by zoom range.
+
+Views are created and refreshed by generalize_layer management command. Tiles of a
+generalized zoom range are generated from its view, through an unmanaged model.
+"""
+
+from django.apps.registry import Apps
+from django.contrib.gis.db.models import GeometryField
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models, transaction
+from django.db.backends.utils import truncate_name
+from django.db.models import ExpressionWrapper
+from django.utils.module_loading import import_string
+
+from vectortiles.backends.postgis.functions import RawGeometryField
+
+GEOMETRY_COLUMN = "generalized_geom"
+ID_COLUMN = "generalized_id"
+MAX_NAME_LENGTH = 63  # PostgreSQL identifiers
+
+sources = {}  # view name -> (model, database alias)
+
+
+def get_view_name(layer, min_zoom, max_zoom):
+    return truncate_name(
+        layer.get_generalized_table(min_zoom, max_zoom), MAX_NAME_LENGTH
+    )
+
+
+def get_columns(queryset):
+    """
+    Get columns selected by a values queryset, in select order
+
+    :return: column name and output field of each column
+    :rtype: list
+    """
+    query = queryset.query
+    return [
+        *(
+            (name, col.output_field)
+            for name, col in zip(query.values_select, query.select)
+        ),
+        *(
+            (name, annotation.output_field)
+            for name, annotation in query.annotation_select.items()
+        ),
+    ]
+
+
+def get_column_field(field, primary_key=False):
+    """Get a model field reading a column of field type, without other constraints"""
+    if field.is_relation:
+        field = field.target_field
+    if isinstance(field, models.fields.AutoFieldMixin):
+        return models.BigIntegerField(primary_key=primary_key, null=not primary_key)
+    _, path, args, kwargs = field.deconstruct()
+    for key in ("unique", "db_index", "db_column", "default"):
+        kwargs.pop(key, None)
+    kwargs.update(primary_key=primary_key, null=not primary_key)
+    return import_string(path)(*args, **kwargs)
+
+
+def get_generalized_source(layer, min_zoom, max_zoom):
+    """Get queryset of layer generalized view of zoom range"""
+    name = get_view_name(layer, min_zoom, max_zoom)
+    if name not in sources:
+        queryset = layer.get_generalized_queryset(min_zoom, max_zoom)
+        attrs = {
+            "__module__": __name__,
+            "Meta": type(
+                "Meta",
+                (),
+                {
+                    # not registered in project apps, no migration
+                    "apps": Apps(),
+                    "app_label": "vectortiles",
+                    "db_table": name,
+                    "managed": False,
+                },
+            ),
+        }
+        for column, field in get_columns(queryset):
+            if column == GEOMETRY_COLUMN:
+                attrs[layer.geom_field] = GeometryField(
+                    srid=3857, db_column=GEOMETRY_COLUMN
+                )
+            elif column == ID_COLUMN:
+                attrs[column] = get_column_field(field, primary_key=True)
+            else:
+                attrs[column] = get_column_field(field)
+        model = type("GeneralizedFeature", (models.Model,), attrs)
+        sources[name] = (model, queryset.db)
+    model, using = sources[name]
+    return model._default_manager.using(using)
+
+
+def view_exists(layer, min_zoom, max_zoom):
+    using = layer.get_generalized_queryset(min_zoom, max_zoom).db
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_matviews WHERE matviewname = %s",
+            [get_view_name(layer, min_zoom, max_zoom)],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_view_sql(queryset):
+    """
+    Get SQL selecting generalized queryset rows, with geometry columns kept as
+    geometries instead of bytea casted geometries
+
+    :return: sql and params
+    :rtype: tuple
+    """
+    query = queryset.query.clone()
+    annotations = dict(query.annotation_select)
+    for column, annotation in annotations.items():
+        if isinstance(annotation.output_field, GeometryField):
+            query.annotations[column] = ExpressionWrapper(
+                annotation, output_field=RawGeometryField()
+            )
+    # values queries cache their selected annotations (Django < 5)
+    query.set_annotation_mask(annotations)
+    return query.sql_with_params()
+
+
+def create_view(layer, min_zoom, max_zoom):
+    """
+    Create generalized view of zoom range, with id and spatial indexes.
+    Rows keep their id across refreshes, so only changed rows are written.
+    """
+    queryset = layer.get_generalized_queryset(min_zoom, max_zoom)
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    name = get_view_name(layer, min_zoom, max_zoom)
+    columns = [column for column, _ in get_columns(queryset)]
+    if ID_COLUMN not in columns:
+        msg = f"Generalized queryset of {layer.get_id()} must select {ID_COLUMN} values"
+        raise ImproperlyConfigured(msg)
+    sql, params = get_view_sql(queryset)
+    with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE MATERIALIZED VIEW {quote_name(name)} "
+            f"({', '.join(quote_name(column) for column in columns)}) AS "
+            f"SELECT * FROM ({sql}) AS generalized",
+            params,
+        )
+        # unique index is required to refresh view concurrently
+        cursor.execute(
+            f"CREATE UNIQUE INDEX {quote_name(truncate_name(f'{name}_id', MAX_NAME_LENGTH))} "
+            f"ON {quote_name(name)} ({quote_name(ID_COLUMN)})"
+        )
+        cursor.execute(
+            f"CREATE INDEX {quote_name(truncate_name(f'{name}_geom', MAX_NAME_LENGTH))} "
+            f"ON {quote_name(name)} USING GIST ({quote_name(GEOMETRY_COLUMN)})"
+        )
+
+
+def refresh_view(layer, min_zoom, max_zoom):
+    """
+    Refresh generalized view of zoom range. Only changed rows are written,
+    and view can be read during refresh.
+    """
+    using = layer.get_generalized_queryset(min_zoom, max_zoom).db
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "REFRESH MATERIALIZED VIEW CONCURRENTLY "
+            f"{connection.ops.quote_name(get_view_name(layer, min_zoom, max_zoom))}"
+        )
+
+
+def drop_view(layer, min_zoom, max_zoom):
+    using = layer.get_generalized_queryset(min_zoom, max_zoom).db
+    connection = connections[using]
+    name = get_view_name(layer, min_zoom, max_zoom)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DROP MATERIALIZED VIEW IF EXISTS {connection.ops.quote_name(name)}"
+        )
+    # view columns may change
+    sources.pop(name, None)
@@ -0,0 +1,348 @@
+"""
+Evict cached layer tiles when instances of the layer model are saved or deleted.
+
+Only tiles covered by the old and new geometry are evicted, from layer min zoom up to the
+zoom level where too many tiles are covered. Layer cache generations of this zoom level
+and higher ones are renewed, making their cached tiles unreachable.
+Covered tiles are cleared in empty tiles bitmaps.
+Cached layer data extent is evicted if geometries are outside of it.
+Data of in memory layers is reloaded.
+"""
+
+import math
+import time
+from collections import defaultdict
+
+from django.contrib.gis.db.models import GeometryField
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+MERCATOR_MAX = 20037508.342789244
+
+registry = defaultdict(list)  # model -> layer classes
+# data version key -> data version in process and time it was read in layer cache
+data_versions = {}
+
+
+def get_tiles_cover(extent, min_zoom, max_zoom, buffer=0, limit=None):
+    """
+    Get x, y, z tiles covering an extent
+
+    :param extent: xmin, ymin, xmax, ymax in 3857 coordinate system
+    :type extent: tuple
+    :param buffer: buffer around extent, as tile size ratio
+    :type buffer: float
+    :param limit: maximum tile number
+    :type limit: int
+
+    :return: covering tiles, or None if there are more than limit tiles
+    :rtype: list
+    """
+    xmin, ymin, xmax, ymax = (
+        min(max(coordinate, -MERCATOR_MAX), MERCATOR_MAX) for coordinate in extent
+    )
+    tiles = []
+    for z in range(min_zoom, max_zoom + 1):
+        count = 2**z
+        size = 2 * MERCATOR_MAX / count
+        margin = size * buffer
+        x_min = max(math.floor((xmin - margin + MERCATOR_MAX) / size), 0)
+        x_max = min(math.floor((xmax + margin + MERCATOR_MAX) / size), count - 1)
+        y_min = max(math.floor((MERCATOR_MAX - ymax - margin) / size), 0)
+        y_max = min(math.floor((MERCATOR_MAX - ymin + margin) / size), count - 1)
+        if (
+            limit is not None
+            and len(tiles) + (x_max - x_min + 1) * (y_max - y_min + 1) > limit
+        ):
+            return None
+        tiles.extend(
+            (x, y, z) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)
+        )
+    return tiles
+
+
+def get_generation_keys(layers, z):
+    """
+    Get generation keys of tiles at zoom level z, and of their parent tiles for
+    inherited empty tiles bitmaps
+
+    :return: {cache alias: {generation key: [(layer index, zoom level)]}}
+    :rtype: dict
+    """
+    generation_keys = defaultdict(dict)
+    for index, layer in enumerate(layers):
+        if layer.cache_invalidation and layer.get_cache_timeout():
+            keys = generation_keys[layer.get_cache_alias()]
+            zooms = layer.get_empty_tiles_zooms(z) if layer.empty_tiles_bitmap else [z]
+            for zoom in zooms:
+                key = layer.get_cache_generation_key(zoom)
+                keys.setdefault(key, []).append((index, zoom))
+    return generation_keys
+
+
+def get_generations(keys, values):
+    generations = defaultdict(dict)
+    for key, zooms in keys.items():
+        for index, zoom in zooms:
+            generations[index][zoom] = values[key]
+    return generations
+
+
+def get_layers_generations(layers, z):
+    """
+    Get cache generations of layers with cache invalidation, for tiles at zoom level z.
+    Missing generations are initialized.
+
+    :return: {zoom level: generation} by layer index
+    :rtype: dict
+    """
+    generations = {}
+    for alias, keys in get_generation_keys(layers, z).items():
+        cache = caches[alias]
+        values = cache.get_many(keys)
+        for key in keys.keys() - values.keys():
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+        generations.update(get_generations(keys, values))
+    return generations
+
+
+async def aget_layers_generations(layers, z):
+    """Asynchronous version of get_layers_generations"""
+    generations = {}
+    for alias, keys in get_generation_keys(layers, z).items():
+        cache = caches[alias]
+        values = await cache.aget_many(keys)
+        for key in keys.keys() - values.keys():
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            values[key] = await cache.aget(key)
+        generations.update(get_generations(keys, values))
+    return generations
+
+
+def get_covered_tiles(layer, extents):
+    """
+    Get tiles of layer covered by extents, by zoom level from layer min zoom, until
+    cache_invalidation_max_tiles is reached
+
+    :return: covered tiles, and first zoom level with too many tiles (or None)
+    :rtype: tuple
+    """
+    max_tiles = layer.cache_invalidation_max_tiles
+    tiles = set()
+    for z in range(layer.get_min_zoom(), layer.get_max_zoom() + 1):
+        zoom_tiles = set()
+        for extent in extents:
+            cover = get_tiles_cover(
+                extent,
+                z,
+                z,
+                buffer=layer.tile_buffer / layer.tile_extent,
+                limit=max_tiles - len(tiles),
+            )
+            if cover is None:
+                return tiles, z
+            zoom_tiles.update(cover)
+        if len(tiles) + len(zoom_tiles) > max_tiles:
+            return tiles, z
+        tiles |= zoom_tiles
+    return tiles, None
+
+
+def invalidate_layer_tiles(layer, extents):
+    """
+    Evict cached tiles of layer covered by extents. Generations of zoom levels with
+    too many covered tiles are renewed.
+    """
+    cache = caches[layer.get_cache_alias()]
+    generation_keys = {
+        z: layer.get_cache_generation_key(z)
+        for z in range(layer.get_min_zoom(), layer.get_max_zoom() + 1)
+    }
+    values = cache.get_many(generation_keys.values())
+    # zoom levels without generation have no reachable cached tile
+    generations = {
+        z: values[key] for z, key in generation_keys.items() if key in values
+    }
+    if not generations:
+        return
+    tiles, renewed_zoom = get_covered_tiles(layer, extents)
+    tiles = [(x, y, z) for x, y, z in tiles if z in generations]
+    cache.delete_many(
+        [
+            layer.get_cache_key(x, y, z, generations[z], compressed)
+            for x, y, z in tiles
+            for compressed in (False, True)
+        ]
+    )
+    if layer.empty_tiles_bitmap:
+        clear_empty_tiles(layer, generations, tiles)
+    if renewed_zoom is not None:
+        generation = time.time_ns()
+        cache.set_many(
+            {
+                key: generation
+                for z, key in generation_keys.items()
+                if z >= renewed_zoom and z in generations
+            },
+            timeout=None,
+        )
+
+
+def clear_empty_tiles(layer, generations, tiles):
+    """
+    Clear tiles in layer empty tiles bitmaps
+
+    :param generations: {zoom level: cache generation}
+    """
+    cache = caches[layer.get_cache_alias()]
+    masks = defaultdict(int)
+    for x, y, z in tiles:
+        key, bit = layer.get_empty_tiles_bitmap(x, y, z, generations.get(z))
+        masks[key] |= bit
+    bitmaps = cache.get_many(masks)
+    cache.set_many(
+        {key: bitmap & ~masks[key] for key, bitmap in bitmaps.items()},
+        timeout=layer.get_cache_timeout(),
+    )
+
+
+def invalidate_layer_extent(layer, extents):
+    """Evict cached data extent of layer if extents are not within it"""
+    cache = caches[layer.get_cache_alias()]
+    key = layer.get_extent_cache_key()
+    data_extent = cache.get(key)
+    if data_extent is None:
+        return
+    if not data_extent or any(
+        extent[0] < data_extent[0]
+        or extent[1] < data_extent[1]
+        or extent[2] > data_extent[2]
+        or extent[3] > data_extent[3]
+        for extent in extents
+    ):
+        cache.delete(key)
+
+
+def invalidate_layer_data(layer):
+    """Renew version of layer data, reloaded by in memory layers"""
+    key, version = layer.get_data_version_key(), time.time_ns()
+    caches[layer.get_cache_alias()].set(key, version, timeout=None)
+    data_versions[key] = (version, time.monotonic())
+
+
+def get_geometry_field_name(model, layer_class):
+    try:
+        field = model._meta.get_field(layer_class.geom_field)
+        if isinstance(field, GeometryField):
+            return field.name
+    except FieldDoesNotExist:
+        pass
+    # layer geometry is annotated, use model geometry
+    for field in model._meta.concrete_fields:
+        if isinstance(field, GeometryField):
+            return field.name
+    msg = f"{model._meta.label} has no geometry field"
+    raise ValueError(msg)
+
+
+def get_extents(geometries):
+    extents = []
+    for geometry in geometries:
+        if geometry is not None and not geometry.empty:
+            extents.append(geometry.transform(3857, clone=True).extent)
+    return extents
+
+
+def invalidate(instance, layer_class, geometries, using):
+    layers = [
+        layer
+        for layer in layer_class.get_invalidated_layers(instance)
+        if (layer.cache_invalidation and layer.get_cache_timeout())
+        or layer.extent_check
+        or getattr(layer, "data_invalidation", False)
+    ]
+    extents = get_extents(geometries)
+
+    def invalidate_layers():
+        for layer in layers:
+            if layer.cache_invalidation and layer.get_cache_timeout():
+                invalidate_layer_tiles(layer, extents)
+            if layer.extent_check:
+                invalidate_layer_extent(layer, extents)
+            if getattr(layer, "data_invalidation", False):
+                invalidate_layer_data(layer)
+
+    if layers and extents:
+        transaction.on_commit(invalidate_layers, using=using)
+
+
+def on_pre_save(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    field_names = {
+        get_geometry_field_name(sender, layer_class) for layer_class in registry[sender]
+    }
+    instance._vectortiles_old_geometries = (
+        sender._base_manager.using(using)
+        .filter(pk=instance.pk)
+        .values(*field_names)
+        .first()
+    ) or {}
+
+
+def on_post_save(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    old_geometries = getattr(instance, "_vectortiles_old_geometries", {})
+    for layer_class in registry[sender]:
+        field_name = get_geometry_field_name(sender, layer_class)
+        invalidate(
+            instance,
+            layer_class,
+            [old_geometries.get(field_name), getattr(instance, field_name)],
+            using,
+        )
+
+
+def on_post_delete(sender, instance, using=None, **kwargs):
+    for layer_class in registry[sender]:
+        field_name = get_geometry_field_name(sender, layer_class)
+        invalidate(instance, layer_class, [getattr(instance, field_name)], using)
+
+
+def connect(layer_class, model=None):
+    """
+    Evict cached tiles of layer_class when model instances are saved or deleted.
+    Call it in your AppConfig.ready method.
+
+    :param layer_class: vector layer class, with cache_invalidation, extent_check or
+        data_invalidation enabled
+    :param model: model to watch. By default, layer model or queryset model
+    """
+    if model is None:
+        model = (
+            layer_class.model
+            if layer_class.model is not None
+            else layer_class.queryset.model
+        )
+    if layer_class not in registry[model]:
+        registry[model].append(layer_class)
+    dispatch_uid = f"vectortiles-{model._meta.label}"
+    pre_save.connect(on_pre_save, sender=model, dispatch_uid=dispatch_uid)
+    post_save.connect(on_post_save, sender=model, dispatch_uid=dispatch_uid)
+    post_delete.connect(on_post_delete, sender=model, dispatch_uid=dispatch_uid)
+
+
+def disconnect(layer_class, model=None):
+    """Stop evicting cached tiles of layer_class on model changes"""
+    for watched_model, layer_classes in registry.items():
+        if model in (None, watched_model) and layer_class in layer_classes:
+            layer_classes.remove(layer_class)
+        if not layer_classes:
+            dispatch_uid = f"vectortiles-{watched_model._meta.label}"
+            pre_save.disconnect(sender=watched_model, dispatch_uid=dispatch_uid)
+            post_save.disconnect(sender=watched_model, dispatch_uid=dispatch_uid)
+            post_delete.disconnect(sender=watched_model, dispatch_uid=dispatch_uid)
@@ -0,0 +1,278 @@
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import django
+import mercantile
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from vectortiles.backends import BaseVectorLayerMixin
+from vectortiles.mixins import BaseTileJSONView, BaseVectorTileView
+
+
+def get_view_class(path):
+    """
+    Get vector tile view class from dotted path of a view or a vector layer class
+    """
+    try:
+        klass = import_string(path)
+    except ImportError as exc:
+        msg = f"Unable to import '{path}'"
+        raise CommandError(msg) from exc
+    if isinstance(klass, type) and issubclass(klass, BaseVectorTileView):
+        return klass
+    if isinstance(klass, type) and issubclass(klass, BaseVectorLayerMixin):
+        return type(
+            f"{klass.__name__}View", (BaseVectorTileView,), {"layer_classes": [klass]}
+        )
+    msg = f"'{path}' is not a vector tile view or a vector layer class"
+    raise CommandError(msg)
+
+
+def get_view(path):
+    view = get_view_class(path)()
+    view.request = None
+    return view
+
+
+def get_tilejson(view, tilejson_path=None):
+    """
+    Get TileJSON of view layers, without tile urls
+
+    :param tilejson_path: dotted path to a TileJSON view class. By default, view class if
+                          it's a TileJSON view, or a default TileJSON view with view layers.
+    """
+    if tilejson_path:
+        tilejson_class = import_string(tilejson_path)
+    elif isinstance(view, BaseTileJSONView):
+        tilejson_class = type(view)
+    else:
+        layers = view.get_layers()
+        tilejson_class = type(
+            "TileJSONView", (BaseTileJSONView,), {"get_layers": lambda self: layers}
+        )
+    # exported tiles are not served by an url
+    tilejson_class = type(
+        tilejson_class.__name__,
+        (tilejson_class,),
+        {"get_tile_urls": lambda self, tile_url: []},
+    )
+    tilejson_view = tilejson_class()
+    tilejson_view.request = None
+    return tilejson_view.get_tilejson(None)
+
+
+def get_tile_ranges(bbox, min_zoom, max_zoom):
+    """
+    Get x and y tile ranges covering bbox for each zoom level
+
+    :param bbox: west, south, east, north in 4326 coordinate system
+    :type bbox: tuple
+
+    :return: (z, x range, y range) for each zoom
+    :rtype: list
+    """
+    west, south, east, north = bbox
+    # keep bbox in web mercator limits
+    south, north = max(south, -85.051129), min(north, 85.051129)
+    ranges = []
+    for z in range(min_zoom, max_zoom + 1):
+        upper_left = mercantile.tile(west, north, z)
+        # bottom right corner on tile limit belongs to the tile before
+        epsilon = 1e-9
+        lower_right = mercantile.tile(east - epsilon, south + epsilon, z)
+        x_min, y_min = max(upper_left.x, 0), max(upper_left.y, 0)
+        x_max = min(max(lower_right.x, x_min), 2**z - 1)
+        y_max = min(max(lower_right.y, y_min), 2**z - 1)
+        ranges.append((z, range(x_min, x_max + 1), range(y_min, y_max + 1)))
+    return ranges
+
+
+def iter_tile_chunks(tile_ranges, chunk_size):
+    """
+    Yield chunk id and z, x, y tiles list by chunk of chunk_size tiles.
+    Chunk ids are stable for same ranges, to resume a previous run.
+    """
+    for z, x_range, y_range in tile_ranges:
+        count = len(x_range) * len(y_range)
+        for chunk in range(math.ceil(count / chunk_size)):
+            tiles = []
+            for index in range(
+                chunk * chunk_size, min((chunk + 1) * chunk_size, count)
+            ):
+                x = x_range[index // len(y_range)]
+                y = y_range[index % len(y_range)]
+                tiles.append((z, x, y))
+            yield f"{z}-{chunk}", tiles
+
+
+worker_views = {}
+
+
+def init_worker():
+    # each worker opens its own database connections
+    django.setup()
+
+
+def render_tiles(path, tiles, with_content=False):
+    """
+    Render tiles of a view (through layers cache)
+
+    :return: rendered tiles number, or z, x, y and content of each tile if with_content
+    """
+    if path not in worker_views:
+        worker_views[path] = get_view(path)
+    view = worker_views[path]
+    contents = [(z, x, y, view.get_layer_tiles(z, x, y)) for z, x, y in tiles]
+    return contents if with_content else len(contents)
+
+
+class BaseTilesCommand(BaseCommand):
+    """Base command to handle tiles of a vector tile view or a vector layer"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            help="Dotted path to a vector tile view class or a vector layer class",
+        )
+        parser.add_argument(
+            "--bbox",
+            default="data",
+            help="west,south,east,north in EPSG:4326, or 'data' to use layers data extent",
+        )
+        parser.add_argument("--min-zoom", type=int, default=0)
+        parser.add_argument("--max-zoom", type=int, required=True)
+
+    def get_bbox(self, view, bbox):
+        if bbox != "data":
+            try:
+                west, south, east, north = (float(value) for value in bbox.split(","))
+            except ValueError as exc:
+                msg = "bbox should be 'data' or west,south,east,north"
+                raise CommandError(msg) from exc
+            return west, south, east, north
+
+        extents = [
+            extent
+            for extent in (layer.get_extent() for layer in view.get_layers())
+            if extent
+        ]
+        if not extents:
+            return None
+        return (
+            min(extent[0] for extent in extents),
+            min(extent[1] for extent in extents),
+            max(extent[2] for extent in extents),
+            max(extent[3] for extent in extents),
+        )
+
+    def get_tile_ranges(self, bbox, options):
+        if options["min_zoom"] > options["max_zoom"]:
+            msg = "min-zoom must be lower than equal than max-zoom"
+            raise CommandError(msg)
+        if bbox is None:
+            return []
+        return get_tile_ranges(bbox, options["min_zoom"], options["max_zoom"])
+
+    def render_chunks(self, path, chunks, workers=1, with_content=False):
+        """
+        Render chunks of tiles, in a process pool if many workers.
+        Yield chunk id and render_tiles result of each chunk.
+        """
+        self.rendered, self.start = 0, time.monotonic()
+        self.last_report = self.start
+        if workers <= 1:
+            for chunk_id, tiles in chunks:
+                yield chunk_id, render_tiles(path, tiles, with_content)
+            return
+
+        # connections can't be shared with forked processes
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            pending = {}
+            for chunk_id, tiles in chunks:
+                future = pool.submit(render_tiles, path, tiles, with_content)
+                pending[future] = chunk_id
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+            for future in wait(pending).done:
+                yield pending.pop(future), future.result()
+
+    def report_progress(self, chunk_id, count, total):
+        self.rendered += count
+        now = time.monotonic()
+        if self.verbosity > 1 or now - self.last_report > 10:
+            self.last_report = now
+            self.stdout.write(
+                f"zoom {chunk_id.split('-')[0]}: {self.rendered}/{total} tiles "
+                f"({self.rendered / (now - self.start):.1f} tiles/s)"
+            )
+
+
+class BaseExportCommand(BaseTilesCommand):
+    """Base command to export tiles of a vector tile view or a vector layer in a file"""
+
+    output_help = "Output file path"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("output", help=self.output_help)
+        parser.add_argument(
+            "--tilejson-view",
+            help="Dotted path to a TileJSON view class used to fill metadata",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of rendering processes"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=256, help="Number of tiles by task"
+        )
+
+    def get_writer(self, output, tilejson):
+        """
+        Get writer with write_tiles(tiles) and close() methods
+
+        :param output: output file path
+        :type output: Path
+        :param tilejson: TileJSON of exported tiles
+        :type tilejson: dict
+        """
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        path = options["path"]
+        view = get_view(path)
+        bbox = self.get_bbox(view, options["bbox"])
+        tile_ranges = self.get_tile_ranges(bbox, options)
+        total = sum(len(x_range) * len(y_range) for _, x_range, y_range in tile_ranges)
+
+        tilejson = get_tilejson(view, options["tilejson_view"])
+        tilejson["minzoom"], tilejson["maxzoom"] = (
+            options["min_zoom"],
+            options["max_zoom"],
+        )
+        if bbox:
+            tilejson["bounds"] = list(bbox)
+        output = Path(options["output"])
+        tilejson["name"] = tilejson["name"] or output.stem
+
+        output.unlink(missing_ok=True)
+        writer = self.get_writer(output, tilejson)
+        chunks = iter_tile_chunks(tile_ranges, options["chunk_size"])
+        try:
+            for chunk_id, tiles in self.render_chunks(
+                path, chunks, options["workers"], with_content=True
+            ):
+                writer.write_tiles(tiles)
+                self.report_progress(chunk_id, len(tiles), total)
+        finally:
+            writer.close()
+        self.stdout.write(
+            self.style.SUCCESS(f"{self.rendered} tiles exported to {output}")
+        )
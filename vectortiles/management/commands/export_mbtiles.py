@@ -0,0 +1,10 @@
+from vectortiles.management.base import BaseExportCommand
+from vectortiles.mbtiles import MBTilesWriter, get_metadata
+
+
+class Command(BaseExportCommand):
+    help = "Export tiles of a vector tile view or a vector layer in a MBTiles file"
+    output_help = "MBTiles file path"
+
+    def get_writer(self, output, tilejson):
+        return MBTilesWriter(output, get_metadata(tilejson))
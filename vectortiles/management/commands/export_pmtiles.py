@@ -0,0 +1,10 @@
+from vectortiles.management.base import BaseExportCommand
+from vectortiles.pmtiles import PMTilesWriter
+
+
+class Command(BaseExportCommand):
+    help = "Export tiles of a vector tile view or a vector layer in a PMTiles archive"
+    output_help = "PMTiles archive path"
+
+    def get_writer(self, output, tilejson):
+        return PMTilesWriter(output, tilejson)
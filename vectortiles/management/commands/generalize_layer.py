@@ -0,0 +1,44 @@
+from django.core.management import BaseCommand
+
+from vectortiles import generalization
+from vectortiles.management.base import get_view
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or refresh generalized materialized views of vector layers, "
+        "for their generalized_zooms"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            help="Dotted path to a vector tile view class or a vector layer class",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop and create views again, when generalized querysets changed",
+        )
+        parser.add_argument("--drop", action="store_true", help="Drop views")
+
+    def handle(self, *args, **options):
+        for layer in get_view(options["path"]).get_layers():
+            zooms = layer.get_generalized_zooms()
+            if not zooms:
+                self.stderr.write(
+                    self.style.WARNING(f"{layer.get_id()}: no generalized zooms")
+                )
+            for min_zoom, max_zoom in zooms:
+                name = generalization.get_view_name(layer, min_zoom, max_zoom)
+                if options["drop"] or options["rebuild"]:
+                    generalization.drop_view(layer, min_zoom, max_zoom)
+                    if options["drop"]:
+                        self.stdout.write(f"{name} dropped")
+                        continue
+                if generalization.view_exists(layer, min_zoom, max_zoom):
+                    generalization.refresh_view(layer, min_zoom, max_zoom)
+                    self.stdout.write(f"{name} refreshed")
+                else:
+                    generalization.create_view(layer, min_zoom, max_zoom)
+                    self.stdout.write(self.style.SUCCESS(f"{name} created"))
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from vectortiles.management.base import BaseTilesCommand, get_view, iter_tile_chunks
+
+
+class Command(BaseTilesCommand):
+    help = "Render tiles of a vector tile view or a vector layer in layers cache"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of rendering processes"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=256, help="Number of tiles by task"
+        )
+        parser.add_argument(
+            "--resume",
+            help="File to store rendered chunks. Already rendered chunks are skipped.",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        path = options["path"]
+        view = get_view(path)
+        if not any(layer.get_cache_timeout() for layer in view.get_layers()):
+            self.stderr.write(
+                self.style.WARNING("No layer cache enabled, tiles will not be stored.")
+            )
+        bbox = self.get_bbox(view, options["bbox"])
+        tile_ranges = self.get_tile_ranges(bbox, options)
+        total = sum(len(x_range) * len(y_range) for _, x_range, y_range in tile_ranges)
+
+        done_chunks = set()
+        resume_file = None
+        if options["resume"]:
+            resume_path = Path(options["resume"])
+            if resume_path.exists():
+                done_chunks = set(resume_path.read_text().split())
+            resume_file = resume_path.open("a")
+
+        chunks = (
+            (chunk_id, tiles)
+            for chunk_id, tiles in iter_tile_chunks(tile_ranges, options["chunk_size"])
+            if chunk_id not in done_chunks
+        )
+        self.stdout.write(
+            f"{total} tiles to render ({len(done_chunks)} chunks already rendered)"
+        )
+        try:
+            for chunk_id, count in self.render_chunks(path, chunks, options["workers"]):
+                if resume_file:
+                    resume_file.write(f"{chunk_id}\n")
+                    resume_file.flush()
+                self.report_progress(chunk_id, count, total)
+        finally:
+            if resume_file:
+                resume_file.close()
+        self.stdout.write(self.style.SUCCESS(f"{self.rendered} tiles rendered"))
@@ -0,0 +1,123 @@
+"""
+Read and write MBTiles files (https://github.com/mapbox/mbtiles-spec/blob/master/1.3/spec.md)
+
+Tiles are stored gzip compressed, with TMS y coordinates.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+local = threading.local()
+
+
+def flip_y(y, z):
+    """Convert y between XYZ and TMS schemes"""
+    return 2**z - 1 - y
+
+
+def get_metadata(tilejson):
+    """Get MBTiles metadata from TileJSON"""
+    metadata = {
+        "name": tilejson.get("name"),
+        "format": "pbf",
+        "type": "overlay",
+        "version": tilejson.get("version"),
+        "description": tilejson.get("description"),
+        "attribution": tilejson.get("attribution"),
+        "minzoom": tilejson.get("minzoom"),
+        "maxzoom": tilejson.get("maxzoom"),
+        "bounds": ",".join(str(value) for value in tilejson.get("bounds") or []),
+        "center": ",".join(str(value) for value in tilejson.get("center") or []),
+        "json": json.dumps({"vector_layers": tilejson.get("vector_layers", [])}),
+    }
+    return {
+        key: str(value) for key, value in metadata.items() if value not in (None, "")
+    }
+
+
+class MBTilesWriter:
+    """Write tiles in a new MBTiles file"""
+
+    def __init__(self, path, metadata):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            DROP TABLE IF EXISTS metadata;
+            DROP TABLE IF EXISTS tiles;
+            CREATE TABLE metadata (name text, value text);
+            CREATE TABLE tiles (
+                zoom_level integer,
+                tile_column integer,
+                tile_row integer,
+                tile_data blob
+            );
+            CREATE UNIQUE INDEX tile_index on tiles (zoom_level, tile_column, tile_row);
+            """
+        )
+        self.connection.executemany(
+            "INSERT INTO metadata (name, value) VALUES (?, ?)", metadata.items()
+        )
+
+    def write_tiles(self, tiles):
+        """
+        Write tiles. Empty tiles are not stored.
+
+        :param tiles: z, x, y and uncompressed content of each tile
+        :type tiles: iterable
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                (z, x, flip_y(y, z), gzip.compress(content))
+                for z, x, y, content in tiles
+                if content
+            ),
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+def get_connection(path):
+    """
+    Get a read only connection to MBTiles file, shared by thread.
+    Connection is reopened when file is replaced or modified.
+    """
+    if not hasattr(local, "connections"):
+        local.connections = {}
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns)
+    connection, connection_version = local.connections.get(path, (None, None))
+    if connection_version != version:
+        if connection is not None:
+            connection.close()
+        uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+        connection = sqlite3.connect(uri, uri=True)
+        local.connections[path] = (connection, version)
+    return connection
+
+
+def get_tile(path, z, x, y):
+    """
+    Get gzip compressed tile content from MBTiles file
+
+    :return: tile content, or None if tile does not exist
+    :rtype: bytes
+    """
+    row = (
+        get_connection(path)
+        .execute(
+            "SELECT tile_data FROM tiles "
+            "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, flip_y(y, z)),
+        )
+        .fetchone()
+    )
+    return row[0] if row else None
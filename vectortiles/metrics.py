@@ -0,0 +1,256 @@
+"""
+In process metrics of tile views, by layer id and zoom level.
+
+Metrics are collected from tile_rendered signal, once connected, in a registry by
+process: tile durations histograms, cached, empty tiles and bytes served by layer.
+They are exported in JSON or Prometheus text format by MetricsView.
+"""
+
+import json
+import threading
+from bisect import bisect_left
+
+from vectortiles.signals import tile_rendered
+
+# seconds, as Prometheus client default buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one for values above buckets
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        # value in first bucket greater than or equal to it
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_counts(self):
+        """
+        Get count of values lower than or equal to each bucket, and of all values
+
+        :return: (bucket, count) with "+Inf" bucket
+        :rtype: list
+        """
+        counts, total = [], 0
+        for bucket, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            counts.append((bucket, total))
+        return counts
+
+    def to_dict(self):
+        return {
+            "buckets": dict(self.get_cumulative_counts()),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class LayerMetrics:
+    """Metrics of a layer tiles, at a zoom level"""
+
+    def __init__(self, buckets):
+        self.hits = 0  # tiles read in cache
+        self.misses = 0  # rendered tiles
+        self.empty = 0
+        self.bytes = 0
+        self.features = 0  # of rendered tiles
+        self.durations = Histogram(buckets)  # of rendered tiles
+
+    def observe(self, tile, duration):
+        if tile["cached"]:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.features += tile["features"] or 0
+            self.durations.observe(duration)
+        self.empty += not tile["bytes"]
+        self.bytes += tile["bytes"]
+
+    def to_dict(self):
+        tiles = self.hits + self.misses
+        return {
+            "tiles": tiles,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_ratio": self.hits / tiles if tiles else None,
+            "empty_tiles": self.empty,
+            "empty_ratio": self.empty / tiles if tiles else None,
+            "bytes": self.bytes,
+            "features": self.features,
+            "durations": self.durations.to_dict(),
+        }
+
+
+class MetricsRegistry:
+    """Aggregate tile requests timings, shared by threads of a process"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.tiles = {}  # z -> tile responses durations histogram
+            self.layers = {}  # (layer id, z) -> layer metrics
+
+    def observe(self, timings, z):
+        """
+        Add timings (vectortiles.timing.TileTimings) of a tile request.
+        Layer tiles durations are the sum of their stages.
+        """
+        durations = {}
+        for (layer_id, _), duration in timings.get_durations().items():
+            if layer_id is not None:
+                durations[layer_id] = durations.get(layer_id, 0) + duration
+        with self.lock:
+            if z not in self.tiles:
+                self.tiles[z] = Histogram(self.buckets)
+            self.tiles[z].observe(timings.duration)
+            for layer_id, tile in timings.tiles.items():
+                key = (layer_id, z)
+                if key not in self.layers:
+                    self.layers[key] = LayerMetrics(self.buckets)
+                self.layers[key].observe(tile, durations.get(layer_id, 0))
+
+    def get_metrics(self):
+        """
+        Get metrics of tile responses by zoom level, and of layers tiles by layer id
+        and zoom level
+
+        :rtype: dict
+        """
+        with self.lock:
+            layers = {}
+            for (layer_id, z), metrics in sorted(self.layers.items()):
+                layers.setdefault(layer_id, {})[z] = metrics.to_dict()
+            return {
+                "tiles": {
+                    z: histogram.to_dict()
+                    for z, histogram in sorted(self.tiles.items())
+                },
+                "layers": layers,
+            }
+
+
+registry = MetricsRegistry()  # default registry, collected by connect
+
+
+class BaseExporter:
+    """Export registry metrics in a response content"""
+
+    content_type = None
+
+    def export(self, metrics):
+        """
+        :param metrics: registry metrics (MetricsRegistry.get_metrics)
+        :rtype: str
+        """
+        raise NotImplementedError
+
+
+class JSONExporter(BaseExporter):
+    content_type = "application/json"
+
+    def export(self, metrics):
+        return json.dumps(metrics)
+
+
+def escape_label(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def format_labels(labels):
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in labels)
+
+
+class PrometheusExporter(BaseExporter):
+    # https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+    prefix = "vectortiles"
+
+    def get_histogram_lines(self, name, labels, histogram):
+        lines = []
+        for bucket, count in histogram["buckets"].items():
+            bucket_labels = format_labels((*labels, ("le", bucket)))
+            lines.append(f"{name}_bucket{{{bucket_labels}}} {count}")
+        lines.append(f"{name}_sum{{{format_labels(labels)}}} {histogram['sum']}")
+        lines.append(f"{name}_count{{{format_labels(labels)}}} {histogram['count']}")
+        return lines
+
+    def export(self, metrics):
+        lines = []
+
+        def add_metric(name, metric_type, description, samples):
+            name = f"{self.prefix}_{name}"
+            lines.extend(
+                (f"# HELP {name} {description}", f"# TYPE {name} {metric_type}")
+            )
+            for labels, value in samples:
+                if metric_type == "histogram":
+                    lines.extend(self.get_histogram_lines(name, labels, value))
+                else:
+                    lines.append(f"{name}{{{format_labels(labels)}}} {value}")
+
+        add_metric(
+            "tile_duration_seconds",
+            "histogram",
+            "Tile responses duration.",
+            [((("z", z),), histogram) for z, histogram in metrics["tiles"].items()],
+        )
+        layers = [
+            ((("layer", layer_id), ("z", z)), layer_metrics)
+            for layer_id, zooms in metrics["layers"].items()
+            for z, layer_metrics in zooms.items()
+        ]
+        add_metric(
+            "layer_tiles_total",
+            "counter",
+            "Layer tiles served, read in cache or rendered.",
+            [
+                ((*labels, ("cache", cache)), layer_metrics[key])
+                for labels, layer_metrics in layers
+                for cache, key in (("hit", "cache_hits"), ("miss", "cache_misses"))
+            ],
+        )
+        for name, key, description in (
+            ("layer_empty_tiles_total", "empty_tiles", "Empty layer tiles served."),
+            ("layer_bytes_total", "bytes", "Layer tiles bytes served, uncompressed."),
+            ("layer_features_total", "features", "Features of rendered layer tiles."),
+        ):
+            add_metric(
+                name,
+                "counter",
+                description,
+                [(labels, layer_metrics[key]) for labels, layer_metrics in layers],
+            )
+        add_metric(
+            "layer_render_duration_seconds",
+            "histogram",
+            "Rendering duration of layer tiles not read in cache.",
+            [(labels, layer_metrics["durations"]) for labels, layer_metrics in layers],
+        )
+        return "\n".join(lines) + "\n"
+
+
+def collect(sender, timings, z, **kwargs):
+    registry.observe(timings, z)
+
+
+def connect(sender=None):
+    """
+    Collect metrics of tile views in default registry.
+    Call it in your AppConfig.ready method.
+
+    :param sender: tile view class to collect. By default, all tile views
+    """
+    tile_rendered.connect(collect, sender=sender, dispatch_uid="vectortiles-metrics")
+
+
+def disconnect(sender=None):
+    tile_rendered.disconnect(sender=sender, dispatch_uid="vectortiles-metrics")
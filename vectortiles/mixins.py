@@ -1,14 +1,74 @@
+import asyncio
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import lru_cache
+from hashlib import md5
 from urllib.parse import unquote, urljoin
 
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse, JsonResponse
 from django.urls import path
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
 
 from vectortiles import settings as app_settings
+from vectortiles import timing
+from vectortiles.backends import current_data_extents
+from vectortiles.compression import compress_segment, decompress_segment, join_segments
+from vectortiles.invalidation import aget_layers_generations, get_layers_generations
+from vectortiles.signals import tile_rendered
+
+re_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+@lru_cache(maxsize=None)  # noqa: UP033 Python 3.8
+def get_layers_executor():
+    """Get thread pool shared by views rendering layers concurrently"""
+    return ThreadPoolExecutor(
+        max_workers=app_settings.VECTOR_TILES_MAX_WORKERS,
+        thread_name_prefix="vectortiles",
+    )
+
+
+def get_content_etag(content, weak=False):
+    """Get ETag header value from content hash"""
+    return f'{"W/" if weak else ""}"{md5(content).hexdigest()}"'
+
+
+def is_empty_tile(tile):
+    """Check if layer tile, or its compressed segment, is empty"""
+    return not (tile[2] if isinstance(tile, tuple) else tile)
+
+
+worker_state = threading.local()  # request rendered by each layers executor thread
+
+
+def render_layer_tile(layer, x, y, z, request):
+    """
+    Render layer tile in a layers executor thread, for request (any object identifying
+    the view request). Thread database connections are reused by all layers of a
+    request, and closed as at request end when the thread renders another request.
+    """
+    if getattr(worker_state, "request", None) is not request:
+        close_old_connections()
+        worker_state.request = request
+    return layer.get_tile(x, y, z)
 
 
 class BaseVectorView:
     layer_classes = None
     layers = None
     prefix_url = None
+    cache_control = None  # Cache-Control directives, as patch_cache_control kwargs
 
     @classmethod
     def get_default_prefix_tiles_url(cls):
@@ -30,6 +90,44 @@ class BaseVectorView:
             ]
         )
 
+    def get_cache_control(self):
+        return self.cache_control
+
+    def get_last_modified(self):
+        """
+        Get last modification date of layers data, if all layers define it
+
+        :rtype: datetime
+        """
+        dates = [layer.get_last_modified() for layer in self.get_layers()]
+        return max(dates) if dates and all(dates) else None
+
+    def get_conditional_response(
+        self, request, etag=None, last_modified=None, response=None
+    ):
+        """
+        Get Not Modified (or Precondition Failed) response if request conditions
+        match etag and last_modified, else None
+        """
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+            response=response,
+        )
+
+    def patch_response(
+        self, response, etag=None, last_modified=None, cache_control=None
+    ):
+        """Set validators and Cache-Control headers in response"""
+        if etag:
+            response.headers["ETag"] = etag
+        if last_modified:
+            response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+        return response
+
 
 class BaseTileJSONView(BaseVectorView):
     # https://github.com/mapbox/tilejson-spec/tree/master/3.0.0
@@ -155,23 +253,478 @@ class BaseTileJSONView(BaseVectorView):
             ],
         }
 
+    def get_tilejson_response(self, request, tile_url):
+        """Get TileJSON response, or Not Modified response if content didn't change"""
+        response = JsonResponse(self.get_tilejson(tile_url))
+        etag, last_modified = (
+            get_content_etag(response.content),
+            self.get_last_modified(),
+        )
+        response = (
+            self.get_conditional_response(request, etag, last_modified, response)
+            or response
+        )
+        return self.patch_response(
+            response, etag, last_modified, self.get_cache_control()
+        )
+
 
 class BaseVectorTileView(BaseVectorView):
     """Base mixin to handle vector tile in a django View"""
 
     content_type = app_settings.VECTOR_TILES_CONTENT_TYPE
+    layers_single_query = False  # render PostGIS layers with one query by database
+    parallel_layers = False  # render layers concurrently in a shared thread pool
+    zoom_cache_control = None  # [(min_zoom, max_zoom, Cache-Control directives)]
+    gzip_tiles = False  # compress and cache layer tiles once, serve them gzip encoded
+    server_timing = False  # add Server-Timing header with rendering stages durations
+
+    def render_layer_tiles(self, layers, z, x, y):
+        """Generate tile of each layer, in layers order"""
+        if self.layers_single_query:
+            from vectortiles.backends.postgis import get_tiles
+
+            return get_tiles(layers, x, y, z)
+        if self.parallel_layers and len(layers) > 1:
+            executor = get_layers_executor()
+            request = object()
+            # threads record in request timings
+            futures = [
+                executor.submit(
+                    copy_context().run, render_layer_tile, layer, x, y, z, request
+                )
+                for layer in layers
+            ]
+            return [future.result() for future in futures]
+        return [layer.get_tile(x, y, z) for layer in layers]
+
+    async def arender_layer_tiles(self, layers, z, x, y):
+        """Generate tile of each layer concurrently, in layers order"""
+        if self.layers_single_query:
+            from vectortiles.backends.postgis import aget_tiles
+
+            return await aget_tiles(layers, x, y, z)
+        return await asyncio.gather(*(layer.aget_tile(x, y, z) for layer in layers))
+
+    def get_layers_cache_keys(self, layers, generations, z, x, y, compressed=False):
+        """
+        Get cache key of each layer with cache enabled, grouped by cache alias
+
+        :return: {cache alias: {cache key: layer index}}
+        :rtype: dict
+        """
+        cache_keys = defaultdict(dict)
+        for index, layer in enumerate(layers):
+            if layer.get_cache_timeout():
+                generation = generations.get(index, {}).get(z)
+                key = layer.get_cache_key(x, y, z, generation, compressed)
+                cache_keys[layer.get_cache_alias()][key] = index
+        return cache_keys
+
+    def get_empty_tiles_keys(self, layers, generations, z, x, y):
+        """
+        Get empty tiles bitmaps of each layer with empty_tiles_bitmap and cache enabled,
+        grouped by cache alias
+
+        :return: {cache alias: {bitmap key: [(layer index, tile bit)]}}
+        :rtype: dict
+        """
+        empty_keys = defaultdict(lambda: defaultdict(list))
+        for index, layer in enumerate(layers):
+            if layer.empty_tiles_bitmap and layer.get_cache_timeout():
+                alias = layer.get_cache_alias()
+                bitmaps = layer.get_empty_tiles_bitmaps(x, y, z, generations.get(index))
+                for key, bit in bitmaps:
+                    empty_keys[alias][key].append((index, bit))
+        return empty_keys
+
+    def get_data_extents_keys(self, layers):
+        """
+        Get data extent cache key of each layer with extent_check, grouped by cache alias
+
+        :return: {cache alias: [extent cache key]}
+        :rtype: dict
+        """
+        extent_keys = defaultdict(list)
+        for layer in layers:
+            if layer.extent_check:
+                extent_keys[layer.get_cache_alias()].append(
+                    layer.get_extent_cache_key()
+                )
+        return extent_keys
+
+    def get_data_extents(self, extent_keys, values):
+        """
+        Get data extents read in cache, by extent cache key
+
+        :param values: {cache alias: cached values of extent_keys}
+        :rtype: dict
+        """
+        return {
+            key: values[alias][key]
+            for alias, keys in extent_keys.items()
+            for key in keys
+            if key in values[alias]
+        }
+
+    def get_tiles_from_cache(
+        self, layers, cache_keys, empty_keys, values, compressed=False
+    ):
+        """
+        Get cached tile of each layer, in layers order. None if tile is not cached.
+
+        :param values: {cache alias: cached values of cache_keys and empty_keys}
+        """
+        tiles = [None] * len(layers)
+        for alias, keys in cache_keys.items():
+            for key, index in keys.items():
+                if key in values[alias]:
+                    tiles[index] = values[alias][key]
+        empty_tile = compress_segment(b"") if compressed else b""
+        for alias, keys in empty_keys.items():
+            for key, bits in keys.items():
+                bitmap = values[alias].get(key, 0)
+                for index, bit in bits:
+                    if bitmap & bit:
+                        tiles[index] = empty_tile
+        return tiles
+
+    def get_tiles_to_cache(self, layers, generations, cache_keys, tiles, z, x, y):
+        """
+        Get rendered layer tiles to store in cache. Empty tiles of layers with
+        empty_tiles_bitmap are set in their bitmap instead: bitmaps are read again just
+        before being stored, as their bits may be cleared while tiles are rendered.
+
+        :param tiles: {layer index: rendered tile}
+        :return: {(cache alias, timeout): {cache key: tile}} and
+                 {(cache alias, timeout): {bitmap key: bits to set}}
+        :rtype: tuple
+        """
+        to_cache, empty_bits = defaultdict(dict), defaultdict(lambda: defaultdict(int))
+        for alias, keys in cache_keys.items():
+            for key, index in keys.items():
+                if index not in tiles:
+                    continue
+                layer, tile = layers[index], tiles[index]
+                timeout = layer.get_cache_timeout()
+                if layer.empty_tiles_bitmap and is_empty_tile(tile):
+                    # tiles out of zoom levels are empty without query
+                    if layer.check_in_zoom_levels(z):
+                        bitmap_key, bit = layer.get_empty_tiles_bitmap(
+                            x, y, z, generations.get(index, {}).get(z)
+                        )
+                        empty_bits[alias, timeout][bitmap_key] |= bit
+                    continue
+                to_cache[alias, timeout][key] = tile
+        return to_cache, empty_bits
+
+    def get_cached_layer_tiles(self, layers, z, x, y, compressed=False):
+        """
+        Get tile of each layer, in layers order.
+        Layer tiles are read from and stored in cache with one request by cache alias.
+
+        :param compressed: get compressed segments of layer tiles (vectortiles.compression)
+        """
+        generations = get_layers_generations(layers, z)
+        cache_keys = self.get_layers_cache_keys(
+            layers, generations, z, x, y, compressed
+        )
+        empty_keys = self.get_empty_tiles_keys(layers, generations, z, x, y)
+        extent_keys = self.get_data_extents_keys(layers)
+        with timing.Stage(None, "cache"):
+            values = {
+                alias: caches[alias].get_many(
+                    [*cache_keys[alias], *empty_keys[alias], *extent_keys[alias]]
+                )
+                for alias in cache_keys.keys() | empty_keys.keys() | extent_keys.keys()
+            }
+        tiles = self.get_tiles_from_cache(
+            layers, cache_keys, empty_keys, values, compressed
+        )
+        timing.record_tiles(layers, tiles, cached=True)
+
+        missing_indexes = [index for index, tile in enumerate(tiles) if tile is None]
+        if missing_indexes:
+            missing_layers = [layers[index] for index in missing_indexes]
+            token = current_data_extents.set(self.get_data_extents(extent_keys, values))
+            try:
+                missing_tiles = self.render_layer_tiles(missing_layers, z, x, y)
+            finally:
+                current_data_extents.reset(token)
+            timing.record_tiles(missing_layers, missing_tiles)
+            if compressed:
+                with timing.Stage(None, "compress"):
+                    missing_tiles = [compress_segment(tile) for tile in missing_tiles]
+            rendered = dict(zip(missing_indexes, missing_tiles))
+            for index, tile in rendered.items():
+                tiles[index] = tile
+            to_cache, empty_bits = self.get_tiles_to_cache(
+                layers, generations, cache_keys, rendered, z, x, y
+            )
+            with timing.Stage(None, "cache"):
+                for (alias, timeout), bits in empty_bits.items():
+                    bitmaps = caches[alias].get_many(bits)
+                    to_cache[alias, timeout].update(
+                        {key: bitmaps.get(key, 0) | bit for key, bit in bits.items()}
+                    )
+                for (alias, timeout), cached in to_cache.items():
+                    caches[alias].set_many(cached, timeout=timeout)
+        return tiles
+
+    async def aget_cached_layer_tiles(self, layers, z, x, y, compressed=False):
+        """Asynchronous version of get_cached_layer_tiles"""
+        generations = await aget_layers_generations(layers, z)
+        cache_keys = self.get_layers_cache_keys(
+            layers, generations, z, x, y, compressed
+        )
+        empty_keys = self.get_empty_tiles_keys(layers, generations, z, x, y)
+        extent_keys = self.get_data_extents_keys(layers)
+        with timing.Stage(None, "cache"):
+            values = {
+                alias: await caches[alias].aget_many(
+                    [*cache_keys[alias], *empty_keys[alias], *extent_keys[alias]]
+                )
+                for alias in cache_keys.keys() | empty_keys.keys() | extent_keys.keys()
+            }
+        tiles = self.get_tiles_from_cache(
+            layers, cache_keys, empty_keys, values, compressed
+        )
+        timing.record_tiles(layers, tiles, cached=True)
+
+        missing_indexes = [index for index, tile in enumerate(tiles) if tile is None]
+        if missing_indexes:
+            missing_layers = [layers[index] for index in missing_indexes]
+            token = current_data_extents.set(self.get_data_extents(extent_keys, values))
+            try:
+                missing_tiles = await self.arender_layer_tiles(missing_layers, z, x, y)
+            finally:
+                current_data_extents.reset(token)
+            timing.record_tiles(missing_layers, missing_tiles)
+            if compressed:
+                with timing.Stage(None, "compress"):
+                    missing_tiles = [compress_segment(tile) for tile in missing_tiles]
+            rendered = dict(zip(missing_indexes, missing_tiles))
+            for index, tile in rendered.items():
+                tiles[index] = tile
+            to_cache, empty_bits = self.get_tiles_to_cache(
+                layers, generations, cache_keys, rendered, z, x, y
+            )
+            with timing.Stage(None, "cache"):
+                for (alias, timeout), bits in empty_bits.items():
+                    bitmaps = await caches[alias].aget_many(bits)
+                    to_cache[alias, timeout].update(
+                        {key: bitmaps.get(key, 0) | bit for key, bit in bits.items()}
+                    )
+                for (alias, timeout), cached in to_cache.items():
+                    await caches[alias].aset_many(cached, timeout=timeout)
+        return tiles
 
     def get_layer_tiles(self, z, x, y):
         layers = self.get_layers()
-        if layers:
-            return b"".join(layer.get_tile(x, y, z) for layer in layers)
-        msg = "No layers defined"
-        raise Exception(msg)
+        if not layers:
+            msg = "No layers defined"
+            raise Exception(msg)
+        if self.gzip_tiles:
+            segments = self.get_cached_layer_tiles(layers, z, x, y, compressed=True)
+            return b"".join(decompress_segment(segment) for segment in segments)
+        return b"".join(self.get_cached_layer_tiles(layers, z, x, y))
+
+    async def aget_layer_tiles(self, z, x, y):
+        layers = self.get_layers()
+        if not layers:
+            msg = "No layers defined"
+            raise Exception(msg)
+        if self.gzip_tiles:
+            segments = await self.aget_cached_layer_tiles(
+                layers, z, x, y, compressed=True
+            )
+            return b"".join(decompress_segment(segment) for segment in segments)
+        return b"".join(await self.aget_cached_layer_tiles(layers, z, x, y))
+
+    def get_compressed_layer_tiles(self, z, x, y):
+        """Get gzip compressed tile, joining compressed layers tiles"""
+        layers = self.get_layers()
+        if not layers:
+            msg = "No layers defined"
+            raise Exception(msg)
+        return join_segments(
+            self.get_cached_layer_tiles(layers, z, x, y, compressed=True)
+        )
+
+    async def aget_compressed_layer_tiles(self, z, x, y):
+        layers = self.get_layers()
+        if not layers:
+            msg = "No layers defined"
+            raise Exception(msg)
+        return join_segments(
+            await self.aget_cached_layer_tiles(layers, z, x, y, compressed=True)
+        )
 
     def get_content_status(self, z, x, y):
         content = self.get_layer_tiles(z, x, y)
         return (content, 200) if content else (content, 204)
 
+    async def aget_content_status(self, z, x, y):
+        content = await self.aget_layer_tiles(z, x, y)
+        return (content, 200) if content else (content, 204)
+
+    def accepts_gzip(self, request):
+        """Check if gzip compressed tiles can be served to request"""
+        return self.gzip_tiles and bool(
+            re_accepts_gzip.search(request.headers.get("Accept-Encoding", ""))
+        )
+
+    def get_encoded_content_status(self, request, z, x, y):
+        """
+        Get tile content, compressed if request accepts gzip encoding
+
+        :return: content, status and content encoding
+        :rtype: tuple
+        """
+        if self.accepts_gzip(request):
+            content = self.get_compressed_layer_tiles(z, x, y)
+            return (content, 200, "gzip") if content else (content, 204, None)
+        return *self.get_content_status(z, x, y), None
+
+    async def aget_encoded_content_status(self, request, z, x, y):
+        if self.accepts_gzip(request):
+            content = await self.aget_compressed_layer_tiles(z, x, y)
+            return (content, 200, "gzip") if content else (content, 204, None)
+        return *(await self.aget_content_status(z, x, y)), None
+
+    def get_cache_control(self, z=None):
+        """Get Cache-Control directives of zoom level, by default cache_control"""
+        for min_zoom, max_zoom, directives in self.zoom_cache_control or []:
+            if z is not None and min_zoom <= z <= max_zoom:
+                return directives
+        return super().get_cache_control()
+
+    def get_tile_etag(self, z, x, y):
+        """
+        Get tile ETag from layers cache versions, without generating tile.
+        None if a layer has no cache version, or has cache invalidation.
+        """
+        layers = self.get_layers()
+        if not layers or any(
+            layer.cache_invalidation or layer.get_cache_version() is None
+            for layer in layers
+        ):
+            return None
+        versions = "-".join(
+            f"{layer.get_id()}:{layer.get_cache_version()}" for layer in layers
+        )
+        # weak, as gzip encoded and decoded tiles have the same ETag
+        return get_content_etag(
+            f"{versions}-{z}-{x}-{y}".encode(), weak=self.gzip_tiles
+        )
+
+    def check_tile_coordinates(self, z, x, y):
+        """Raise Http404 if tile doesn't exist, before generating layers"""
+        if not (0 <= z <= 30 and 0 <= x < 2**z and 0 <= y < 2**z):
+            msg = f"Tile {z}/{x}/{y} doesn't exist"
+            raise Http404(msg)
+
+    def get_tile_validators(self, z, x, y):
+        """Get tile ETag and Last-Modified date, or None"""
+        return self.get_tile_etag(z, x, y), self.get_last_modified()
+
+    def make_tile_response(self, content, status):
+        return HttpResponse(content, content_type=self.content_type, status=status)
+
+    def is_timed(self):
+        """Check if tile rendering stages are timed, for Server-Timing or tile_rendered"""
+        return self.server_timing or tile_rendered.has_listeners(type(self))
+
+    def get_timed_response(self, request, response, timings, z, x, y):
+        """Add Server-Timing header if enabled, and send tile_rendered signal"""
+        if self.server_timing:
+            response.headers["Server-Timing"] = timings.get_server_timing()
+        tile_rendered.send(
+            sender=type(self),
+            view=self,
+            request=request,
+            z=z,
+            x=x,
+            y=y,
+            response=response,
+            timings=timings,
+        )
+        return response
+
+    def get_tile_response(self, request, z, x, y):
+        """Get tile response, with rendering stages timings if timed"""
+        if not self.is_timed():
+            return self.build_tile_response(request, z, x, y)
+        with timing.TileTimings() as timings:
+            response = self.build_tile_response(request, z, x, y)
+        return self.get_timed_response(request, response, timings, z, x, y)
+
+    async def aget_tile_response(self, request, z, x, y):
+        """Asynchronous version of get_tile_response"""
+        if not self.is_timed():
+            return await self.abuild_tile_response(request, z, x, y)
+        with timing.TileTimings() as timings:
+            response = await self.abuild_tile_response(request, z, x, y)
+        # receivers may query database
+        return await sync_to_async(self.get_timed_response)(
+            request, response, timings, z, x, y
+        )
+
+    def build_tile_response(self, request, z, x, y):
+        """
+        Get tile response, or Not Modified response without generating tile if
+        request conditions match tile validators.
+        Without layers versions ETag, ETag is computed from tile content.
+        """
+        self.check_tile_coordinates(z, x, y)
+        etag, last_modified = self.get_tile_validators(z, x, y)
+        response = self.get_conditional_response(request, etag, last_modified)
+        if response is None:
+            content, status, encoding = self.get_encoded_content_status(
+                request, z, x, y
+            )
+            response, etag = self.get_rendered_tile_response(
+                request, content, status, etag, last_modified, encoding
+            )
+        if self.gzip_tiles:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        return self.patch_response(
+            response, etag, last_modified, self.get_cache_control(z)
+        )
+
+    async def abuild_tile_response(self, request, z, x, y):
+        """Asynchronous version of build_tile_response"""
+        self.check_tile_coordinates(z, x, y)
+        # layers versions may be read in database
+        etag, last_modified = await sync_to_async(self.get_tile_validators)(z, x, y)
+        response = self.get_conditional_response(request, etag, last_modified)
+        if response is None:
+            content, status, encoding = await self.aget_encoded_content_status(
+                request, z, x, y
+            )
+            response, etag = self.get_rendered_tile_response(
+                request, content, status, etag, last_modified, encoding
+            )
+        if self.gzip_tiles:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        return self.patch_response(
+            response, etag, last_modified, self.get_cache_control(z)
+        )
+
+    def get_rendered_tile_response(
+        self, request, content, status, etag, last_modified, encoding=None
+    ):
+        response = self.make_tile_response(content, status)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if etag is None and content:
+            etag = get_content_etag(content, weak=self.gzip_tiles)
+            response = (
+                self.get_conditional_response(request, etag, last_modified, response)
+                or response
+            )
+        return response, etag
+
     def get_base_url(self):
         pass
 
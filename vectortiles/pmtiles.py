@@ -0,0 +1,324 @@
+"""
+Read and write PMTiles v3 archives (https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md)
+
+Tiles and directories are gzip compressed. Identical tiles are stored once.
+"""
+
+import gzip
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from hashlib import md5
+
+from vectortiles.protobuf import read_varint, write_varint
+
+HEADER_LENGTH = 127
+ROOT_DIRECTORY_MAX_LENGTH = 16384 - HEADER_LENGTH
+COMPRESSION_GZIP = 2
+TILE_TYPE_MVT = 1
+
+Entry = namedtuple("Entry", ("tile_id", "offset", "length", "run_length"))
+Header = namedtuple(
+    "Header",
+    (
+        "root_offset",
+        "root_length",
+        "metadata_offset",
+        "metadata_length",
+        "leaf_directory_offset",
+        "leaf_directory_length",
+        "tile_data_offset",
+        "tile_data_length",
+        "addressed_tiles_count",
+        "tile_entries_count",
+        "tile_contents_count",
+        "clustered",
+        "internal_compression",
+        "tile_compression",
+        "tile_type",
+        "min_zoom",
+        "max_zoom",
+        "min_lon_e7",
+        "min_lat_e7",
+        "max_lon_e7",
+        "max_lat_e7",
+        "center_zoom",
+        "center_lon_e7",
+        "center_lat_e7",
+    ),
+)
+HEADER_FORMAT = "<7sB11Q6BiiiiBii"
+
+
+def zxy_to_tile_id(z, x, y):
+    """Get tile id on hilbert curve"""
+    tile_id = ((1 << (2 * z)) - 1) // 3  # tiles number on lower zooms
+    size = 1 << (z - 1) if z else 0
+    while size > 0:
+        rx = 1 if x & size else 0
+        ry = 1 if y & size else 0
+        tile_id += size * size * ((3 * rx) ^ ry)
+        # rotate
+        if ry == 0:
+            if rx == 1:
+                x, y = size - 1 - x, size - 1 - y
+            x, y = y, x
+        size //= 2
+    return tile_id
+
+
+def serialize_directory(entries):
+    buffer = bytearray()
+    write_varint(buffer, len(entries))
+    last_id = 0
+    for entry in entries:
+        write_varint(buffer, entry.tile_id - last_id)
+        last_id = entry.tile_id
+    for entry in entries:
+        write_varint(buffer, entry.run_length)
+    for entry in entries:
+        write_varint(buffer, entry.length)
+    for index, entry in enumerate(entries):
+        previous = entries[index - 1] if index else None
+        if previous and entry.offset == previous.offset + previous.length:
+            write_varint(buffer, 0)
+        else:
+            write_varint(buffer, entry.offset + 1)
+    return gzip.compress(bytes(buffer), mtime=0)
+
+
+def deserialize_directory(data):
+    data = gzip.decompress(data)
+    count, position = read_varint(data, 0)
+    columns = []
+    for _ in range(4):
+        column = []
+        for _ in range(count):
+            value, position = read_varint(data, position)
+            column.append(value)
+        columns.append(column)
+    tile_ids, run_lengths, lengths, offsets = columns
+    entries = []
+    tile_id = 0
+    for index in range(count):
+        tile_id += tile_ids[index]
+        if offsets[index] == 0 and index > 0:
+            offset = entries[-1].offset + entries[-1].length
+        else:
+            offset = offsets[index] - 1
+        entries.append(Entry(tile_id, offset, lengths[index], run_lengths[index]))
+    return entries
+
+
+def build_directories(entries):
+    """
+    Build root directory, with leaf directories if root directory is too big
+
+    :return: root directory and leaf directories data
+    :rtype: tuple
+    """
+    root = serialize_directory(entries)
+    if len(root) <= ROOT_DIRECTORY_MAX_LENGTH:
+        return root, b""
+    leaf_size = 4096
+    while True:
+        leaves, root_entries = bytearray(), []
+        for start in range(0, len(entries), leaf_size):
+            leaf_entries = entries[start : start + leaf_size]
+            leaf = serialize_directory(leaf_entries)
+            root_entries.append(
+                Entry(leaf_entries[0].tile_id, len(leaves), len(leaf), 0)
+            )
+            leaves += leaf
+        root = serialize_directory(root_entries)
+        if len(root) <= ROOT_DIRECTORY_MAX_LENGTH:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+def find_entry(entries, tile_id):
+    low, high = 0, len(entries) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        if tile_id > entries[middle].tile_id:
+            low = middle + 1
+        elif tile_id < entries[middle].tile_id:
+            high = middle - 1
+        else:
+            return entries[middle]
+    # high is now the entry before tile_id: a leaf directory, or a run of tiles
+    if high >= 0:
+        entry = entries[high]
+        if entry.run_length == 0 or tile_id - entry.tile_id < entry.run_length:
+            return entry
+    return None
+
+
+def to_e7(value):
+    return int(round(value * 10_000_000))
+
+
+class PMTilesWriter:
+    """Write tiles in a new PMTiles archive"""
+
+    def __init__(self, path, tilejson):
+        self.path = path
+        self.tilejson = tilejson
+        self.tile_data = tempfile.TemporaryFile()
+        self.tile_data_length = 0
+        self.contents = {}  # content hash -> offset, length
+        self.tiles = []  # tile id, offset, length
+        self.addressed_tiles_count = 0
+
+    def write_tiles(self, tiles):
+        """
+        Write tiles. Empty tiles are not stored.
+
+        :param tiles: z, x, y and uncompressed content of each tile
+        :type tiles: iterable
+        """
+        for z, x, y, content in tiles:
+            if not content:
+                continue
+            content_hash = md5(content).digest()
+            if content_hash not in self.contents:
+                data = gzip.compress(content, mtime=0)
+                self.tile_data.write(data)
+                self.contents[content_hash] = (self.tile_data_length, len(data))
+                self.tile_data_length += len(data)
+            self.tiles.append((zxy_to_tile_id(z, x, y), *self.contents[content_hash]))
+            self.addressed_tiles_count += 1
+
+    def get_entries(self):
+        """Get directory entries, with consecutive identical tiles merged in runs"""
+        entries = []
+        for tile_id, offset, length in sorted(self.tiles):
+            last = entries[-1] if entries else None
+            if (
+                last
+                and last.offset == offset
+                and last.tile_id + last.run_length == tile_id
+            ):
+                entries[-1] = last._replace(run_length=last.run_length + 1)
+            else:
+                entries.append(Entry(tile_id, offset, length, 1))
+        return entries
+
+    def get_header(self, entries, root, metadata, leaves):
+        bounds = self.tilejson.get("bounds") or [-180, -85.0511, 180, 85.0511]
+        min_zoom = self.tilejson.get("minzoom") or 0
+        max_zoom = self.tilejson.get("maxzoom") or 0
+        center = self.tilejson.get("center") or [
+            (bounds[0] + bounds[2]) / 2,
+            (bounds[1] + bounds[3]) / 2,
+            min_zoom,
+        ]
+        return Header(
+            root_offset=HEADER_LENGTH,
+            root_length=len(root),
+            metadata_offset=HEADER_LENGTH + len(root),
+            metadata_length=len(metadata),
+            leaf_directory_offset=HEADER_LENGTH + len(root) + len(metadata),
+            leaf_directory_length=len(leaves),
+            tile_data_offset=HEADER_LENGTH + len(root) + len(metadata) + len(leaves),
+            tile_data_length=self.tile_data_length,
+            addressed_tiles_count=self.addressed_tiles_count,
+            tile_entries_count=len(entries),
+            tile_contents_count=len(self.contents),
+            clustered=0,
+            internal_compression=COMPRESSION_GZIP,
+            tile_compression=COMPRESSION_GZIP,
+            tile_type=TILE_TYPE_MVT,
+            min_zoom=min_zoom,
+            max_zoom=max_zoom,
+            min_lon_e7=to_e7(bounds[0]),
+            min_lat_e7=to_e7(bounds[1]),
+            max_lon_e7=to_e7(bounds[2]),
+            max_lat_e7=to_e7(bounds[3]),
+            center_zoom=int(center[2]),
+            center_lon_e7=to_e7(center[0]),
+            center_lat_e7=to_e7(center[1]),
+        )
+
+    def close(self):
+        entries = self.get_entries()
+        root, leaves = build_directories(entries)
+        metadata = {
+            key: value
+            for key, value in self.tilejson.items()
+            if key not in ("tiles", "tilejson") and value is not None
+        }
+        metadata = gzip.compress(json.dumps(metadata).encode(), mtime=0)
+        header = self.get_header(entries, root, metadata, leaves)
+        with open(self.path, "wb") as output:
+            output.write(struct.pack(HEADER_FORMAT, b"PMTiles", 3, *header))
+            output.write(root)
+            output.write(metadata)
+            output.write(leaves)
+            self.tile_data.seek(0)
+            shutil.copyfileobj(self.tile_data, output)
+        self.tile_data.close()
+
+
+class PMTilesReader:
+    """Read tiles from a PMTiles archive, memory mapped"""
+
+    def __init__(self, path):
+        with open(path, "rb") as archive:
+            self.data = mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *values = struct.unpack_from(HEADER_FORMAT, self.data)
+        if magic != b"PMTiles" or version != 3:
+            msg = f"{path} is not a PMTiles v3 archive"
+            raise ValueError(msg)
+        self.header = Header(*values)
+        self.get_directory = lru_cache(maxsize=1024)(self.read_directory)
+
+    def read_directory(self, offset, length):
+        return deserialize_directory(self.data[offset : offset + length])
+
+    def get_metadata(self):
+        header = self.header
+        offset = header.metadata_offset
+        return json.loads(
+            gzip.decompress(self.data[offset : offset + header.metadata_length])
+        )
+
+    def get_tile(self, z, x, y):
+        """
+        Get gzip compressed tile content
+
+        :return: tile content, or None if tile does not exist
+        :rtype: bytes
+        """
+        header = self.header
+        tile_id = zxy_to_tile_id(z, x, y)
+        offset, length = header.root_offset, header.root_length
+        # root directory and up to 3 levels of leaf directories
+        for _ in range(4):
+            entry = find_entry(self.get_directory(offset, length), tile_id)
+            if entry is None:
+                return None
+            if entry.run_length > 0:
+                start = header.tile_data_offset + entry.offset
+                return self.data[start : start + entry.length]
+            offset = header.leaf_directory_offset + entry.offset
+            length = entry.length
+        return None
+
+
+readers = {}
+readers_lock = threading.Lock()
+
+
+def get_reader(path):
+    """Get PMTiles reader of path, shared by all threads"""
+    if path not in readers:
+        with readers_lock:
+            if path not in readers:
+                readers[path] = PMTilesReader(path)
+    return readers[path]
@@ -0,0 +1,30 @@
+"""
+Protobuf varints (https://protobuf.dev/programming-guides/encoding/#varints)
+
+Shared by vector tile encoder, tile features count, and PMTiles directories.
+"""
+
+
+def write_varint(buffer, value):
+    """Append unsigned integer to buffer in a protobuf varint"""
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, position):
+    """
+    Read protobuf varint from data at position
+
+    :return: unsigned integer, and position after varint
+    :rtype: tuple
+    """
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
@@ -8,7 +8,8 @@ from vectortiles.rest_framework.renderers import MVTRenderer
 class MVTAPIView(BaseVectorTileView, APIView):
     renderer_classes = (MVTRenderer,)
 
-    def get(self, request, z, x, y, *args, **kwargs):
-        z, x, y = int(z), int(x), int(y)
-        content, status = self.get_content_status(z, x, y)
+    def make_tile_response(self, content, status):
         return Response(content, status=status)
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        return self.get_tile_response(request, int(z), int(x), int(y))
@@ -8,3 +8,13 @@ VECTOR_TILES_BACKEND = getattr(
     settings, "VECTOR_TILES_BACKEND", "vectortiles.backends.postgis"
 )  # to use python backend, set to 'vectortiles.backends.python'
 VECTOR_TILES_URLS = getattr(settings, "VECTOR_TILES_URLS", None)
+VECTOR_TILES_CACHE_ALIAS = getattr(settings, "VECTOR_TILES_CACHE_ALIAS", "default")
+VECTOR_TILES_CACHE_TIMEOUT = getattr(
+    settings, "VECTOR_TILES_CACHE_TIMEOUT", 0
+)  # default layer tile cache timeout in seconds. 0 disables cache
+VECTOR_TILES_ASYNC_POOL_SIZE = getattr(
+    settings, "VECTOR_TILES_ASYNC_POOL_SIZE", 10
+)  # max connections by database and event loop, for async views with psycopg_pool
+VECTOR_TILES_MAX_WORKERS = getattr(
+    settings, "VECTOR_TILES_MAX_WORKERS", None
+)  # threads rendering layers of views with parallel_layers. By default, python default
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by tile views once tile response is ready, with view, request, z, x, y,
+# response and timings (vectortiles.timing.TileTimings) arguments.
+# Stages are timed only for requests of views with receivers or server_timing.
+tile_rendered = Signal()
@@ -0,0 +1,204 @@
+import json
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import mapbox_vector_tile
+from django.contrib.gis.db.models.functions import Transform
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from test_vectortiles.test_app.models import Feature, Layer
+from test_vectortiles.test_app.vt_layers import FeatureVectorLayer
+from vectortiles import generalization
+from vectortiles.management.base import get_tile_ranges, iter_tile_chunks
+from vectortiles.views import MVTView
+
+
+class CachedFeatureVectorLayer(FeatureVectorLayer):
+    cache_timeout = 60
+
+
+class CachedFeatureView(MVTView):
+    layer_classes = [CachedFeatureVectorLayer]
+
+
+class GeneralizedFeatureVectorLayer(FeatureVectorLayer):
+    id = "generalized-features"
+    generalized_zooms = [(0, 5)]
+
+
+class TileRangesTestCase(TestCase):
+    def test_world_tile_ranges(self):
+        self.assertEqual(
+            get_tile_ranges((-180, -90, 180, 90), 0, 2),
+            [
+                (0, range(0, 1), range(0, 1)),
+                (1, range(0, 2), range(0, 2)),
+                (2, range(0, 4), range(0, 4)),
+            ],
+        )
+
+    def test_point_tile_ranges(self):
+        self.assertEqual(
+            get_tile_ranges((1, 1, 1, 1), 1, 1), [(1, range(1, 2), range(0, 1))]
+        )
+
+    def test_tile_chunks(self):
+        chunks = list(iter_tile_chunks(get_tile_ranges((-180, -90, 180, 90), 0, 1), 3))
+        self.assertEqual(
+            chunks,
+            [
+                ("0-0", [(0, 0, 0)]),
+                ("1-0", [(1, 0, 0), (1, 0, 1), (1, 1, 0)]),
+                ("1-1", [(1, 1, 1)]),
+            ],
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class SeedTilesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(1 1)")
+
+    def setUp(self):
+        cache.clear()
+        self.layer = CachedFeatureVectorLayer()
+
+    def test_seed_layer_tiles(self):
+        call_command(
+            "seed_tiles",
+            "vectortiles.tests.test_commands.CachedFeatureVectorLayer",
+            bbox="-180,-90,180,90",
+            max_zoom=1,
+            stdout=StringIO(),
+        )
+        for x, y, z in ((0, 0, 0), (0, 0, 1), (1, 0, 1), (0, 1, 1), (1, 1, 1)):
+            self.assertTrue(cache.has_key(self.layer.get_cache_key(x, y, z)))
+        self.assertFalse(cache.has_key(self.layer.get_cache_key(0, 0, 2)))
+
+    def test_seed_view_tiles_in_data_extent(self):
+        call_command(
+            "seed_tiles",
+            "vectortiles.tests.test_commands.CachedFeatureView",
+            max_zoom=1,
+            stdout=StringIO(),
+        )
+        self.assertTrue(cache.has_key(self.layer.get_cache_key(1, 0, 1)))
+        self.assertFalse(cache.has_key(self.layer.get_cache_key(0, 0, 1)))
+
+    def test_seed_resume(self):
+        with TemporaryDirectory() as tmp_dir:
+            resume_path = Path(tmp_dir) / "resume.txt"
+            resume_path.write_text("0-0\n")
+            call_command(
+                "seed_tiles",
+                "vectortiles.tests.test_commands.CachedFeatureVectorLayer",
+                bbox="-180,-90,180,90",
+                max_zoom=1,
+                resume=str(resume_path),
+                stdout=StringIO(),
+            )
+            self.assertEqual(resume_path.read_text().split(), ["0-0", "1-0"])
+        self.assertFalse(cache.has_key(self.layer.get_cache_key(0, 0, 0)))
+        self.assertTrue(cache.has_key(self.layer.get_cache_key(0, 0, 1)))
+
+    def test_seed_invalid_path(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "seed_tiles", "vectortiles.tests.test_commands.Feature", max_zoom=1
+            )
+
+
+class GeneralizeLayerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="LINESTRING(0 0, 1 0.001, 2 0)")
+
+    def setUp(self):
+        self.layer = GeneralizedFeatureVectorLayer()
+        self.generalize()
+
+    def generalize(self, **options):
+        call_command(
+            "generalize_layer",
+            "vectortiles.tests.test_commands.GeneralizedFeatureVectorLayer",
+            stdout=StringIO(),
+            **options,
+        )
+
+    def get_names(self, z, x, y):
+        content = mapbox_vector_tile.decode(self.layer.get_tile(x, y, z))
+        return [
+            feature["properties"]["name"]
+            for feature in content.get("generalized-features", {"features": []})[
+                "features"
+            ]
+        ]
+
+    def test_generalized_zooms_use_view(self):
+        self.assertTrue(generalization.view_exists(self.layer, 0, 5))
+        Feature.objects.all().delete()
+        self.assertEqual(self.get_names(5, 16, 15), ["feat1"])
+        self.assertEqual(self.get_names(6, 32, 31), [])
+
+    def test_generalized_geometry_is_simplified(self):
+        source = generalization.get_generalized_source(self.layer, 0, 5)
+        self.assertEqual(source.get().geom.num_points, 2)
+
+    def test_view_geometry_is_not_casted(self):
+        sql, _ = generalization.get_view_sql(self.layer.get_generalized_queryset(0, 5))
+        self.assertNotIn("::bytea", sql)
+
+    def test_generalized_id_is_source_primary_key(self):
+        source = generalization.get_generalized_source(self.layer, 0, 5)
+        self.assertEqual(source.get().pk, Feature.objects.get().pk)
+
+    def test_generalized_queryset_without_id(self):
+        layer = GeneralizedFeatureVectorLayer()
+        layer.get_generalized_queryset = lambda min_zoom, max_zoom: (
+            Feature.objects.values("name", generalized_geom=Transform("geom", 3857))
+        )
+        with self.assertRaisesMessage(ImproperlyConfigured, "generalized_id"):
+            generalization.create_view(layer, 0, 2)
+
+    def test_refresh(self):
+        Feature.objects.create(name="feat2", geom="POINT(1 1)")
+        self.assertEqual(self.get_names(5, 16, 15), ["feat1"])
+        self.generalize()
+        self.assertCountEqual(self.get_names(5, 16, 15), ["feat1", "feat2"])
+
+    def test_drop(self):
+        self.generalize(drop=True)
+        self.assertFalse(generalization.view_exists(self.layer, 0, 5))
+
+
+class BenchmarkTilesTestCase(TestCase):
+    def test_benchmark_backends(self):
+        stdout = StringIO()
+        call_command(
+            "benchmark_tiles",
+            features=20,
+            geometry="polygon",
+            zooms="0,2",
+            tiles=2,
+            repeat=1,
+            stdout=stdout,
+        )
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report["dataset"]["features"], 20)
+        summary = {(row["backend"], row["z"]): row for row in report["summary"]}
+        self.assertCountEqual(
+            summary, [("postgis", 0), ("postgis", 2), ("python", 0), ("python", 2)]
+        )
+        self.assertEqual(summary["postgis", 0]["features"], 20)
+        self.assertEqual(summary["python", 0]["features"], 20)
+        self.assertIsNone(summary["postgis", 0]["encode_ms"])
+        self.assertIsNotNone(summary["python", 0]["encode_ms"])
+        # generated features are deleted
+        self.assertFalse(Layer.objects.filter(name="benchmark").exists())
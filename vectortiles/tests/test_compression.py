@@ -0,0 +1,33 @@
+import gzip
+import zlib
+
+from django.test import SimpleTestCase
+
+from vectortiles.compression import (
+    compress_segment,
+    crc32_combine,
+    decompress_segment,
+    join_segments,
+)
+
+
+class CompressionTestCase(SimpleTestCase):
+    def test_crc32_combine(self):
+        first, second = b"first layer" * 100, b"second layer" * 5000
+        self.assertEqual(
+            crc32_combine(zlib.crc32(first), zlib.crc32(second), len(second)),
+            zlib.crc32(first + second),
+        )
+        self.assertEqual(crc32_combine(zlib.crc32(first), 0, 0), zlib.crc32(first))
+
+    def test_join_segments(self):
+        contents = [b"first layer" * 100, b"", b"second layer" * 5000]
+        segments = [compress_segment(content) for content in contents]
+        self.assertEqual(gzip.decompress(join_segments(segments)), b"".join(contents))
+
+    def test_join_empty_segments(self):
+        self.assertEqual(join_segments([compress_segment(b"")] * 2), b"")
+
+    def test_decompress_segment(self):
+        content = b"layer" * 100
+        self.assertEqual(decompress_segment(compress_segment(content)), content)
@@ -0,0 +1,128 @@
+import mapbox_vector_tile
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import SimpleTestCase
+
+from vectortiles.backends.python.encoder import LayerEncoder, encode_varints
+
+BOUNDS = (0, 0, 4096, 4096)  # 1 unit by tile pixel
+
+
+class EncoderConformanceTestCase(SimpleTestCase):
+    def assertConform(self, features, bounds=BOUNDS):
+        """Check tile decoded as tile encoded by mapbox_vector_tile"""
+        encoder = LayerEncoder("layer", bounds)
+        for properties, wkt in features:
+            encoder.add_feature(properties.items(), GEOSGeometry(wkt).wkb)
+        expected = mapbox_vector_tile.encode(
+            {
+                "name": "layer",
+                "features": [
+                    {"geometry": wkt, "properties": properties}
+                    for properties, wkt in features
+                ],
+            },
+            default_options={"quantize_bounds": bounds},
+        )
+        self.assertEqual(
+            mapbox_vector_tile.decode(encoder.get_tile()),
+            mapbox_vector_tile.decode(expected),
+        )
+
+    def test_encode_varints(self):
+        self.assertEqual(
+            encode_varints([0, 1, 127, 128, 300, 2**32 - 1]),
+            bytes.fromhex("00017f8001ac02ffffffff0f"),
+        )
+
+    def test_encode_64_bits_varints(self):
+        self.assertEqual(
+            encode_varints([2**35, 2**63, 2**64 - 1]),
+            bytes.fromhex("808080808001")
+            + bytes.fromhex("80808080808080808001")
+            + bytes.fromhex("ffffffffffffffffff01"),
+        )
+
+    def test_points(self):
+        self.assertConform(
+            [({}, "POINT(10 20)"), ({}, "MULTIPOINT(1 1, 5 5, 4000 3000)")]
+        )
+
+    def test_lines(self):
+        self.assertConform(
+            [
+                ({}, "LINESTRING(0 0, 10 10, 20 5)"),
+                ({}, "MULTILINESTRING((0 0, 10 10), (-20 -20, 5000 100))"),
+            ]
+        )
+
+    def test_polygons(self):
+        self.assertConform(
+            [
+                ({}, "POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))"),
+                # clockwise exterior and interior
+                (
+                    {},
+                    "POLYGON((0 0, 0 100, 100 100, 100 0, 0 0),"
+                    "(20 20, 40 20, 40 40, 20 40, 20 20))",
+                ),
+                (
+                    {},
+                    "MULTIPOLYGON(((0 0, 10 0, 10 10, 0 0)),"
+                    "((20 20, 30 20, 30 30, 20 20)))",
+                ),
+            ]
+        )
+
+    def test_quantized_coordinates(self):
+        self.assertConform(
+            [({}, "LINESTRING(-180 -85, 0 0, 45.3 12.7, 180 85)")],
+            bounds=(-180, -85, 180, 85),
+        )
+
+    def test_properties(self):
+        self.assertConform(
+            [
+                ({"name": "first", "count": 1, "ratio": 0.5}, "POINT(1 1)"),
+                ({"name": "second", "count": -3, "visible": True}, "POINT(2 2)"),
+                ({"name": "first", "count": 1, "big": 2**40}, "POINT(3 3)"),
+            ]
+        )
+
+    def test_none_properties_are_skipped(self):
+        encoder = LayerEncoder("layer", BOUNDS)
+        encoder.add_feature(
+            [("name", None), ("count", 0)], GEOSGeometry("POINT(1 1)").wkb
+        )
+        content = mapbox_vector_tile.decode(encoder.get_tile())
+        self.assertEqual(content["layer"]["features"][0]["properties"], {"count": 0})
+
+    def test_empty_geometries_in_tile_are_skipped(self):
+        encoder = LayerEncoder("layer", BOUNDS)
+        for wkt in (
+            "MULTIPOINT EMPTY",
+            "LINESTRING EMPTY",
+            "LINESTRING(0 0, 0.1 0.1)",
+            "POLYGON((0 0, 0.2 0, 0.2 0.2, 0 0))",
+        ):
+            self.assertFalse(encoder.add_feature([], GEOSGeometry(wkt).wkb))
+        self.assertEqual(encoder.get_tile(), b"")
+
+    def test_geometry_collection_keeps_polygons(self):
+        encoder = LayerEncoder("layer", BOUNDS)
+        encoder.add_feature(
+            [],
+            GEOSGeometry(
+                "GEOMETRYCOLLECTION(POINT(1 1), POLYGON((0 0, 10 0, 10 10, 0 0)))"
+            ).wkb,
+        )
+        content = mapbox_vector_tile.decode(encoder.get_tile())
+        self.assertEqual(content["layer"]["features"][0]["geometry"]["type"], "Polygon")
+
+    def test_ewkb_with_z(self):
+        encoder = LayerEncoder("layer", BOUNDS)
+        encoder.add_feature([], GEOSGeometry("SRID=3857;POINT Z (3 4 5)").ewkb)
+        content = mapbox_vector_tile.decode(encoder.get_tile())
+        self.assertEqual(
+            content["layer"]["features"][0]["geometry"],
+            {"type": "Point", "coordinates": [3, 4]},
+        )
@@ -3,6 +3,7 @@ from django import VERSION
 from django.test import TestCase
 
 from test_vectortiles.test_app.models import Feature
+from test_vectortiles.test_app.vt_layers import FeatureVectorLayer
 from vectortiles.backends.postgis.functions import MakeEnvelope
 
 
@@ -20,3 +21,21 @@ class MakeEnvelopeTestCase(TestCase):
         )
 
         self.assertIn(expected_transform, str(features.query))
+
+
+class SimplifyTestCase(TestCase):
+    def test_simplify_before_clipping(self):
+        layer = FeatureVectorLayer()
+        layer.simplify = "preserve_topology"
+        _, sql, _ = layer.get_tile_query(0, 0, 0)
+        self.assertIn(
+            'ST_ASMVTGEOM(ST_SimplifyPreserveTopology(ST_Transform("test_app_feature"."geom"',
+            sql,
+        )
+
+    def test_tolerance_is_a_tile_pixel(self):
+        layer = FeatureVectorLayer()
+        self.assertAlmostEqual(layer.get_simplify_tolerance(0), 40075016.686 / 4096, 2)
+        self.assertAlmostEqual(
+            layer.get_simplify_tolerance(1), layer.get_simplify_tolerance(0) / 2
+        )
@@ -0,0 +1,156 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from test_vectortiles.test_app.models import Feature
+from test_vectortiles.test_app.vt_layers import FeatureVectorLayer
+from vectortiles import invalidation
+from vectortiles.views import MVTView
+
+
+class InvalidatedFeatureVectorLayer(FeatureVectorLayer):
+    cache_timeout = 60
+    cache_invalidation = True
+    cache_invalidation_max_tiles = 100
+    max_zoom = 10
+
+
+class InvalidatedFeatureView(MVTView):
+    layer_classes = [InvalidatedFeatureVectorLayer]
+
+
+class TilesCoverTestCase(TestCase):
+    def test_tiles_cover(self):
+        self.assertEqual(
+            invalidation.get_tiles_cover((1, 1, 1, 1), 0, 2),
+            [(0, 0, 0), (1, 0, 1), (2, 1, 2)],
+        )
+
+    def test_tiles_cover_with_buffer(self):
+        self.assertEqual(
+            invalidation.get_tiles_cover((1, 1, 1, 1), 1, 1, buffer=0.1),
+            [(0, 0, 1), (0, 1, 1), (1, 0, 1), (1, 1, 1)],
+        )
+
+    def test_tiles_cover_over_limit(self):
+        self.assertIsNone(
+            invalidation.get_tiles_cover((-1000, -1000, 1000, 1000), 0, 22, limit=100)
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class InvalidationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.feature = Feature.objects.create(name="feat1", geom="POINT(100 -45)")
+
+    def setUp(self):
+        cache.clear()
+        invalidation.connect(InvalidatedFeatureVectorLayer)
+        self.addCleanup(invalidation.disconnect, InvalidatedFeatureVectorLayer)
+        self.layer = InvalidatedFeatureVectorLayer()
+        # cache tiles
+        InvalidatedFeatureView().get_content_status(0, 0, 0)
+        InvalidatedFeatureView().get_content_status(1, 0, 0)
+        self.generations = {
+            z: cache.get(self.layer.get_cache_generation_key(z)) for z in (0, 1)
+        }
+
+    def is_cached(self, x, y, z):
+        return cache.has_key(self.layer.get_cache_key(x, y, z, self.generations[z]))
+
+    def test_tiles_are_cached_with_generation(self):
+        self.assertIsNotNone(self.generations[0])
+        self.assertTrue(self.is_cached(0, 0, 0))
+        with self.assertNumQueries(0):
+            InvalidatedFeatureView().get_content_status(0, 0, 0)
+
+    def test_covered_tiles_are_evicted_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(name="feat2", geom="POINT(100 45)")
+        self.assertFalse(self.is_cached(0, 0, 0))
+        self.assertTrue(self.is_cached(0, 0, 1))
+
+    def test_old_geometry_tiles_are_evicted_on_save(self):
+        self.feature.geom = "POINT(100 -40)"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feature.save()
+        self.assertFalse(self.is_cached(0, 0, 0))
+        self.assertTrue(self.is_cached(0, 0, 1))
+
+        InvalidatedFeatureView().get_content_status(0, 0, 0)
+        self.feature.geom = "POINT(-100 45)"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feature.save()
+        self.assertFalse(self.is_cached(0, 0, 0))
+        self.assertFalse(self.is_cached(0, 0, 1))
+
+    def test_compressed_tiles_are_evicted(self):
+        InvalidatedFeatureView(gzip_tiles=True).get_content_status(0, 0, 0)
+        key = self.layer.get_cache_key(0, 0, 0, self.generations[0], compressed=True)
+        self.assertTrue(cache.has_key(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feature.delete()
+        self.assertFalse(cache.has_key(key))
+
+    def test_covered_tiles_are_cleared_in_empty_tiles_bitmaps(self):
+        class BitmapFeatureVectorLayer(InvalidatedFeatureVectorLayer):
+            id = "bitmap-features"
+            empty_tiles_bitmap = True
+
+        invalidation.connect(BitmapFeatureVectorLayer)
+        self.addCleanup(invalidation.disconnect, BitmapFeatureVectorLayer)
+        MVTView(layer_classes=[BitmapFeatureVectorLayer]).get_content_status(1, 0, 0)
+        layer = BitmapFeatureVectorLayer()
+        generation = cache.get(layer.get_cache_generation_key(1))
+        key, bit = layer.get_empty_tiles_bitmap(0, 0, 1, generation)
+        self.assertEqual(cache.get(key), bit)
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(name="feat2", geom="POINT(-100 45)")
+        self.assertEqual(cache.get(key), 0)
+
+    def test_data_extent_is_evicted_when_outside(self):
+        class ExtentFeatureVectorLayer(InvalidatedFeatureVectorLayer):
+            extent_check = True
+
+        Feature.objects.create(name="feat2", geom="POINT(110 -40)")
+        invalidation.connect(ExtentFeatureVectorLayer)
+        self.addCleanup(invalidation.disconnect, ExtentFeatureVectorLayer)
+        layer = ExtentFeatureVectorLayer()
+        extent = layer.get_data_extent()
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(name="feat3", geom="POINT(105 -42)")
+        self.assertEqual(cache.get(layer.get_extent_cache_key()), extent)
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(name="feat4", geom="POINT(120 -42)")
+        self.assertIsNone(cache.get(layer.get_extent_cache_key()))
+
+    def test_covered_tiles_are_evicted_on_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feature.delete()
+        self.assertFalse(self.is_cached(0, 0, 0))
+
+    def test_generations_are_renewed_from_zoom_with_too_many_tiles(self):
+        InvalidatedFeatureView().get_content_status(10, 511, 511)
+        generation = cache.get(self.layer.get_cache_generation_key(10))
+        self.assertIsNotNone(generation)
+        # 37 tiles covered up to zoom 6, more than 100 with zoom 7
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(
+                name="feat2", geom="POLYGON((-10 -10, 10 -10, 10 10, -10 10, -10 -10))"
+            )
+        self.assertEqual(
+            cache.get(self.layer.get_cache_generation_key(0)), self.generations[0]
+        )
+        self.assertFalse(self.is_cached(0, 0, 0))
+        self.assertNotEqual(
+            cache.get(self.layer.get_cache_generation_key(10)), generation
+        )
+        with self.assertNumQueries(1):
+            InvalidatedFeatureView().get_content_status(0, 0, 0)
+
+    def test_nothing_evicted_without_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            Feature.objects.create(name="feat2", geom="POINT(100 45)")
+        self.assertTrue(self.is_cached(0, 0, 0))
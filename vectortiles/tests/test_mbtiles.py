@@ -0,0 +1,104 @@
+import gzip
+import json
+import sqlite3
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import mapbox_vector_tile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+
+from test_vectortiles.test_app.models import Feature
+from test_vectortiles.test_app.views import FeatureView
+from vectortiles import mbtiles
+from vectortiles.views import MBTilesView
+
+
+class MBTilesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(1 1)")
+
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "tiles.mbtiles"
+        call_command(
+            "export_mbtiles",
+            "test_vectortiles.test_app.views.FeatureView",
+            str(self.path),
+            bbox="-180,-90,180,90",
+            max_zoom=2,
+            tilejson_view="test_vectortiles.test_app.views.FeatureTileJSONView",
+            stdout=StringIO(),
+        )
+
+    def test_export_metadata(self):
+        with sqlite3.connect(self.path) as connection:
+            metadata = dict(connection.execute("SELECT name, value FROM metadata"))
+        self.assertEqual(metadata["name"], "My feature dataset")
+        self.assertEqual(metadata["format"], "pbf")
+        self.assertEqual(metadata["minzoom"], "0")
+        self.assertEqual(metadata["maxzoom"], "2")
+        self.assertEqual(metadata["bounds"], "-180.0,-90.0,180.0,90.0")
+        self.assertEqual(
+            json.loads(metadata["json"])["vector_layers"][0]["id"], "features"
+        )
+
+    def test_export_only_not_empty_tiles_with_tms_scheme(self):
+        with sqlite3.connect(self.path) as connection:
+            tiles = connection.execute(
+                "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles "
+                "ORDER BY zoom_level"
+            ).fetchall()
+        self.assertEqual(
+            [tile[:3] for tile in tiles], [(0, 0, 0), (1, 1, 1), (2, 2, 2)]
+        )
+        content, _ = FeatureView().get_content_status(2, 2, 1)
+        self.assertEqual(gzip.decompress(tiles[2][3]), content)
+
+    def test_get_tile(self):
+        self.assertIsNotNone(mbtiles.get_tile(self.path, 1, 1, 0))
+        self.assertIsNone(mbtiles.get_tile(self.path, 1, 0, 0))
+
+    def test_get_tile_after_file_replacement(self):
+        self.assertIsNotNone(mbtiles.get_tile(self.path, 1, 1, 0))
+        path = self.path.with_name("new.mbtiles")
+        writer = mbtiles.MBTilesWriter(path, {})
+        writer.write_tiles([(1, 0, 0, b"tile")])
+        writer.close()
+        path.replace(self.path)
+        self.assertIsNone(mbtiles.get_tile(self.path, 1, 1, 0))
+        self.assertEqual(gzip.decompress(mbtiles.get_tile(self.path, 1, 0, 0)), b"tile")
+
+    def test_view(self):
+        view = MBTilesView.as_view(mbtiles_path=self.path)
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        response = view(request, z=1, x=1, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        content = mapbox_vector_tile.decode(gzip.decompress(response.content))
+        self.assertEqual(list(content), ["features"])
+
+    def test_view_without_gzip(self):
+        view = MBTilesView.as_view(mbtiles_path=self.path)
+        response = view(RequestFactory().get("/"), z=1, x=1, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        content = mapbox_vector_tile.decode(response.content)
+        self.assertEqual(list(content), ["features"])
+
+    def test_view_not_modified(self):
+        view = MBTilesView.as_view(mbtiles_path=self.path)
+        response = view(RequestFactory().get("/"), z=1, x=1, y=0)
+        self.assertTrue(response.headers["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", response.headers)
+        request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(view(request, z=1, x=1, y=0).status_code, 304)
+
+    def test_view_empty_tile(self):
+        view = MBTilesView.as_view(mbtiles_path=self.path)
+        response = view(RequestFactory().get("/"), z=1, x=0, y=0)
+        self.assertEqual(response.status_code, 204)
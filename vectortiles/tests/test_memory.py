@@ -0,0 +1,110 @@
+import mapbox_vector_tile
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from test_vectortiles.test_app.models import Feature
+from vectortiles import invalidation
+from vectortiles.backends.memory import InMemoryVectorLayer
+from vectortiles.backends.python import VectorLayer
+
+
+class InMemoryFeatureVectorLayer(InMemoryVectorLayer):
+    model = Feature
+    id = "memory-features"
+    tile_fields = ("name",)
+
+
+class PythonFeatureVectorLayer(VectorLayer):
+    model = Feature
+    id = "memory-features"
+    tile_fields = ("name",)
+    clip_in_database = False
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class InMemoryVectorLayerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(0.5 0.5)")
+        Feature.objects.create(name="feat2", geom="LINESTRING(0.5 0.5, 1 1)")
+        Feature.objects.create(name="feat3", geom="POLYGON((2 2, 3 2, 3 3, 2 2))")
+
+    def setUp(self):
+        cache.clear()
+        invalidation.data_versions.clear()
+        self.layer = InMemoryFeatureVectorLayer()
+
+    def test_tiles_as_python_backend(self):
+        for x, y, z in ((0, 0, 0), (1, 0, 1), (32, 31, 6), (0, 0, 1)):
+            self.assertEqual(
+                mapbox_vector_tile.decode(self.layer.get_tile(x, y, z)),
+                mapbox_vector_tile.decode(PythonFeatureVectorLayer().get_tile(x, y, z)),
+            )
+
+    def test_data_loaded_once(self):
+        self.layer.get_tile(0, 0, 0)
+        with self.assertNumQueries(0):
+            InMemoryFeatureVectorLayer().get_tile(1, 0, 1)
+
+    def test_data_reloaded_on_invalidation(self):
+        self.layer.get_tile(0, 0, 0)
+        invalidation.connect(InMemoryFeatureVectorLayer)
+        self.addCleanup(invalidation.disconnect, InMemoryFeatureVectorLayer)
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.filter(name="feat1").get().delete()
+        content = mapbox_vector_tile.decode(self.layer.get_tile(0, 0, 0))
+        self.assertEqual(
+            [
+                feature["properties"]
+                for feature in content["memory-features"]["features"]
+            ],
+            [{"name": "feat2"}, {"name": "feat3"}],
+        )
+
+    def test_data_version_read_in_cache_after_timeout(self):
+        self.layer.get_tile(0, 0, 0)
+        # renewed by another process
+        cache.set(self.layer.get_data_version_key(), 1, timeout=None)
+        with self.assertNumQueries(0):
+            self.layer.get_tile(0, 0, 0)
+        self.layer.data_version_timeout = 0
+        with self.assertNumQueries(1):
+            self.layer.get_tile(0, 0, 0)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    )
+    def test_data_reloaded_without_cache(self):
+        self.layer.get_tile(0, 0, 0)
+        with self.assertNumQueries(0):
+            self.layer.get_tile(0, 0, 0)
+        invalidation.invalidate_layer_data(self.layer)
+        with self.assertNumQueries(1):
+            self.layer.get_tile(0, 0, 0)
+
+    def test_limit(self):
+        self.layer.queryset_limit = 1
+        content = mapbox_vector_tile.decode(self.layer.get_tile(0, 0, 0))
+        self.assertEqual(
+            [
+                feature["properties"]
+                for feature in content["memory-features"]["features"]
+            ],
+            [{"name": "feat1"}],
+        )
+
+    def test_generalized_zooms(self):
+        self.layer.generalized_zooms = [(0, 2)]
+        self.layer.simplify = "snap_to_grid"
+        self.layer.simplify_tolerance = 4096
+        # snapped on a grid of zoom 2 tiles, line and polygon collapse
+        content = mapbox_vector_tile.decode(self.layer.get_tile(0, 0, 0))
+        self.assertEqual(
+            [
+                feature["properties"]
+                for feature in content["memory-features"]["features"]
+            ],
+            [{"name": "feat1"}],
+        )
@@ -0,0 +1,102 @@
+import json
+
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from test_vectortiles.test_app.models import Feature
+from test_vectortiles.test_app.vt_layers import FeatureVectorLayer
+from vectortiles import metrics
+from vectortiles.timing import TileTimings
+from vectortiles.views import MetricsView, MVTView
+
+
+def get_timings(tiles, stages=(), duration=0.02):
+    timings = TileTimings()
+    timings.tiles = tiles
+    timings.stages = list(stages)
+    timings.duration = duration
+    return timings
+
+
+class MetricsRegistryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry(buckets=(0.01, 0.1))
+        self.registry.observe(
+            get_timings(
+                {"a": {"cached": False, "features": 3, "bytes": 100}},
+                [("a", "query", 0.004), ("a", "fetch", 0.004), (None, "cache", 1)],
+            ),
+            5,
+        )
+        self.registry.observe(
+            get_timings({"a": {"cached": True, "features": None, "bytes": 0}}), 5
+        )
+
+    def test_layer_metrics(self):
+        layer_metrics = self.registry.get_metrics()["layers"]["a"][5]
+        self.assertEqual(layer_metrics["tiles"], 2)
+        self.assertEqual(layer_metrics["cache_hit_ratio"], 0.5)
+        self.assertEqual(layer_metrics["empty_ratio"], 0.5)
+        self.assertEqual(layer_metrics["bytes"], 100)
+        self.assertEqual(layer_metrics["features"], 3)
+        # sum of layer stages, for rendered tile only
+        self.assertEqual(
+            layer_metrics["durations"]["buckets"], {0.01: 1, 0.1: 1, "+Inf": 1}
+        )
+
+    def test_tile_durations(self):
+        self.assertEqual(
+            self.registry.get_metrics()["tiles"][5]["buckets"],
+            {0.01: 0, 0.1: 2, "+Inf": 2},
+        )
+
+    def test_prometheus_export(self):
+        content = metrics.PrometheusExporter().export(self.registry.get_metrics())
+        self.assertIn(
+            'vectortiles_tile_duration_seconds_bucket{z="5",le="0.1"} 2', content
+        )
+        self.assertIn(
+            'vectortiles_layer_tiles_total{layer="a",z="5",cache="hit"} 1', content
+        )
+        self.assertIn('vectortiles_layer_features_total{layer="a",z="5"} 3', content)
+
+    def test_reset(self):
+        self.registry.reset()
+        self.assertEqual(self.registry.get_metrics(), {"tiles": {}, "layers": {}})
+
+
+class MetricsViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(0 0)")
+
+    def setUp(self):
+        metrics.registry.reset()
+        metrics.connect(MVTView)
+        self.addCleanup(metrics.disconnect, MVTView)
+        self.factory = RequestFactory()
+        view = MVTView.as_view(layer_classes=[FeatureVectorLayer])
+        view(self.factory.get("/"), z=0, x=0, y=0)
+        view(self.factory.get("/"), z=3, x=0, y=0)
+
+    def test_json_metrics(self):
+        response = MetricsView.as_view()(self.factory.get("/"))
+        self.assertEqual(response.headers["Content-Type"], "application/json")
+        content = json.loads(response.content)
+        self.assertEqual(list(content["tiles"]), ["0", "3"])
+        self.assertEqual(content["layers"]["features"]["0"]["features"], 1)
+        self.assertEqual(content["layers"]["features"]["3"]["empty_tiles"], 1)
+
+    def test_prometheus_metrics(self):
+        response = MetricsView.as_view()(
+            self.factory.get("/", {"format": "prometheus"})
+        )
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            b'vectortiles_layer_empty_tiles_total{layer="features",z="3"} 1',
+            response.content,
+        )
+
+    def test_unknown_format(self):
+        with self.assertRaises(Http404):
+            MetricsView.as_view()(self.factory.get("/", {"format": "xml"}))
@@ -1,7 +1,26 @@
-from django.test import TestCase
+from unittest import mock
 
+import mercantile
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+import vectortiles
 from test_vectortiles.test_app.models import Feature
-from vectortiles.backends import BaseVectorLayerMixin
+from test_vectortiles.test_app.vt_layers import FeatureVectorLayer
+from vectortiles import settings as app_settings
+from vectortiles.backends import BaseVectorLayerMixin, postgis
+from vectortiles.views import MVTView
+
+
+class BackendLayersTestCase(SimpleTestCase):
+    def test_optional_layers_are_resolved_when_used(self):
+        # custom backend without clustered and grid layers
+        with mock.patch.object(
+            app_settings, "VECTOR_TILES_BACKEND", "test_vectortiles.test_app"
+        ):
+            with self.assertRaises(ImportError):
+                vectortiles.GridVectorLayer  # noqa: B018
+        self.assertIs(vectortiles.GridVectorLayer, postgis.GridVectorLayer)
 
 
 class BaseVectorLayerMixinTestCase(TestCase):
@@ -31,7 +50,116 @@ class BaseVectorLayerMixinTestCase(TestCase):
             },
         )
 
+    def test_zoom_queryset_is_vector_tile_queryset_without_tile(self):
+        instance = BaseVectorLayerMixin()
+        with mock.patch.object(instance, "get_vector_tile_queryset") as get_queryset:
+            self.assertIs(instance.get_zoom_queryset(5), get_queryset.return_value)
+        get_queryset.assert_called_once_with(5, None, None)
+
     def test_queryset_is_used(self):
         instance = BaseVectorLayerMixin()
         instance.queryset = Feature.objects.all()
         self.assertEqual(instance.get_queryset(), instance.queryset)
+
+    def test_cache_disabled_by_default(self):
+        instance = BaseVectorLayerMixin()
+        self.assertEqual(instance.get_cache_timeout(), 0)
+        self.assertEqual(instance.get_cache_alias(), "default")
+
+    def test_cache_timeout_from_layer(self):
+        instance = BaseVectorLayerMixin()
+        instance.cache_timeout = 10
+        self.assertEqual(instance.get_cache_timeout(), 10)
+
+    def test_cache_key_depends_on_version(self):
+        instance = BaseVectorLayerMixin()
+        instance.id = "features"
+        key = instance.get_cache_key(0, 0, 0)
+        self.assertNotEqual(key, instance.get_cache_key(1, 0, 1))
+        instance.cache_version = 2
+        self.assertNotEqual(key, instance.get_cache_key(0, 0, 0))
+
+    def test_cache_keys_depend_on_layer_class(self):
+        class OtherFeatureVectorLayer(FeatureVectorLayer):
+            pass
+
+        layer, other_layer = FeatureVectorLayer(), OtherFeatureVectorLayer()
+        self.assertEqual(layer.get_id(), other_layer.get_id())
+        self.assertNotEqual(
+            layer.get_cache_key(0, 0, 0), other_layer.get_cache_key(0, 0, 0)
+        )
+        self.assertNotEqual(
+            layer.get_empty_tiles_bitmap(0, 0, 0)[0],
+            other_layer.get_empty_tiles_bitmap(0, 0, 0)[0],
+        )
+        self.assertNotEqual(
+            layer.get_cache_generation_key(), other_layer.get_cache_generation_key()
+        )
+        self.assertNotEqual(
+            layer.get_extent_cache_key(), other_layer.get_extent_cache_key()
+        )
+
+
+class ExtentFeatureVectorLayer(FeatureVectorLayer):
+    extent_check = True
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class DataExtentTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(2.5 46.5)")
+
+    def setUp(self):
+        cache.clear()
+        self.layer = ExtentFeatureVectorLayer()
+        self.tile = mercantile.tile(2.5, 46.5, 10)
+
+    def test_data_extent_is_cached(self):
+        with self.assertNumQueries(1):
+            extent = self.layer.get_data_extent()
+            self.assertEqual(self.layer.get_data_extent(), extent)
+        x, y = mercantile.xy(2.5, 46.5)
+        for value, expected in zip(extent, (x, y, x, y)):
+            self.assertAlmostEqual(value, expected, places=3)
+
+    def test_tile_outside_data_extent_without_query(self):
+        self.layer.get_data_extent()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.layer.get_tile(self.tile.x + 2, self.tile.y, 10), b"")
+        with self.assertNumQueries(1):
+            self.assertNotEqual(self.layer.get_tile(self.tile.x, self.tile.y, 10), b"")
+
+    def test_view_reads_data_extent_with_cached_tiles(self):
+        self.layer.get_data_extent()
+        view = MVTView(layer_classes=[ExtentFeatureVectorLayer])
+        # layers don't read cache
+        with mock.patch("vectortiles.backends.caches", {}):
+            with self.assertNumQueries(0):
+                self.assertEqual(
+                    view.get_content_status(10, self.tile.x + 2, self.tile.y),
+                    (b"", 204),
+                )
+
+    def test_tile_in_buffer_is_generated(self):
+        west, south, east, north = mercantile.xy_bounds(self.tile)
+        # data 1 meter away from tile east border
+        cache.set(self.layer.get_extent_cache_key(), (east + 1, south, east + 1, north))
+        self.assertTrue(self.layer.check_in_data_extent(self.tile.x, self.tile.y, 10))
+        self.assertFalse(
+            self.layer.check_in_data_extent(self.tile.x - 1, self.tile.y, 10)
+        )
+
+    def test_no_data(self):
+        Feature.objects.all().delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.layer.get_data_extent())
+            self.assertEqual(self.layer.get_tile(0, 0, 0), b"")
+
+    def test_estimated_extent(self):
+        self.layer.estimated_extent = True
+        extent = self.layer.get_extent()
+        for value, expected in zip(extent, (2.5, 46.5, 2.5, 46.5)):
+            self.assertAlmostEqual(value, expected, places=2)
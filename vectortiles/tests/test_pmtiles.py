@@ -0,0 +1,118 @@
+import gzip
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import mapbox_vector_tile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from test_vectortiles.test_app.models import Feature
+from test_vectortiles.test_app.views import FeatureView
+from vectortiles import pmtiles
+from vectortiles.views import PMTilesView
+
+
+class PMTilesFormatTestCase(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "tiles.pmtiles"
+
+    def test_tile_ids(self):
+        self.assertEqual(pmtiles.zxy_to_tile_id(0, 0, 0), 0)
+        self.assertEqual(
+            [
+                pmtiles.zxy_to_tile_id(1, x, y)
+                for x, y in ((0, 0), (0, 1), (1, 1), (1, 0))
+            ],
+            [1, 2, 3, 4],
+        )
+        self.assertEqual(pmtiles.zxy_to_tile_id(2, 0, 0), 5)
+
+    def test_deduplicated_tiles_and_leaf_directories(self):
+        tiles = [
+            (8, x, y, b"sea" if (x + y) % 3 else f"{x}/{y}".encode())
+            for x in range(256)
+            for y in range(0, 256, 2)
+        ]
+        writer = pmtiles.PMTilesWriter(self.path, {"minzoom": 8, "maxzoom": 8})
+        writer.write_tiles([*tiles, (8, 1, 1, b"")])
+        writer.close()
+
+        reader = pmtiles.PMTilesReader(self.path)
+        self.assertEqual(reader.header.addressed_tiles_count, len(tiles))
+        self.assertEqual(
+            reader.header.tile_contents_count,
+            len({content for *_, content in tiles}),
+        )
+        self.assertGreater(reader.header.leaf_directory_length, 0)
+        for z, x, y, content in tiles[::97]:
+            self.assertEqual(gzip.decompress(reader.get_tile(z, x, y)), content)
+        self.assertIsNone(reader.get_tile(8, 1, 1))
+        self.assertIsNone(reader.get_tile(7, 0, 0))
+
+    def test_not_pmtiles_file(self):
+        self.path.write_bytes(b"\x00" * 127)
+        with self.assertRaises(ValueError):
+            pmtiles.PMTilesReader(self.path)
+
+
+class PMTilesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(1 1)")
+
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "tiles.pmtiles"
+        call_command(
+            "export_pmtiles",
+            "test_vectortiles.test_app.views.FeatureView",
+            str(self.path),
+            bbox="-180,-85,180,85",
+            max_zoom=2,
+            tilejson_view="test_vectortiles.test_app.views.FeatureTileJSONView",
+            stdout=StringIO(),
+        )
+
+    def test_export_metadata(self):
+        reader = pmtiles.PMTilesReader(self.path)
+        self.assertEqual(reader.header.min_zoom, 0)
+        self.assertEqual(reader.header.max_zoom, 2)
+        self.assertEqual(reader.header.min_lat_e7, -850000000)
+        self.assertEqual(reader.header.tile_type, pmtiles.TILE_TYPE_MVT)
+        metadata = reader.get_metadata()
+        self.assertEqual(metadata["name"], "My feature dataset")
+        self.assertEqual(metadata["vector_layers"][0]["id"], "features")
+        self.assertNotIn("tiles", metadata)
+
+    def test_export_only_not_empty_tiles(self):
+        reader = pmtiles.PMTilesReader(self.path)
+        self.assertEqual(reader.header.addressed_tiles_count, 3)
+        content, _ = FeatureView().get_content_status(2, 2, 1)
+        self.assertEqual(gzip.decompress(reader.get_tile(2, 2, 1)), content)
+        self.assertIsNone(reader.get_tile(1, 0, 0))
+
+    def test_view(self):
+        view = PMTilesView.as_view(pmtiles_path=self.path)
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        response = view(request, z=1, x=1, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        content = mapbox_vector_tile.decode(gzip.decompress(response.content))
+        self.assertEqual(list(content), ["features"])
+
+    def test_view_without_gzip(self):
+        view = PMTilesView.as_view(pmtiles_path=self.path)
+        response = view(RequestFactory().get("/"), z=1, x=1, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        content = mapbox_vector_tile.decode(response.content)
+        self.assertEqual(list(content), ["features"])
+
+    def test_view_empty_tile(self):
+        view = PMTilesView.as_view(pmtiles_path=self.path)
+        response = view(RequestFactory().get("/"), z=1, x=0, y=0)
+        self.assertEqual(response.status_code, 204)
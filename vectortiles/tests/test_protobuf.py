@@ -0,0 +1,17 @@
+from django.test import SimpleTestCase
+
+from vectortiles.protobuf import read_varint, write_varint
+
+
+class VarintTestCase(SimpleTestCase):
+    def test_write_varint(self):
+        buffer = bytearray()
+        for value in (0, 300, 2**64 - 1):
+            write_varint(buffer, value)
+        self.assertEqual(buffer.hex(), "00ac02ffffffffffffffffff01")
+
+    def test_read_varint(self):
+        data = bytes.fromhex("00ac02ffffffffffffffffff01")
+        self.assertEqual(read_varint(data, 0), (0, 1))
+        self.assertEqual(read_varint(data, 1), (300, 3))
+        self.assertEqual(read_varint(data, 3), (2**64 - 1, 13))
@@ -0,0 +1,43 @@
+from django.test import SimpleTestCase
+
+from vectortiles import timing
+
+
+class TileTimingsTestCase(SimpleTestCase):
+    def test_stages_without_timings(self):
+        with timing.Stage("layer", "encode") as stage:
+            items = [1, 2]
+            self.assertIs(stage.timed("fetch", items), items)
+        self.assertIsNone(timing.get_timings())
+
+    def test_stages_durations(self):
+        with timing.TileTimings() as timings:
+            self.assertIs(timing.get_timings(), timings)
+            with timing.Stage("layer", "encode") as stage:
+                self.assertEqual(list(stage.timed("fetch", [1, 2])), [1, 2])
+            with timing.Stage(None, "cache"):
+                pass
+            with timing.Stage(None, "cache"):
+                pass
+        self.assertIsNone(timing.get_timings())
+        self.assertEqual(
+            list(timings.get_durations()),
+            [("layer", "fetch"), ("layer", "encode"), (None, "cache")],
+        )
+        self.assertEqual(len(timings.stages), 4)
+
+    def test_server_timing(self):
+        timings = timing.TileTimings()
+        timings.add_stage("my layer", "query", 0.0012)
+        timings.add_stage(None, "cache", 0.0005)
+        timings.duration = 0.01
+        self.assertEqual(
+            timings.get_server_timing(),
+            "my_layer.query;dur=1.200, cache;dur=0.500, total;dur=10.000",
+        )
+
+    def test_count_tile_features(self):
+        # one layer with two empty features, a name and a version
+        layer = b"\x0a\x01a" + b"\x12\x00\x12\x00" + b"\x78\x02"
+        self.assertEqual(timing.count_tile_features(b"\x1a\x09" + layer), 2)
+        self.assertEqual(timing.count_tile_features(b""), 0)
@@ -1,9 +1,46 @@
+import asyncio
+import gzip
+import json
+import threading
+from datetime import datetime, timezone
+from hashlib import md5
+from unittest import mock, skipIf, skipUnless
+
 import mapbox_vector_tile
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import Count, Min, Q
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
 
 from test_vectortiles.test_app.models import Feature, Layer
-from vectortiles.views import MVTView, TileJSONView
+from test_vectortiles.test_app.vt_layers import (
+    FeatureLayerFilteredByDateVectorLayer,
+    FeatureVectorLayer,
+)
+from vectortiles import ClusteredVectorLayer, GridVectorLayer, invalidation
+from vectortiles.backends import postgis, python
+from vectortiles.compression import decompress_segment
+from vectortiles.mixins import render_layer_tile
+from vectortiles.signals import tile_rendered
+from vectortiles.views import (
+    AsyncMVTView,
+    AsyncTileJSONView,
+    MVTView,
+    TileJSONView,
+)
+
+
+class DatedFeatureVectorLayer(FeatureLayerFilteredByDateVectorLayer):
+    id = "dated-features"
 
 
 class VectorTileBaseTest(TestCase):
@@ -84,6 +121,87 @@ class VectorTileTestCase(VectorTileBaseTest):
             },
         )
 
+    def test_layers_single_query(self):
+        class TestView(MVTView):
+            layer_classes = [FeatureVectorLayer, DatedFeatureVectorLayer]
+
+        class SingleQueryTestView(TestView):
+            layers_single_query = True
+
+        with self.assertNumQueries(2):
+            content, status = TestView().get_content_status(0, 0, 0)
+        with self.assertNumQueries(1):
+            single_content, single_status = SingleQueryTestView().get_content_status(
+                0, 0, 0
+            )
+        self.assertEqual(single_status, status)
+        self.assertEqual(
+            mapbox_vector_tile.decode(single_content),
+            mapbox_vector_tile.decode(content),
+        )
+        self.assertEqual(
+            list(mapbox_vector_tile.decode(single_content)),
+            ["features", "dated-features"],
+        )
+
+    def test_layers_single_query_skip_layers_out_of_zoom(self):
+        class OutOfZoomVectorLayer(DatedFeatureVectorLayer):
+            min_zoom = 10
+
+        class TestView(MVTView):
+            layer_classes = [FeatureVectorLayer, OutOfZoomVectorLayer]
+            layers_single_query = True
+
+        with self.assertNumQueries(1):
+            content, status = TestView().get_content_status(0, 0, 0)
+        self.assertEqual(list(mapbox_vector_tile.decode(content)), ["features"])
+
+    def test_tile_with_invalid_coordinates_not_found(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("feature", args=(1, 2, 0)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_simplified_geometries(self):
+        for simplify in ("preserve_topology", "visvalingam", "snap_to_grid"):
+            with self.subTest(simplify=simplify):
+                layer = FeatureVectorLayer()
+                layer.simplify = simplify
+                content = mapbox_vector_tile.decode(layer.get_tile(0, 0, 0))
+                self.assertEqual(
+                    [
+                        feature["geometry"]["type"]
+                        for feature in content["features"]["features"]
+                    ],
+                    ["Point", "LineString"],
+                )
+
+    def test_limit_keeps_most_important_features(self):
+        layer = FeatureVectorLayer()
+        layer.queryset_limit = 1
+        layer.limit_order_by = ("-name",)
+        content = mapbox_vector_tile.decode(layer.get_tile(0, 0, 0))
+        self.assertEqual(
+            [
+                feature["properties"]["name"]
+                for feature in content["features"]["features"]
+            ],
+            ["feat2"],
+        )
+
+    def test_limit_by_zoom(self):
+        layer = FeatureVectorLayer()
+        layer.queryset_limit_by_zoom = [(0, 1, 1)]
+        for (x, y, z), count in (((0, 0, 0), 1), ((1, 0, 1), 1), ((2, 1, 2), 2)):
+            with self.subTest(z=z):
+                content = mapbox_vector_tile.decode(layer.get_tile(x, y, z))
+                self.assertEqual(len(content["features"]["features"]), count)
+
+    def test_unknown_simplification(self):
+        layer = FeatureVectorLayer()
+        layer.simplify = "unknown"
+        with self.assertRaises(ValueError):
+            layer.get_tile(0, 0, 0)
+
     def test_get_url_defined_prefix_in_attribute(self):
         class TestView(MVTView):
             prefix_url = "test"
@@ -110,6 +228,654 @@ class VectorTileTestCase(VectorTileBaseTest):
         )
 
 
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class VectorTileCacheTestCase(VectorTileBaseTest):
+    def setUp(self):
+        cache.clear()
+
+    def test_layer_tiles_are_cached(self):
+        class CachedFeatureVectorLayer(FeatureVectorLayer):
+            cache_timeout = 60
+
+        class TestView(MVTView):
+            layer_classes = [CachedFeatureVectorLayer]
+
+        with self.assertNumQueries(1):
+            content, status = TestView().get_content_status(0, 0, 0)
+        with self.assertNumQueries(0):
+            cached_content, cached_status = TestView().get_content_status(0, 0, 0)
+        self.assertEqual((cached_content, cached_status), (content, status))
+        self.assertEqual(
+            cache.get(CachedFeatureVectorLayer().get_cache_key(0, 0, 0)), content
+        )
+
+    def test_empty_layer_tiles_are_cached(self):
+        class CachedFeatureVectorLayer(FeatureVectorLayer):
+            cache_timeout = 60
+
+        class TestView(MVTView):
+            layer_classes = [CachedFeatureVectorLayer]
+
+        TestView().get_content_status(10, 0, 0)
+        with self.assertNumQueries(0):
+            content, status = TestView().get_content_status(10, 0, 0)
+        self.assertEqual((content, status), (b"", 204))
+
+    def test_only_missing_layer_tiles_are_generated(self):
+        class CachedFeatureVectorLayer(FeatureVectorLayer):
+            cache_timeout = 60
+
+        class CachedDatedFeatureVectorLayer(DatedFeatureVectorLayer):
+            cache_timeout = 60
+
+        class TestView(MVTView):
+            layer_classes = [CachedFeatureVectorLayer, CachedDatedFeatureVectorLayer]
+
+        content, status = TestView().get_content_status(0, 0, 0)
+        cache.delete(CachedDatedFeatureVectorLayer().get_cache_key(0, 0, 0))
+        with self.assertNumQueries(1):
+            cached_content, cached_status = TestView().get_content_status(0, 0, 0)
+        self.assertEqual(cached_content, content)
+
+    def test_cache_version_change_invalidates_tiles(self):
+        class CachedFeatureVectorLayer(FeatureVectorLayer):
+            cache_timeout = 60
+
+        class TestView(MVTView):
+            layer_classes = [CachedFeatureVectorLayer]
+
+        TestView().get_content_status(0, 0, 0)
+        CachedFeatureVectorLayer.cache_version = 2
+        with self.assertNumQueries(1):
+            TestView().get_content_status(0, 0, 0)
+
+    def test_layer_tiles_are_not_cached_by_default(self):
+        TestView = type("TestView", (MVTView,), {"layer_classes": [FeatureVectorLayer]})
+        TestView().get_content_status(0, 0, 0)
+        with self.assertNumQueries(1):
+            TestView().get_content_status(0, 0, 0)
+
+
+class ClusteredFeatureVectorLayer(ClusteredVectorLayer):
+    model = Feature
+    id = "features"
+    tile_fields = ("name",)
+    cluster_max_zoom = 10
+    cluster_fields = {"first_name": Min("name")}
+
+
+class ClusteredVectorLayerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(1 1)")
+        Feature.objects.create(name="feat2", geom="POINT(1.001 1.001)")
+        Feature.objects.create(name="feat3", geom="POINT(50 50)")
+
+    def get_features(self, x, y, z, layer=None):
+        layer = layer or ClusteredFeatureVectorLayer()
+        content = mapbox_vector_tile.decode(layer.get_tile(x, y, z))
+        return sorted(
+            (feature["properties"] for feature in content["features"]["features"]),
+            key=lambda properties: sorted(properties.items()),
+        )
+
+    def test_points_are_clustered(self):
+        self.assertEqual(
+            self.get_features(0, 0, 0),
+            [
+                {"count": 1, "first_name": "feat3"},
+                {"count": 2, "first_name": "feat1"},
+            ],
+        )
+
+    def test_points_are_not_clustered_above_max_zoom(self):
+        self.assertEqual(
+            self.get_features(1029, 1018, 11),
+            [{"name": "feat1"}, {"name": "feat2"}],
+        )
+
+    def test_biggest_clusters_are_kept(self):
+        layer = ClusteredFeatureVectorLayer()
+        layer.queryset_limit = 1
+        self.assertEqual(
+            self.get_features(0, 0, 0, layer), [{"count": 2, "first_name": "feat1"}]
+        )
+
+
+class PythonFeatureVectorLayer(python.VectorLayer):
+    model = Feature
+    id = "features"
+    tile_fields = ("name",)
+    tile_chunk_size = 1
+
+
+class PythonVectorLayerTestCase(VectorTileBaseTest):
+    def test_features_are_streamed(self):
+        with self.assertNumQueries(1):
+            content = mapbox_vector_tile.decode(
+                PythonFeatureVectorLayer().get_tile(0, 0, 0)
+            )
+        self.assertEqual(
+            [feature["properties"] for feature in content["features"]["features"]],
+            [{"name": "feat1"}, {"name": "feat2"}],
+        )
+
+    def test_empty_tile(self):
+        self.assertEqual(PythonFeatureVectorLayer().get_tile(0, 1, 2), b"")
+
+    def test_features_clipped_with_shapely(self):
+        layer = PythonFeatureVectorLayer()
+        layer.clip_in_database = False
+        for x, y, z in ((0, 0, 0), (1, 0, 1), (4, 3, 3)):
+            self.assertEqual(
+                mapbox_vector_tile.decode(layer.get_tile(x, y, z)),
+                mapbox_vector_tile.decode(PythonFeatureVectorLayer().get_tile(x, y, z)),
+            )
+
+
+class GridFeatureVectorLayer(GridVectorLayer):
+    model = Feature
+    id = "features"
+    grid_fields = {
+        "count": Count("pk"),
+        "names": Count("name", distinct=True),
+        "feat1": Count("pk", filter=Q(name="feat1")),
+    }
+
+
+class GridVectorLayerPostGISVersionTestCase(TestCase):
+    def test_postgis_without_grid_functions(self):
+        with mock.patch.object(connection.ops, "spatial_version", (3, 0, 0)):
+            with self.assertRaisesMessage(ImproperlyConfigured, "PostGIS 3.1+"):
+                GridFeatureVectorLayer().get_tile(0, 0, 0)
+
+
+@skipUnless(
+    connection.ops.spatial_version >= postgis.GRID_FUNCTIONS_POSTGIS_VERSION,
+    "ST_HexagonGrid and ST_SquareGrid require PostGIS 3.1+",
+)
+class GridVectorLayerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Feature.objects.create(name="feat1", geom="POINT(1 1)")
+        Feature.objects.create(name="feat1", geom="POINT(1.001 1.001)")
+        Feature.objects.create(name="feat2", geom="POINT(1.002 1.002)")
+        Feature.objects.create(name="feat3", geom="POINT(50 50)")
+
+    def get_features(self, layer, x, y, z):
+        content = mapbox_vector_tile.decode(layer.get_tile(x, y, z))
+        return sorted(
+            (feature for feature in content["features"]["features"]),
+            key=lambda feature: feature["properties"]["count"],
+        )
+
+    def test_features_are_aggregated_in_hexagons(self):
+        features = self.get_features(GridFeatureVectorLayer(), 0, 0, 0)
+        self.assertEqual(
+            [feature["properties"] for feature in features],
+            [
+                {"count": 1, "names": 1, "feat1": 0},
+                {"count": 3, "names": 2, "feat1": 2},
+            ],
+        )
+        self.assertEqual(features[0]["geometry"]["type"], "Polygon")
+        # hexagon
+        self.assertEqual(len(features[0]["geometry"]["coordinates"][0]), 7)
+
+    def test_features_are_aggregated_in_squares(self):
+        layer = GridFeatureVectorLayer()
+        layer.grid_shape = "square"
+        features = self.get_features(layer, 0, 0, 0)
+        self.assertEqual(
+            [feature["properties"]["count"] for feature in features], [1, 3]
+        )
+        self.assertEqual(len(features[0]["geometry"]["coordinates"][0]), 5)
+
+    def test_empty_cells_are_not_encoded(self):
+        self.assertEqual(self.get_features(GridFeatureVectorLayer(), 0, 0, 2), [])
+
+    def test_unknown_grid_shape(self):
+        layer = GridFeatureVectorLayer()
+        layer.grid_shape = "triangle"
+        with self.assertRaisesMessage(ValueError, "Unknown grid shape: triangle"):
+            layer.get_tile(0, 0, 0)
+
+
+class BitmapFeatureVectorLayer(FeatureVectorLayer):
+    cache_timeout = 60
+    empty_tiles_bitmap = True
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class EmptyTilesBitmapTestCase(VectorTileBaseTest):
+    def setUp(self):
+        cache.clear()
+        self.layer = BitmapFeatureVectorLayer()
+
+    def test_empty_tile_is_stored_in_bitmap(self):
+        view = MVTView(layer_classes=[BitmapFeatureVectorLayer])
+        view.get_content_status(2, 0, 0)
+        key, bit = self.layer.get_empty_tiles_bitmap(0, 0, 2)
+        self.assertEqual(cache.get(key), bit)
+        self.assertIsNone(cache.get(self.layer.get_cache_key(0, 0, 2)))
+        with self.assertNumQueries(0):
+            self.assertEqual(view.get_content_status(2, 0, 0), (b"", 204))
+        with self.assertNumQueries(1):
+            view.get_content_status(3, 0, 0)
+
+    def test_not_empty_tile_is_cached(self):
+        view = MVTView(layer_classes=[BitmapFeatureVectorLayer])
+        content, _ = view.get_content_status(0, 0, 0)
+        self.assertEqual(cache.get(self.layer.get_cache_key(0, 0, 0)), content)
+
+    def test_empty_tile_is_inherited_by_children(self):
+        class InheritedFeatureVectorLayer(BitmapFeatureVectorLayer):
+            empty_tiles_inherit = True
+
+        view = MVTView(layer_classes=[InheritedFeatureVectorLayer])
+        view.get_content_status(2, 0, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(view.get_content_status(10, 200, 100), (b"", 204))
+
+    def test_bits_cleared_while_rendering_are_not_restored(self):
+        view = MVTView(layer_classes=[BitmapFeatureVectorLayer])
+        key, bit = self.layer.get_empty_tiles_bitmap(0, 0, 2)
+        _, other_bit = self.layer.get_empty_tiles_bitmap(1, 0, 2)
+        cache.set(key, other_bit)
+        render_layer_tiles = view.render_layer_tiles
+
+        def render_and_clear(*args):
+            # features added in tile 1/0/2 while tile 0/0/2 is rendered
+            invalidation.clear_empty_tiles(self.layer, {}, [(1, 0, 2)])
+            return render_layer_tiles(*args)
+
+        with mock.patch.object(view, "render_layer_tiles", render_and_clear):
+            view.get_content_status(2, 0, 0)
+        self.assertEqual(cache.get(key), bit)
+
+
+class VersionedFeatureVectorLayer(FeatureVectorLayer):
+    cache_version = 2
+
+    def get_last_modified(self):
+        return datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class ConditionalRequestTestCase(VectorTileBaseTest):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_content_etag(self):
+        view = MVTView.as_view(layer_classes=[FeatureVectorLayer])
+        response = view(self.factory.get("/"), z=0, x=0, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["ETag"], f'"{md5(response.content).hexdigest()}"'
+        )
+        self.assertNotIn("Last-Modified", response.headers)
+        request = self.factory.get("/", HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        response = view(request, z=0, x=0, y=0)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_version_etag_not_modified_without_query(self):
+        view = MVTView.as_view(layer_classes=[VersionedFeatureVectorLayer])
+        response = view(self.factory.get("/"), z=0, x=0, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["Last-Modified"], "Mon, 01 Jan 2024 00:00:00 GMT"
+        )
+        request = self.factory.get("/", HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        with self.assertNumQueries(0):
+            self.assertEqual(view(request, z=0, x=0, y=0).status_code, 304)
+        request = self.factory.get(
+            "/", HTTP_IF_MODIFIED_SINCE="Tue, 02 Jan 2024 00:00:00 GMT"
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(view(request, z=0, x=0, y=0).status_code, 304)
+
+    def test_version_etag_changes_with_version_and_tile(self):
+        view = MVTView(layer_classes=[VersionedFeatureVectorLayer])
+        etag = view.get_tile_etag(0, 0, 0)
+        self.assertNotEqual(view.get_tile_etag(1, 0, 0), etag)
+
+        class NewVersionFeatureVectorLayer(VersionedFeatureVectorLayer):
+            cache_version = 3
+
+        view = MVTView(layer_classes=[NewVersionFeatureVectorLayer])
+        self.assertNotEqual(view.get_tile_etag(0, 0, 0), etag)
+
+    def test_no_version_etag_with_cache_invalidation(self):
+        class InvalidatedFeatureVectorLayer(VersionedFeatureVectorLayer):
+            cache_invalidation = True
+
+        view = MVTView(layer_classes=[InvalidatedFeatureVectorLayer])
+        self.assertIsNone(view.get_tile_etag(0, 0, 0))
+
+    def test_cache_control_by_zoom(self):
+        view = MVTView.as_view(
+            layer_classes=[FeatureVectorLayer],
+            cache_control={"max_age": 60},
+            zoom_cache_control=[(0, 5, {"max_age": 86400, "public": True})],
+        )
+        response = view(self.factory.get("/"), z=0, x=0, y=0)
+        self.assertEqual(response.headers["Cache-Control"], "max-age=86400, public")
+        response = view(self.factory.get("/"), z=6, x=0, y=0)
+        self.assertEqual(response.headers["Cache-Control"], "max-age=60")
+
+    def test_tilejson_validators(self):
+        view = TileJSONView.as_view(
+            layer_classes=[VersionedFeatureVectorLayer],
+            tile_url="/tiles/{z}/{x}/{y}",
+            cache_control={"max_age": 60},
+        )
+        response = view(self.factory.get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Cache-Control"], "max-age=60")
+        self.assertEqual(
+            response.headers["Last-Modified"], "Mon, 01 Jan 2024 00:00:00 GMT"
+        )
+        request = self.factory.get("/", HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(view(request).status_code, 304)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class GzipTilesTestCase(VectorTileBaseTest):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+        class CachedFeatureVectorLayer(FeatureVectorLayer):
+            cache_timeout = 60
+
+        self.layer = CachedFeatureVectorLayer()
+        self.view = MVTView.as_view(
+            layer_classes=[CachedFeatureVectorLayer, DatedFeatureVectorLayer],
+            gzip_tiles=True,
+        )
+
+    def test_gzip_encoded_tile(self):
+        content, _ = MVTView(
+            layer_classes=[FeatureVectorLayer, DatedFeatureVectorLayer]
+        ).get_content_status(0, 0, 0)
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        response = self.view(request, z=0, x=0, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(response.content), content)
+
+    def test_compressed_layer_tile_is_cached(self):
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        self.view(request, z=0, x=0, y=0)
+        cached = cache.get(self.layer.get_cache_key(0, 0, 0, compressed=True))
+        self.assertEqual(decompress_segment(cached), self.layer.get_tile(0, 0, 0))
+        with self.assertNumQueries(1):  # not cached layer only
+            self.view(request, z=0, x=0, y=0)
+
+    def test_decoded_tile_without_gzip(self):
+        response = self.view(self.factory.get("/"), z=0, x=0, y=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(
+            list(mapbox_vector_tile.decode(response.content)),
+            ["features", "dated-features"],
+        )
+
+    def test_empty_tile(self):
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = self.view(request, z=2, x=0, y=0)
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+class CompiledFeatureVectorLayer(FeatureVectorLayer):
+    compiled_sql = True
+    queryset_limit = 10
+
+
+class CompiledSQLTestCase(VectorTileBaseTest):
+    def setUp(self):
+        postgis.compiled_queries.clear()
+        self.layer = CompiledFeatureVectorLayer()
+
+    def test_compiled_query_equals_built_query(self):
+        for x, y, z in ((0, 0, 1), (1, 0, 1), (3, 5, 4), (15, 0, 4), (0, 15, 4)):
+            self.assertEqual(
+                self.layer.get_tile_query(x, y, z),
+                self.layer.build_tile_query(x, y, z),
+            )
+        self.assertEqual(
+            set(postgis.compiled_queries),
+            {(CompiledFeatureVectorLayer, 1), (CompiledFeatureVectorLayer, 4)},
+        )
+
+    def test_compiled_tiles(self):
+        self.layer.get_tile(0, 0, 1)
+        for x, y in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            self.assertEqual(
+                self.layer.get_tile(x, y, 1), FeatureVectorLayer().get_tile(x, y, 1)
+            )
+
+    def test_queryset_depending_on_tile_is_not_compiled(self):
+        class TileFilteredVectorLayer(CompiledFeatureVectorLayer):
+            def get_vector_tile_queryset(self, z, x, y):
+                return Feature.objects.filter(pk__gte=x)
+
+        layer = TileFilteredVectorLayer()
+        self.assertEqual(layer.get_tile_query(1, 0, 1), layer.build_tile_query(1, 0, 1))
+        self.assertIsNone(postgis.compiled_queries[TileFilteredVectorLayer, 1])
+
+    def test_compiled_queries_cleared_by_another_thread(self):
+        class ClearedQueries(dict):
+            def __setitem__(self, key, value):
+                # cleared right after being stored
+                pass
+
+        with mock.patch.object(postgis, "compiled_queries", ClearedQueries()):
+            self.assertEqual(
+                self.layer.get_tile_query(0, 0, 1),
+                self.layer.build_tile_query(0, 0, 1),
+            )
+
+
+class TileTimingsTestCase(VectorTileBaseTest):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_server_timing_header(self):
+        class OtherPythonFeatureVectorLayer(PythonFeatureVectorLayer):
+            id = "python-features"
+
+        view = MVTView.as_view(
+            layer_classes=[FeatureVectorLayer, OtherPythonFeatureVectorLayer],
+            server_timing=True,
+        )
+        response = view(self.factory.get("/"), z=0, x=0, y=0)
+        metrics = [
+            metric.split(";")[0]
+            for metric in response.headers["Server-Timing"].split(", ")
+        ]
+        self.assertEqual(
+            metrics,
+            [
+                "cache",
+                "features.query",
+                "features.fetch",
+                "python-features.query",
+                "python-features.fetch",
+                "python-features.encode",
+                "total",
+            ],
+        )
+
+    def test_no_server_timing_by_default(self):
+        response = MVTView.as_view(layer_classes=[FeatureVectorLayer])(
+            self.factory.get("/"), z=0, x=0, y=0
+        )
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def test_tile_rendered_signal(self):
+        received = []
+
+        def receiver(sender, timings, response, z, x, y, **kwargs):
+            received.append((z, x, y, response.status_code, timings.tiles))
+
+        tile_rendered.connect(receiver, sender=MVTView)
+        self.addCleanup(tile_rendered.disconnect, receiver, sender=MVTView)
+        MVTView.as_view(layer_classes=[FeatureVectorLayer])(
+            self.factory.get("/"), z=0, x=0, y=0
+        )
+        tile = FeatureVectorLayer().get_tile(0, 0, 0)
+        self.assertEqual(
+            received,
+            [
+                (
+                    0,
+                    0,
+                    0,
+                    200,
+                    {"features": {"cached": False, "features": 2, "bytes": len(tile)}},
+                )
+            ],
+        )
+
+
+class VectorTileTransactionBaseTest(TransactionTestCase):
+    # async and other threads database connections don't see test transactions data
+    def setUp(self):
+        layer = Layer.objects.create(name="features")
+        Feature.objects.create(
+            name="feat1", geom="POINT(0 0)", layer=layer, date="2020-07-07"
+        )
+        Feature.objects.create(
+            name="feat2", geom="LINESTRING(0 0, 1 1)", layer=layer, date="2020-08-08"
+        )
+
+
+class ParallelLayersTestCase(VectorTileTransactionBaseTest):
+    def test_parallel_layers_equals_sequential_layers(self):
+        class TestView(MVTView):
+            layer_classes = [FeatureVectorLayer, DatedFeatureVectorLayer]
+
+        class ParallelTestView(TestView):
+            parallel_layers = True
+
+        content, status = TestView().get_content_status(0, 0, 0)
+        self.assertEqual(
+            ParallelTestView().get_content_status(0, 0, 0), (content, status)
+        )
+        self.assertEqual(
+            list(mapbox_vector_tile.decode(content)), ["features", "dated-features"]
+        )
+
+    def test_parallel_layers_use_other_threads(self):
+        class ThreadVectorLayer(FeatureVectorLayer):
+            def get_tile(self, x, y, z):
+                return threading.current_thread().name.encode()
+
+        view = MVTView(
+            layer_classes=[ThreadVectorLayer, ThreadVectorLayer], parallel_layers=True
+        )
+        self.assertTrue(view.get_layer_tiles(0, 0, 0).startswith(b"vectortiles"))
+
+    def test_worker_connections_closed_once_by_request(self):
+        request, other_request = object(), object()
+        with mock.patch("vectortiles.mixins.close_old_connections") as close:
+            render_layer_tile(FeatureVectorLayer(), 0, 0, 0, request)
+            render_layer_tile(FeatureVectorLayer(), 0, 0, 0, request)
+            self.assertEqual(close.call_count, 1)
+            render_layer_tile(FeatureVectorLayer(), 0, 0, 0, other_request)
+            self.assertEqual(close.call_count, 2)
+
+
+class AsyncVectorTileTestCase(VectorTileTransactionBaseTest):
+    async def test_async_view_equals_sync_view(self):
+        class TestView(AsyncMVTView):
+            layer_classes = [FeatureVectorLayer, DatedFeatureVectorLayer]
+
+        response = await TestView.as_view()(
+            AsyncRequestFactory().get("/"), z=0, x=0, y=0
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], TestView.content_type)
+        content, _ = await sync_to_async(
+            MVTView(layer_classes=TestView.layer_classes).get_content_status
+        )(0, 0, 0)
+        self.assertEqual(
+            mapbox_vector_tile.decode(response.content),
+            mapbox_vector_tile.decode(content),
+        )
+        self.assertEqual(
+            list(mapbox_vector_tile.decode(response.content)),
+            ["features", "dated-features"],
+        )
+
+    async def test_async_view_single_query(self):
+        class TestView(AsyncMVTView):
+            layer_classes = [FeatureVectorLayer, DatedFeatureVectorLayer]
+            layers_single_query = True
+
+        content, status = await TestView().aget_content_status(0, 0, 0)
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            list(mapbox_vector_tile.decode(content)), ["features", "dated-features"]
+        )
+
+    async def test_async_view_empty_tile(self):
+        content, status = await AsyncMVTView(
+            layer_classes=[FeatureVectorLayer]
+        ).aget_content_status(2, 0, 0)
+        self.assertEqual((content, status), (b"", 204))
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    async def test_async_view_cached_layer_tiles(self):
+        class CachedFeatureVectorLayer(FeatureVectorLayer):
+            cache_timeout = 60
+
+        await cache.aclear()
+        view = AsyncMVTView(layer_classes=[CachedFeatureVectorLayer])
+        content, _ = await view.aget_content_status(0, 0, 0)
+        self.assertEqual(
+            await cache.aget(CachedFeatureVectorLayer().get_cache_key(0, 0, 0)),
+            content,
+        )
+        await Feature.objects.all().adelete()
+        self.assertEqual(await view.aget_content_status(0, 0, 0), (content, 200))
+
+    async def test_async_tilejson_view(self):
+        class TestView(AsyncTileJSONView):
+            layer_classes = [FeatureVectorLayer]
+            tile_url = "/tiles/{z}/{x}/{y}"
+
+        response = await TestView.as_view()(AsyncRequestFactory().get("/"))
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual(content["tiles"], ["http://testserver/tiles/{z}/{x}/{y}"])
+        self.assertEqual(content["vector_layers"][0]["id"], "features")
+
+
+@skipIf(postgis.aio.AsyncConnectionPool is None, "psycopg_pool is not installed")
+class AsyncPoolTestCase(TransactionTestCase):
+    def test_pools_are_closed_with_their_loop(self):
+        async def get_pool():
+            return await postgis.aio.get_pool(
+                DEFAULT_DB_ALIAS, asyncio.get_running_loop()
+            )
+
+        pool = async_to_sync(get_pool)()
+        self.assertTrue(pool.closed)
+        self.assertEqual(postgis.aio.pools, {})
+
+
 class VectorTileTileJSONTestCase(VectorTileBaseTest):
     def test_features(self):
         self.maxDiff = None
@@ -0,0 +1,181 @@
+"""
+Timings of tile rendering stages, by layer, for the current request.
+
+Tile views record timings in a TileTimings context when server_timing is enabled or
+tile_rendered signal has receivers. Without context, stages are not measured and only
+cost a context variable lookup.
+"""
+
+import re
+from contextvars import ContextVar
+from time import perf_counter
+
+from vectortiles.protobuf import read_varint
+
+re_not_token = re.compile(r"[^\w!#$%&'*+.^`|~-]")
+
+current_timings = ContextVar("vectortiles_timings", default=None)
+
+
+def get_timings():
+    """Get timings of current context, or None if timings are not recorded"""
+    return current_timings.get()
+
+
+def count_tile_features(tile):
+    """Count features of a mapbox vector tile, without decoding them"""
+    count, position = 0, 0
+    while position < len(tile):
+        # tile only contains layers
+        _, position = read_varint(tile, position)
+        length, position = read_varint(tile, position)
+        end = position + length
+        while position < end:
+            key, position = read_varint(tile, position)
+            field, wire_type = key >> 3, key & 0x7
+            if wire_type == 0:
+                _, position = read_varint(tile, position)
+            elif wire_type == 1:
+                position += 8
+            elif wire_type == 5:
+                position += 4
+            else:
+                length, position = read_varint(tile, position)
+                position += length
+                count += field == 2
+    return count
+
+
+class TileTimings:
+    """
+    Stages durations and rendered tiles of a tile request.
+    Used as context manager, it records timings of the current context.
+    """
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.duration = None
+        self.stages = []  # (layer id or None for view stages, stage, seconds)
+        self.tiles = {}  # layer id -> {"cached": bool, "features": count, "bytes": size}
+        self.token = None
+
+    def __enter__(self):
+        self.token = current_timings.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = perf_counter() - self.start
+        current_timings.reset(self.token)
+
+    def add_stage(self, layer_id, name, duration):
+        # list append is thread safe, for layers rendered in threads
+        self.stages.append((layer_id, name, duration))
+
+    def add_tile(self, layer_id, tile, cached=False):
+        """
+        Record layer tile size, and features count of rendered tiles.
+        Size of compressed tiles segments is their content size.
+        """
+        if isinstance(tile, tuple):
+            size, features = tile[2], None
+        else:
+            size, features = len(tile), None if cached else count_tile_features(tile)
+        self.tiles[layer_id] = {"cached": cached, "features": features, "bytes": size}
+
+    def get_durations(self):
+        """
+        Get total duration of each stage, in recording order
+
+        :return: {(layer id, stage): seconds}
+        :rtype: dict
+        """
+        durations = {}
+        for layer_id, name, duration in self.stages:
+            durations[layer_id, name] = durations.get((layer_id, name), 0) + duration
+        return durations
+
+    def get_server_timing(self):
+        """Get Server-Timing header value, with durations in milliseconds"""
+        metrics = [
+            (name if layer_id is None else f"{layer_id}.{name}", duration)
+            for (layer_id, name), duration in self.get_durations().items()
+        ]
+        if self.duration is not None:
+            metrics.append(("total", self.duration))
+        return ", ".join(
+            f"{re_not_token.sub('_', name)};dur={duration * 1000:.3f}"
+            for name, duration in metrics
+        )
+
+
+class TimedIterator:
+    """Iterate over iterable, measuring time spent to get its items"""
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.duration = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            return next(self.iterator)
+        finally:
+            self.duration += perf_counter() - start
+
+
+class Stage:
+    """
+    Context manager measuring a rendering stage of layer, or of view if layer_id is None.
+    Time spent in iterators of its timed method is recorded in their own stages.
+
+    >>> with Stage(layer.get_id(), "query"):
+    ...     sql = layer.get_tile_query(x, y, z)
+    """
+
+    __slots__ = ("layer_id", "name", "timings", "start", "children")
+
+    def __init__(self, layer_id, name):
+        self.layer_id = layer_id
+        self.name = name
+        self.timings = current_timings.get()
+        self.children = []
+
+    def __enter__(self):
+        if self.timings is not None:
+            self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is None:
+            return
+        duration = perf_counter() - self.start
+        for name, iterator in self.children:
+            self.timings.add_stage(self.layer_id, name, iterator.duration)
+            duration -= iterator.duration
+        self.timings.add_stage(self.layer_id, self.name, duration)
+
+    def timed(self, name, iterable):
+        """Get iterable, measured in stage name if timings are recorded"""
+        if self.timings is None:
+            return iterable
+        iterator = TimedIterator(iterable)
+        self.children.append((name, iterator))
+        return iterator
+
+
+async def timed_await(layer_id, name, awaitable):
+    """Await awaitable, measured in stage name"""
+    with Stage(layer_id, name):
+        return await awaitable
+
+
+def record_tiles(layers, tiles, cached=False):
+    """Record tile of each layer, rendered or read in cache. None tiles are skipped."""
+    timings = current_timings.get()
+    if timings is not None:
+        for layer, tile in zip(layers, tiles):
+            if tile is not None:
+                timings.add_tile(layer.get_id(), tile, cached)
@@ -1,7 +1,19 @@
-from django.http import HttpResponse, JsonResponse
+import gzip
+import os
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
 from django.views import View
 
-from vectortiles.mixins import BaseTileJSONView, BaseVectorTileView
+from vectortiles import mbtiles, metrics, pmtiles
+from vectortiles.mixins import (
+    BaseTileJSONView,
+    BaseVectorTileView,
+    get_content_etag,
+    re_accepts_gzip,
+)
 
 
 class TileJSONView(BaseTileJSONView, View):
@@ -11,7 +23,7 @@ class TileJSONView(BaseTileJSONView, View):
         return self.tile_url
 
     def get(self, request, *args, **kwargs):
-        return JsonResponse(self.get_tilejson(self.get_tile_url()))
+        return self.get_tilejson_response(request, self.get_tile_url())
 
 
 class MVTView(BaseVectorTileView, View):
@@ -30,5 +42,129 @@ class MVTView(BaseVectorTileView, View):
 
         :rtype HTTPResponse
         """
-        content, status = self.get_content_status(int(z), int(x), int(y))
-        return HttpResponse(content, content_type=self.content_type, status=status)
+        return self.get_tile_response(request, int(z), int(x), int(y))
+
+
+class AsyncTileJSONView(TileJSONView):
+    """TileJSON view for ASGI deployments, layers are described in a thread"""
+
+    async def get(self, request, *args, **kwargs):
+        return await sync_to_async(self.get_tilejson_response)(
+            request, self.get_tile_url()
+        )
+
+
+class AsyncMVTView(BaseVectorTileView, View):
+    """
+    Vector tile view for ASGI deployments.
+    Layer tiles are generated concurrently, with asynchronous database queries.
+    """
+
+    async def get(self, request, z, x, y, *args, **kwargs):
+        return await self.aget_tile_response(request, int(z), int(x), int(y))
+
+
+class BaseCompressedTileView(BaseVectorTileView, View):
+    """Serve gzip compressed tiles, from an archive file"""
+
+    def get_archive_path(self):
+        raise NotImplementedError
+
+    def get_compressed_tile(self, z, x, y):
+        """
+        Get gzip compressed tile content
+
+        :return: tile content, or None if tile does not exist
+        :rtype: bytes
+        """
+        raise NotImplementedError
+
+    def get_content_status(self, z, x, y):
+        content = self.get_compressed_tile(z, x, y)
+        return (gzip.decompress(content), 200) if content else (b"", 204)
+
+    def get_last_modified(self):
+        path = self.get_archive_path()
+        return datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        z, x, y = int(z), int(x), int(y)
+        self.check_tile_coordinates(z, x, y)
+        content = self.get_compressed_tile(z, x, y)
+        # weak, as content is the same with or without Content-Encoding
+        etag = get_content_etag(content, weak=True) if content else None
+        last_modified = self.get_last_modified()
+        response = self.get_conditional_response(request, etag, last_modified)
+        if response is None:
+            if not content:
+                response = HttpResponse(b"", content_type=self.content_type, status=204)
+            elif re_accepts_gzip.search(request.headers.get("Accept-Encoding", "")):
+                response = HttpResponse(content, content_type=self.content_type)
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(
+                    gzip.decompress(content), content_type=self.content_type
+                )
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return self.patch_response(
+            response, etag, last_modified, self.get_cache_control(z)
+        )
+
+
+class MBTilesView(BaseCompressedTileView):
+    """Serve tiles from a MBTiles file"""
+
+    mbtiles_path = None
+
+    def get_mbtiles_path(self):
+        return self.mbtiles_path
+
+    def get_archive_path(self):
+        return self.get_mbtiles_path()
+
+    def get_compressed_tile(self, z, x, y):
+        return mbtiles.get_tile(self.get_mbtiles_path(), z, x, y)
+
+
+class PMTilesView(BaseCompressedTileView):
+    """Serve tiles from a memory mapped PMTiles archive"""
+
+    pmtiles_path = None
+
+    def get_pmtiles_path(self):
+        return self.pmtiles_path
+
+    def get_archive_path(self):
+        return self.get_pmtiles_path()
+
+    def get_compressed_tile(self, z, x, y):
+        return pmtiles.get_reader(self.get_pmtiles_path()).get_tile(z, x, y)
+
+
+class MetricsView(View):
+    """
+    Serve tile views metrics collected in process (vectortiles.metrics), in JSON or
+    in Prometheus text format with ?format=prometheus
+    """
+
+    registry = None  # metrics registry. By default, vectortiles.metrics.registry
+    exporter_classes = {
+        "json": metrics.JSONExporter,
+        "prometheus": metrics.PrometheusExporter,
+    }
+    default_format = "json"
+
+    def get_registry(self):
+        return self.registry or metrics.registry
+
+    def get_exporter(self, request):
+        export_format = request.GET.get("format", self.default_format)
+        if export_format not in self.exporter_classes:
+            msg = f"Unknown metrics format: {export_format}"
+            raise Http404(msg)
+        return self.exporter_classes[export_format]()
+
+    def get(self, request, *args, **kwargs):
+        exporter = self.get_exporter(request)
+        content = exporter.export(self.get_registry().get_metrics())
+        return HttpResponse(content, content_type=exporter.content_type)